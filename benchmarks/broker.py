@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import itertools
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+def topic_matches(pattern, topic):
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+def encode_string(value):
+    data = value.encode()
+    return struct.pack("!H", len(data)) + data
+
+class Session:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.subscriptions = {}
+        self.packet_ids = itertools.cycle(range(1, 65536))
+
+    def send(self, packet_type, flags, body):
+        if not self.writer.is_closing():
+            self.writer.write(bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body)
+
+    def deliver(self, topic, payload, qos, retain=False):
+        header = encode_string(topic)
+        if qos:
+            header += struct.pack("!H", next(self.packet_ids))
+        self.send(PUBLISH, (qos << 1) | int(retain), header + payload)
+
+    async def read_packet(self):
+        first = await self.reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b""
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    async def run(self):
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet()
+                if packet_type == CONNECT:
+                    self.handle_connect(body)
+                elif packet_type == PUBLISH:
+                    self.handle_publish(flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.handle_subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.handle_unsubscribe(body)
+                elif packet_type == PINGREQ:
+                    self.send(PINGRESP, 0, b"")
+                elif packet_type == DISCONNECT:
+                    break
+                if self.writer.transport.get_write_buffer_size() > 1 << 20:
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker.remove(self)
+            self.writer.close()
+
+    def handle_connect(self, body):
+        name_len = struct.unpack_from("!H", body, 0)[0]
+        offset = 2 + name_len + 4
+        id_len = struct.unpack_from("!H", body, offset)[0]
+        self.client_id = body[offset + 2:offset + 2 + id_len].decode()
+        self.broker.register(self)
+        self.send(CONNACK, 0, b"\x00\x00")
+
+    def handle_publish(self, flags, body):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic_len = struct.unpack_from("!H", body, 0)[0]
+        topic = body[2:2 + topic_len].decode()
+        offset = 2 + topic_len
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            self.send(PUBACK, 0, packet_id)
+        self.broker.route(topic, body[offset:], qos, retain)
+
+    def handle_subscribe(self, body):
+        packet_id = body[:2]
+        offset, granted = 2, bytearray()
+        while offset < len(body):
+            length = struct.unpack_from("!H", body, offset)[0]
+            pattern = body[offset + 2:offset + 2 + length].decode()
+            qos = min(body[offset + 2 + length], 1)
+            offset += 3 + length
+            self.broker.subscribe(self, pattern, qos)
+            granted.append(qos)
+        self.send(SUBACK, 0, packet_id + bytes(granted))
+
+    def handle_unsubscribe(self, body):
+        packet_id = body[:2]
+        offset = 2
+        while offset < len(body):
+            length = struct.unpack_from("!H", body, offset)[0]
+            self.broker.unsubscribe(self, body[offset + 2:offset + 2 + length].decode())
+            offset += 2 + length
+        self.send(UNSUBACK, 0, packet_id)
+
+class Broker:
+    """Minimal in-process MQTT 3.1.1 broker for benchmarks and tests.
+
+    Supports QoS 0/1 publish, wildcard and `$share/<group>/` subscriptions and
+    retained messages. It keeps no persistent sessions and does not resend
+    unacknowledged QoS 1 messages.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.subscribers = {}
+        self.shared = {}
+        self.retained = {}
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.counters = {"published": 0, "delivered": 0}
+
+    def register(self, session):
+        previous = self.sessions.get(session.client_id)
+        if previous is not None and previous is not session:
+            previous.writer.close()
+            self.remove(previous)
+        self.sessions[session.client_id] = session
+
+    def remove(self, session):
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        for pattern in list(session.subscriptions):
+            self.unsubscribe(session, pattern)
+
+    def subscribe(self, session, pattern, qos):
+        session.subscriptions[pattern] = qos
+        if pattern.startswith("$share/"):
+            _, group, topic_filter = pattern.split("/", 2)
+            members = self.shared.setdefault((group, topic_filter), [[], 0])[0]
+            if session not in members:
+                members.append(session)
+            return
+        self.subscribers.setdefault(pattern, {})[session] = qos
+        for topic, (payload, retained_qos) in self.retained.items():
+            if topic_matches(pattern, topic):
+                session.deliver(topic, payload, min(qos, retained_qos), retain=True)
+
+    def unsubscribe(self, session, pattern):
+        session.subscriptions.pop(pattern, None)
+        if pattern.startswith("$share/"):
+            _, group, topic_filter = pattern.split("/", 2)
+            entry = self.shared.get((group, topic_filter))
+            if entry and session in entry[0]:
+                entry[0].remove(session)
+            return
+        subscribers = self.subscribers.get(pattern)
+        if subscribers is not None:
+            subscribers.pop(session, None)
+            if not subscribers:
+                del self.subscribers[pattern]
+
+    def route(self, topic, payload, qos, retain=False):
+        self.counters["published"] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for pattern, subscribers in self.subscribers.items():
+            if topic_matches(pattern, topic):
+                for session, sub_qos in subscribers.items():
+                    session.deliver(topic, payload, min(qos, sub_qos))
+                    self.counters["delivered"] += 1
+        # Shared subscriptions: each group gets one copy, handed out round-robin
+        for (group, topic_filter), entry in self.shared.items():
+            members = entry[0]
+            if members and topic_matches(topic_filter, topic):
+                session = members[entry[1] % len(members)]
+                entry[1] += 1
+                session.deliver(topic, payload, min(qos, session.subscriptions.get(f"$share/{group}/{topic_filter}", 0)))
+                self.counters["delivered"] += 1
+
+    async def _serve(self, started):
+        async def handle(reader, writer):
+            await Session(self, reader, writer).run()
+        self.server = await asyncio.start_server(handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        started.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.loop.run_until_complete(self._serve(started))
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="MQTTBroker", daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        def shutdown():
+            for session in list(self.sessions.values()):
+                session.writer.close()
+            self.server.close()
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+
+        self.loop.call_soon_threadsafe(shutdown)
+        self.thread.join(timeout=5)
+        self.loop = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minimal MQTT broker for benchmarks and tests")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=1883, help="Port to listen on (0 picks a free one)")
+    args = parser.parse_args()
+    broker = Broker(args.host, args.port)
+    print(f"Broker listening on {args.host}:{broker.start()}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        broker.stop()
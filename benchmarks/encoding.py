@@ -0,0 +1,50 @@
+import argparse
+import random
+import time
+import uuid
+from src.card_client.card_client import random_card
+from src.common.batch import encode_message
+from src.common.binary import CARD
+from src.verifier.verifier import ResultBatch, result_message, verify_message
+
+def make_payloads(count, batch_size, binary, rng):
+    # Cards as the load generator sends them: with a msg_id and a send timestamp
+    cards = [dict(random_card(rng, 0.3), msg_id=uuid.uuid4().hex, sent_ts=time.time()) for _ in range(count)]
+    payloads = []
+    for i in range(0, count, batch_size):
+        chunk = cards[i:i + batch_size]
+        batch_id = uuid.uuid4().hex[:16] if batch_size > 1 else None
+        payloads.append(encode_message(chunk, CARD, batch_id, binary=binary)[0])
+    return payloads
+
+def verifier_work(payload):
+    # What the Verifier does per message: decode and verify the cards, then encode the results
+    result = verify_message(payload)
+    if isinstance(result, ResultBatch):
+        return result_message(result.results, result.batch_id, result.compressed, result.binary)[1]
+    return result_message([result])[1]
+
+def measure(count, batch_size, binary, rounds, seed=42):
+    payloads = make_payloads(count, batch_size, binary, random.Random(seed))
+    results = [verifier_work(payload) for payload in payloads]
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        for payload in payloads:
+            verifier_work(payload)
+        best = min(best, time.process_time() - start)
+    return {"card_bytes": sum(map(len, payloads)) / count, "result_bytes": sum(map(len, results)) / count,
+            "cpu_us_per_card": best / count * 1e6}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifier CPU and payload size per card, JSON vs binary encoding")
+    parser.add_argument("--count", type=int, default=20000, help="Cards per measurement")
+    parser.add_argument("--batch-sizes", default="1,50", help="Comma-separated cards per message")
+    parser.add_argument("--rounds", type=int, default=5, help="Repetitions; the fastest is reported")
+    args = parser.parse_args()
+    print(f"{'batch':>5} {'encoding':>8} {'card B':>7} {'result B':>8} {'CPU us/card':>11}")
+    for batch_size in (int(value) for value in args.batch_sizes.split(",")):
+        for encoding in ("json", "binary"):
+            report = measure(args.count, batch_size, encoding == "binary", args.rounds)
+            print(f"{batch_size:>5} {encoding:>8} {report['card_bytes']:>7.1f} {report['result_bytes']:>8.1f} "
+                  f"{report['cpu_us_per_card']:>11.2f}")
@@ -0,0 +1,289 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from benchmarks.broker import Broker
+from src.card_client.load_gen import LoadGenerator, percentile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PROBE_CARD = {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-12-31", "region": "US", "card_type": "Visa"}
+# Metric path -> True when higher is better; used to flag regressions against a baseline run
+COMPARED = {
+    ("load", "result_rate"): True,
+    ("store", "rate"): True,
+    ("load", "latency_ms", "p95"): False,
+    ("load", "latency_ms", "p99"): False,
+    ("store", "lag_ms", "p95"): False,
+    ("resources", "verifier", "cpu_ms_per_1k"): False,
+    ("resources", "analyst", "cpu_ms_per_1k"): False,
+    ("resources", "verifier", "max_rss_mb"): False,
+    ("resources", "analyst", "max_rss_mb"): False,
+}
+
+def proc_usage(pid):
+    # (cpu seconds, peak RSS in MB) from /proc, or None where it is not available
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:"))
+        return cpu, rss
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+class Service:
+    """One pipeline stage running as `python -m <module>` in its own process, so its CPU and RSS can be read."""
+
+    def __init__(self, name, args, env, cwd):
+        self.name = name
+        self.proc = subprocess.Popen([sys.executable, "-m", *args], cwd=cwd, env=env,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self.started = None
+
+    def mark(self):
+        self.started = proc_usage(self.proc.pid)
+
+    def usage(self, wall, messages):
+        current = proc_usage(self.proc.pid)
+        if current is None or self.started is None:
+            return {}
+        cpu = current[0] - self.started[0]
+        return {"cpu_seconds": round(cpu, 3), "cpu_percent": round(cpu / wall * 100, 1) if wall else 0.0,
+                "cpu_ms_per_1k": round(cpu / messages * 1e6, 2) if messages else 0.0, "max_rss_mb": round(current[1], 1)}
+
+    def stop(self, timeout=15):
+        # SIGINT takes the services' KeyboardInterrupt path, so they drain and close cleanly
+        if self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGINT)
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        return self.proc.stderr.read().decode(errors="replace")
+
+def count_rows(db_path):
+    try:
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            return conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+
+def wait_ready(host, port, db_path, timeout=30):
+    # Cards published before the Verifier subscribes are lost (no persistent sessions), so probe the whole
+    # pipeline until a result comes back and the Analyst has stored it
+    received = threading.Event()
+    client = mqtt.Client(client_id=f"BenchProbe-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = lambda c, userdata, flags, rc, props: c.subscribe("kyc/result", qos=1)
+    client.on_message = lambda c, userdata, msg: received.set()
+    client.connect(host, port, keepalive=60)
+    client.loop_start()
+    deadline = time.time() + timeout
+    try:
+        while time.time() < deadline:
+            client.publish("kyc/card_data", json.dumps(dict(PROBE_CARD, id=f"1234-5678-{int(time.time() * 1000) % 10000:04d}")), qos=1)
+            time.sleep(0.2)
+            if received.is_set() and count_rows(db_path) > 0:
+                # Let the last probes land so they are not counted as part of the run
+                time.sleep(0.5)
+                return
+        raise Exception("Pipeline did not become ready")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+class StoreMonitor:
+    """Samples the Analyst's row count to measure store throughput and result-to-commit lag."""
+
+    def __init__(self, db_path, interval=0.02):
+        self.db_path = db_path
+        self.interval = interval
+        self.samples = []
+        self.baseline = count_rows(db_path)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="StoreMonitor", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.samples.append((time.time(), count_rows(self.db_path) - self.baseline))
+
+    def wait_for(self, expected, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.samples and self.samples[-1][1] >= expected:
+                break
+            time.sleep(self.interval)
+        self.stop_event.set()
+        self.thread.join()
+
+    def report(self, arrivals):
+        # The k-th stored row cannot have been committed before the k-th result arrived, so the first
+        # sample that sees row k, minus that arrival, bounds its store lag at the sampling resolution
+        arrivals = sorted(arrivals)
+        lags, last, seen = [], None, 0
+        stored = self.samples[-1][1] if self.samples else 0
+        for t, count in self.samples:
+            if count <= seen:
+                continue
+            last = t
+            lags.extend(max(0.0, t - arrivals[k]) for k in range(seen, min(count, len(arrivals))))
+            seen = count
+        lags.sort()
+        # From the first result reaching the Analyst to the last row being visible
+        seconds = last - arrivals[0] if last and arrivals else 0.0
+        return {
+            "stored": stored,
+            "rate": round(stored / seconds, 1) if seconds else 0.0,
+            "lag_ms": {name: round(percentile(lags, pct) * 1000, 2) for name, pct in (("p50", 50), ("p95", 95), ("p99", 99))},
+            "sample_ms": self.interval * 1000,
+        }
+
+def run_scenario(host, port, scenario, drain_timeout=30):
+    workdir = tempfile.mkdtemp(prefix="kyc-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    db_path = os.path.join(workdir, "data", "kyc_results.db")
+    env = dict(os.environ, PYTHONPATH=ROOT, MQTT_BROKER=host, MQTT_PORT=str(port), MQTT_QOS=str(scenario["qos"]),
+               VERIFIER_INSTANCE_ID=f"bench-{uuid.uuid4().hex[:6]}", VERIFIER_WORKERS=str(scenario["verifier_workers"]),
+               ANALYST_STREAMING="1" if scenario["streaming"] else "0")
+    services = [Service("verifier", ["src.verifier.verifier"], env, workdir),
+                Service("analyst", ["src.analyst.analyst", "--duration", "0"], env, workdir)]
+    try:
+        wait_ready(host, port, db_path)
+        # Settings go to the generator directly; os.environ is left alone for later scenarios and callers
+        generator = LoadGenerator(count=scenario["count"], rate=scenario["rate"], publishers=scenario["publishers"],
+                                  batch_size=scenario["batch_size"], invalid_ratio=scenario["invalid_ratio"], seed=1,
+                                  binary=scenario["encoding"] == "binary", broker=host, port=port, qos=scenario["qos"])
+        monitor = StoreMonitor(db_path)
+        for service in services:
+            service.mark()
+        start = time.time()
+        load = generator.run(drain_timeout=drain_timeout)
+        monitor.wait_for(load["received"], drain_timeout)
+        wall = time.time() - start
+        resources = {service.name: service.usage(wall, load["sent"]) for service in services}
+        return {"scenario": scenario, "wall_seconds": round(wall, 3), "load": load,
+                "store": monitor.report(generator.arrivals), "resources": resources}
+    finally:
+        for service in services:
+            errors = service.stop()
+            if service.proc.returncode not in (0, -signal.SIGINT) and errors:
+                print(f"{service.name} exited with {service.proc.returncode}:\n{errors[-2000:]}", file=sys.stderr)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def lookup(run, path):
+    value = run
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def compare(runs, baseline_runs, tolerance=0.2):
+    """Regressions of `runs` against the same scenarios in `baseline_runs`, beyond a relative tolerance."""
+    baseline = {json.dumps(run["scenario"], sort_keys=True): run for run in baseline_runs}
+    regressions = []
+    for run in runs:
+        previous = baseline.get(json.dumps(run["scenario"], sort_keys=True))
+        if previous is None:
+            continue
+        for path, higher_is_better in COMPARED.items():
+            new, old = lookup(run, path), lookup(previous, path)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({"scenario": run["scenario"], "metric": ".".join(path), "baseline": old,
+                                    "current": new, "change": round(change, 3)})
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def start_broker(mode, port):
+    if mode == "thread":
+        broker = Broker(port=port)
+        return broker.start(), broker.stop
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.broker", "--port", str(port)], cwd=ROOT,
+                            stdout=subprocess.PIPE, text=True)
+    # The broker prints its address once it is listening
+    actual = int(proc.stdout.readline().rsplit(":", 1)[1])
+    return actual, lambda: (proc.send_signal(signal.SIGINT), proc.wait(10))
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(",") if item]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark: load generator -> Verifier -> Analyst")
+    parser.add_argument("--rates", default="500,2000", help="Comma-separated target cards/sec (0 = as fast as possible)")
+    parser.add_argument("--batch-sizes", default="1", help="Comma-separated cards per message (payload mix)")
+    parser.add_argument("--invalid-ratios", default="0.3", help="Comma-separated shares of cards with injected errors")
+    parser.add_argument("--encodings", default="json", help="Comma-separated card encodings: json, binary")
+    parser.add_argument("--count", type=int, default=5000, help="Cards per scenario")
+    parser.add_argument("--publishers", type=int, default=2, help="Publishing clients per scenario")
+    parser.add_argument("--verifier-workers", type=int, default=0, help="VERIFIER_WORKERS for the Verifier")
+    parser.add_argument("--qos", type=int, default=1, choices=(0, 1), help="MQTT QoS for every stage")
+    parser.add_argument("--no-streaming", action="store_true", help="Run the Analyst with ANALYST_STREAMING=0")
+    parser.add_argument("--broker", default="subprocess", help="'subprocess', 'thread' or host:port of an existing broker")
+    parser.add_argument("--output", default=None, help="Result file (default benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.broker in ("subprocess", "thread"):
+        host = "127.0.0.1"
+        port, stop_broker = start_broker(args.broker, 0)
+    else:
+        host, port = args.broker.rsplit(":", 1)
+        port, stop_broker = int(port), lambda: None
+    runs = []
+    try:
+        for rate, batch_size, invalid_ratio, encoding in itertools.product(
+                parse_list(args.rates, float), parse_list(args.batch_sizes, int), parse_list(args.invalid_ratios, float),
+                parse_list(args.encodings, str)):
+            scenario = {"rate": rate, "batch_size": batch_size, "invalid_ratio": invalid_ratio, "encoding": encoding,
+                        "count": args.count, "publishers": args.publishers, "verifier_workers": args.verifier_workers,
+                        "qos": args.qos,
+                        "streaming": not args.no_streaming, "broker": args.broker if ":" not in args.broker else "external"}
+            print(f"Running {scenario}", flush=True)
+            run = run_scenario(host, port, scenario)
+            runs.append(run)
+            print(f"  results {run['load']['received']}/{run['load']['sent']} at {run['load']['result_rate']}/s, "
+                  f"verify p50/p99 {run['load']['latency_ms']['p50']}/{run['load']['latency_ms']['p99']} ms, "
+                  f"stored {run['store']['stored']} at {run['store']['rate']}/s, "
+                  f"store lag p95 {run['store']['lag_ms']['p95']} ms", flush=True)
+    finally:
+        stop_broker()
+
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count()},
+              "runs": runs}
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(runs, json.load(f)["runs"], args.tolerance)
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+              f"({regression['change']:+.0%}) in {regression['scenario']}")
+    sys.exit(1 if report.get("regressions") else 0)
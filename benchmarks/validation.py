@@ -0,0 +1,52 @@
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from src.common.validation import CARD_TYPES, REGIONS, validate_card
+
+def legacy_validate(card):
+    # The per-message checks Verifier.on_message used to run inline
+    reasons = []
+    if not bool(re.match(r"^\d{4}-\d{4}-\d{4}$|^\d{6}-\d{4}$", card["id"])):
+        reasons.append("Invalid ID format")
+    if not datetime.strptime(card["expiry"], "%Y-%m-%d") >= datetime.now():
+        reasons.append("Card expired")
+    if not (len(card["name"].split()) >= 2 and len(card["name"]) >= 3):
+        reasons.append("Invalid name")
+    if not card.get("region") in ["US", "EU", "ASIA", "MEA"]:
+        reasons.append("Invalid region")
+    if not card.get("card_type") in ["Visa", "MasterCard", "Amex", "Discover"]:
+        reasons.append("Invalid card type")
+    return reasons
+
+def benchmark(count=50000, rounds=5):
+    rng = random.Random(42)
+    base = datetime.now()
+    cards = []
+    for i in range(1000):
+        cards.append({
+            "id": rng.choice([f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+                              f"{rng.randint(100000, 999999)}-{rng.randint(1000, 9999)}", "invalid_id"]),
+            "name": rng.choice(["Alice Smith", "Bob Jones", "A"]),
+            "expiry": (base + timedelta(days=rng.randint(-365, 1095))).strftime("%Y-%m-%d"),
+            "region": rng.choice(REGIONS),
+            "card_type": rng.choice(CARD_TYPES)
+        })
+    for card in cards:
+        assert validate_card(card) == legacy_validate(card), card
+    rates = {}
+    for label, func in (("legacy", legacy_validate), ("rule table", validate_card)):
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for i in range(count):
+                func(cards[i % 1000])
+            best = min(best, time.perf_counter() - start)
+        rates[label] = count / best
+    return rates
+
+if __name__ == "__main__":
+    rates = benchmark()
+    print(f"Legacy validation:     {rates['legacy']:,.0f} validations/sec")
+    print(f"Rule table validation: {rates['rule table']:,.0f} validations/sec")
+    print(f"Speedup: {rates['rule table'] / rates['legacy']:.1f}x")
@@ -1,6 +1,88 @@
-CREATE TABLE results (
-    id TEXT PRIMARY KEY,
-    status TEXT NOT NULL,
-    reason TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+-- Schema version 6, created by src/analyst/migrations.py (PRAGMA user_version = 6).
+-- Reference only: the Analyst applies migrations itself on startup.
+
+CREATE TABLE statuses (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);    -- approved, rejected
+CREATE TABLE card_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);  -- Visa, MasterCard, Amex, Discover, Unknown
+CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);     -- US, EU, ASIA, MEA, Unknown
+CREATE TABLE reason_codes (bit INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+
+CREATE TABLE verdicts (
+    msg_key INTEGER NOT NULL UNIQUE,               -- 64-bit idempotency key
+    card_id TEXT NOT NULL,
+    status INTEGER NOT NULL REFERENCES statuses (id),
+    card_type INTEGER NOT NULL REFERENCES card_types (id),
+    region INTEGER NOT NULL REFERENCES regions (id),
+    reasons INTEGER NOT NULL DEFAULT 0,            -- bitmask over reason_codes.bit
+    ts INTEGER NOT NULL                            -- epoch seconds
 );
+CREATE INDEX verdicts_ts ON verdicts (ts);
+CREATE INDEX verdicts_filter ON verdicts (status, region, card_type, ts);
+
+CREATE TABLE verdicts_agg (
+    bucket INTEGER NOT NULL,                       -- epoch seconds at the start of the hour
+    status INTEGER NOT NULL,
+    card_type INTEGER NOT NULL,
+    region INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bucket, status, card_type, region)
+) WITHOUT ROWID;
+CREATE TRIGGER verdicts_agg_insert AFTER INSERT ON verdicts BEGIN
+    INSERT INTO verdicts_agg (bucket, status, card_type, region, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.card_type, NEW.region, 1)
+    ON CONFLICT (bucket, status, card_type, region) DO UPDATE SET n = n + 1;
+END;
+-- The Analyst UPSERTs by msg_key; a changed verdict moves from its old bucket to its new one
+CREATE TRIGGER verdicts_agg_update AFTER UPDATE OF status, card_type, region, ts ON verdicts BEGIN
+    UPDATE verdicts_agg SET n = n - 1
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND card_type = OLD.card_type AND region = OLD.region;
+    DELETE FROM verdicts_agg
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND card_type = OLD.card_type AND region = OLD.region
+      AND n <= 0;
+    INSERT INTO verdicts_agg (bucket, status, card_type, region, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.card_type, NEW.region, 1)
+    ON CONFLICT (bucket, status, card_type, region) DO UPDATE SET n = n + 1;
+END;
+
+-- Hourly counts per reasons bitmask for the rejection-reasons chart, kept the same way as verdicts_agg
+CREATE TABLE verdicts_reasons_agg (
+    bucket INTEGER NOT NULL,                       -- epoch seconds at the start of the hour
+    status INTEGER NOT NULL,
+    reasons INTEGER NOT NULL,                      -- bitmask over reason_codes.bit
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bucket, status, reasons)
+) WITHOUT ROWID;
+CREATE TRIGGER verdicts_reasons_agg_insert AFTER INSERT ON verdicts BEGIN
+    INSERT INTO verdicts_reasons_agg (bucket, status, reasons, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.reasons, 1)
+    ON CONFLICT (bucket, status, reasons) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER verdicts_reasons_agg_update AFTER UPDATE OF status, reasons, ts ON verdicts BEGIN
+    UPDATE verdicts_reasons_agg SET n = n - 1
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND reasons = OLD.reasons;
+    DELETE FROM verdicts_reasons_agg
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND reasons = OLD.reasons AND n <= 0;
+    INSERT INTO verdicts_reasons_agg (bucket, status, reasons, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.reasons, 1)
+    ON CONFLICT (bucket, status, reasons) DO UPDATE SET n = n + 1;
+END;
+
+-- Archive part files staged by src/analyst/archive.py whose rows are already deleted, awaiting their rename
+CREATE TABLE archive_parts (path TEXT PRIMARY KEY);
+
+-- Views with the version 1 columns
+CREATE VIEW results AS
+SELECT v.card_id AS id, s.name AS status, datetime(v.ts, 'unixepoch', 'localtime') AS timestamp,
+       CASE WHEN v.reasons = 0 THEN '[]'
+            ELSE (SELECT json_group_array(name) FROM reason_codes WHERE v.reasons >> bit & 1) END AS reasons,
+       c.name AS card_type, r.name AS region
+FROM verdicts v
+JOIN statuses s ON s.id = v.status
+JOIN card_types c ON c.id = v.card_type
+JOIN regions r ON r.id = v.region;
+CREATE VIEW results_agg AS
+SELECT strftime('%Y-%m-%d %H', a.bucket, 'unixepoch', 'localtime') AS bucket, s.name AS status,
+       c.name AS card_type, r.name AS region, a.n AS n
+FROM verdicts_agg a
+JOIN statuses s ON s.id = a.status
+JOIN card_types c ON c.id = a.card_type
+JOIN regions r ON r.id = a.region;
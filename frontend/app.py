@@ -1,19 +1,62 @@
-from flask import Flask, render_template, send_from_directory, jsonify
+from flask import Flask, Response, g, render_template, request, send_from_directory, jsonify, stream_with_context
 import sqlite3
 import os
+import threading
+import time
+from frontend.live import LiveStats
+from src.analysis.charts import CHARTS, FORMATS, ChartService
+from src.analysis.queries import EXPORT_FORMATS, ResultsService, parse_filters
+from src.common import metrics
 
 app = Flask(__name__)
 
 # Set absolute path for docs/diagrams
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DIAGRAMS_DIR = os.path.join(BASE_DIR, "..", "docs", "diagrams")
+DB_PATH = os.path.join(BASE_DIR, "..", "data", "kyc_results.db")
+
+# Charts are rendered on request; matplotlib is only imported by the render workers
+charts = ChartService(DB_PATH, cache_size=int(os.getenv("CHART_CACHE_SIZE", 64)),
+                      workers=int(os.getenv("CHART_WORKERS", 2)))
+
+# Individual verdicts for /results, with pages cached briefly and dropped whenever new results are stored
+results = ResultsService(DB_PATH, cache_size=int(os.getenv("RESULTS_CACHE_SIZE", 256)),
+                         ttl=float(os.getenv("RESULTS_CACHE_TTL", 5)))
+
+# Started by the first /stream viewer and shared by all of them
+live = None
+live_lock = threading.Lock()
+
+REQUESTS = metrics.REGISTRY.counter("kyc_dashboard_requests_total", "HTTP requests", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.REGISTRY.histogram("kyc_dashboard_request_seconds", "Time to build a response", ("endpoint",))
+VIEWERS = metrics.REGISTRY.gauge("kyc_dashboard_stream_viewers", "Open /stream connections")
+CHART_CACHE = metrics.REGISTRY.gauge("kyc_dashboard_chart_cache_entries", "Rendered charts held in the LRU")
+CHART_CACHE.set_function(lambda: len(charts.cache))
+RESULTS_CACHE = metrics.REGISTRY.gauge("kyc_dashboard_results_cache_entries", "Result pages held in the cache")
+RESULTS_CACHE.set_function(lambda: len(results.cache))
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Streaming responses are timed up to their first byte; endpoint is None for unmatched URLs
+    endpoint = request.endpoint or "unknown"
+    REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.started)
+    REQUESTS.labels(endpoint, str(response.status_code)).inc()
+    return response
 
 def get_stats():
     """Query kyc_results.db for verification stats."""
     try:
-        db_path = os.path.join(BASE_DIR, "..", "data", "kyc_results.db")
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status")
+        # Read-only, so polling before the Analyst has run does not leave an empty database behind
+        with sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True) as conn:
+            try:
+                # Summary table maintained by the Analyst; stays small however many results are stored
+                cursor = conn.execute("SELECT status, SUM(n) FROM results_agg GROUP BY status")
+            except sqlite3.OperationalError:
+                cursor = conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status")
             stats = dict(cursor.fetchall())
             total = sum(stats.values())
             rejection_rate = (stats.get("rejected", 0) / total * 100) if total > 0 else 0
@@ -27,6 +70,16 @@ def get_stats():
         print(f"Error fetching stats: {e}")
         return {"approved": 0, "rejected": 0, "total": 0, "rejection_rate": 0}
 
+def get_live():
+    """Return the shared LiveStats feed, starting it on first use."""
+    global live
+    with live_lock:
+        if live is None and os.getenv("DASHBOARD_LIVE", "1") != "0":
+            live = LiveStats(get_stats, push_ms=int(os.getenv("DASHBOARD_PUSH_MS", 250)),
+                             resync_seconds=int(os.getenv("DASHBOARD_RESYNC_SECONDS", 60)))
+            live.start()
+        return live
+
 @app.route("/")
 def dashboard():
     """Render the KYC dashboard."""
@@ -42,8 +95,79 @@ def dashboard():
 @app.route("/stats")
 def stats():
     """Return JSON stats for real-time updates."""
+    # Served from memory while the live feed runs, so polling clients do not hit the database either
+    if live is not None:
+        return jsonify(live.snapshot())
     return jsonify(get_stats())
 
+@app.route("/stream")
+def stream():
+    """Push stats to the browser as Server-Sent Events."""
+    feed = get_live()
+    if feed is None:
+        return "Live updates disabled", 503
+    def events():
+        VIEWERS.inc()
+        try:
+            yield from feed.stream()
+        finally:
+            VIEWERS.dec()
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/charts/<name>.<fmt>")
+def chart(name, fmt):
+    """Render a chart from the aggregates, answering 304 when the browser's copy is current."""
+    if name not in CHARTS or fmt not in FORMATS:
+        return "Unknown chart", 404
+    try:
+        rendered = charts.get(name, fmt, hours=request.args.get("hours", type=int))
+    except sqlite3.Error as e:
+        print(f"Chart {name} unavailable: {e}")
+        return "No data yet", 503
+    response = Response(rendered.body, mimetype=rendered.mimetype)
+    response.set_etag(rendered.etag)
+    response.last_modified = rendered.last_modified
+    # Browsers keep the image but revalidate each time, which costs a 304 while the data is unchanged
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/results")
+def results_page():
+    """Verdicts matching the filters, newest first; `next` is the cursor for the following page."""
+    try:
+        page = results.page(parse_filters(request.args.to_dict(flat=False)), request.args.get("cursor"),
+                            request.args.get("limit", 100, type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        print(f"Results unavailable: {e}")
+        return jsonify({"error": "No data yet"}), 503
+    return jsonify(page)
+
+@app.route("/results.<fmt>")
+def results_export(fmt):
+    """Stream every verdict matching the filters as CSV or NDJSON."""
+    if fmt not in EXPORT_FORMATS:
+        return "Unknown format", 404
+    try:
+        chunks = results.export(parse_filters(request.args.to_dict(flat=False)), fmt, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        print(f"Results unavailable: {e}")
+        return "No data yet", 503
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=results.{fmt}"})
+
+@app.route("/metrics")
+@app.route("/profile", endpoint="profile")
+@app.route("/profile/<action>", endpoint="profile_action", methods=["POST"])
+def metrics_endpoint(action=None):
+    """Prometheus scrape endpoint and the sampling profiler switch (see src.common.metrics.handle)."""
+    status, content_type, body = metrics.handle(request.path, request.query_string.decode(), method=request.method)
+    return Response(body, status=status, content_type=content_type)
+
 @app.route("/docs/diagrams/<path:filename>")
 def serve_diagrams(filename):
     """Serve PNGs from docs/diagrams."""
@@ -59,4 +183,4 @@ def serve_diagrams(filename):
         return "Error serving file", 500
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=True, host="0.0.0.0", port=5000, threaded=True)
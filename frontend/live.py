@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.common.batch import decode_payload
+from src.common.binary import topics
+from src.common.dedup import cache_from_env, payload_key
+
+class LiveStats:
+    """Rolling verification totals fed by kyc/result, pushed to dashboards as SSE events.
+
+    Counters are seeded from the database (`seed`, a callable returning the
+    `/stats` dict) on connect and every `resync_seconds`, so totals match the
+    Analyst's table whatever happened while disconnected. Updates are coalesced:
+    at most one event is built per `push_ms`, and every viewer receives that same
+    pre-encoded event, so extra viewers cost neither database queries nor JSON work.
+    """
+
+    def __init__(self, seed, push_ms=250, resync_seconds=60):
+        self.seed = seed
+        self.push_interval = push_ms / 1000
+        self.resync_seconds = resync_seconds
+        self.lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.counts = {"approved": 0, "rejected": 0}
+        self.pending = {"approved": 0, "rejected": 0}
+        self.version = 0
+        self.event = None
+        self.client = None
+        self.running = False
+        # Redelivered results would otherwise be counted twice until the next resync
+        self.dedup = cache_from_env()
+        self.resync()
+        self.publish_event()
+
+    def start(self):
+        load_dotenv()
+        self.running = True
+        self.client = mqtt.Client(client_id=f"Dashboard-{uuid.uuid4().hex[:8]}",
+                                  callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        # connect_async lets the network thread keep retrying while the broker is down
+        self.client.connect_async(os.getenv("MQTT_BROKER", "localhost"), int(os.getenv("MQTT_PORT", 1883)), keepalive=60)
+        self.client.loop_start()
+        threading.Thread(target=self._pusher, name="LiveStatsPusher", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        client.subscribe([(topic, 0) for topic in topics("kyc/result")])
+        # Results published while we were away are in the database, not on the wire
+        self.resync()
+
+    def on_message(self, client, userdata, msg):
+        if self.dedup is not None and self.dedup.seen(payload_key(msg.payload)):
+            return
+        try:
+            _, results, _ = decode_payload(msg.payload)
+        except Exception as e:
+            print(f"Dashboard could not decode result: {e}")
+            return
+        self.add(results)
+
+    def add(self, results):
+        with self.lock:
+            for result in results:
+                status = result.get("status")
+                if status in self.counts:
+                    self.counts[status] += 1
+                    self.pending[status] += 1
+
+    def resync(self):
+        stats = self.seed()
+        with self.lock:
+            self.counts = {"approved": stats["approved"], "rejected": stats["rejected"]}
+            self.pending = {"approved": 0, "rejected": 0}
+            self.synced_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            approved, rejected = self.counts["approved"], self.counts["rejected"]
+        total = approved + rejected
+        return {"approved": approved, "rejected": rejected, "total": total,
+                "rejection_rate": round(rejected / total * 100, 2) if total else 0}
+
+    def publish_event(self):
+        with self.lock:
+            delta, self.pending = self.pending, {"approved": 0, "rejected": 0}
+        stats = self.snapshot()
+        stats["delta"] = delta
+        with self.changed:
+            self.version += 1
+            self.event = f"id: {self.version}\nevent: stats\ndata: {json.dumps(stats)}\n\n"
+            self.changed.notify_all()
+
+    def _pusher(self):
+        last = None
+        while self.running:
+            time.sleep(self.push_interval)
+            if self.resync_seconds and time.monotonic() - self.synced_at >= self.resync_seconds:
+                try:
+                    self.resync()
+                except Exception as e:
+                    print(f"Dashboard resync failed: {e}")
+            current = self.snapshot()
+            if current != last:
+                self.publish_event()
+                last = current
+
+    def wait(self, version, timeout):
+        # Returns (version, event) as soon as a newer event exists, or (version, None) after timeout
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            if self.version == version:
+                return version, None
+            return self.version, self.event
+
+    def stream(self, keepalive=15):
+        # Generator for one SSE connection: the current totals first, then every newer event
+        version = 0
+        while True:
+            version, event = self.wait(version, keepalive)
+            yield event if event is not None else ": keepalive\n\n"
@@ -1,16 +1,41 @@
 document.addEventListener("DOMContentLoaded", () => {
+    const render = (stats) => {
+        document.getElementById("total").textContent = stats.total;
+        document.getElementById("approved").textContent = stats.approved;
+        document.getElementById("rejected").textContent = stats.rejected;
+        document.getElementById("rejection-rate").textContent = stats.rejection_rate + "%";
+    };
     const updateStats = async () => {
         try {
             const response = await fetch("/stats");
-            const stats = await response.json();
-            document.getElementById("total").textContent = stats.total;
-            document.getElementById("approved").textContent = stats.approved;
-            document.getElementById("rejected").textContent = stats.rejected;
-            document.getElementById("rejection-rate").textContent = stats.rejection_rate + "%";
+            render(await response.json());
         } catch (error) {
             console.error("Error updating stats:", error);
         }
     };
-    setInterval(updateStats, 10000); // Update every 10s
-    updateStats();
+
+    // Poll every 10s only while the live stream is unavailable
+    let pollTimer = null;
+    const startPolling = () => {
+        if (pollTimer === null) {
+            updateStats();
+            pollTimer = setInterval(updateStats, 10000);
+        }
+    };
+    const stopPolling = () => {
+        if (pollTimer !== null) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    };
+
+    if (window.EventSource) {
+        const source = new EventSource("/stream");
+        source.addEventListener("stats", (event) => render(JSON.parse(event.data)));
+        source.onopen = stopPolling;
+        // The browser reconnects on its own; polling covers the gap (or takes over if /stream is disabled)
+        source.onerror = startPolling;
+    } else {
+        startPolling();
+    }
 });
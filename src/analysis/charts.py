@@ -0,0 +1,179 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Each chart: title and figure size in inches
+CHARTS = {
+    "status_pie": ("KYC Verification Status", (8, 6)),
+    "card_type_heatmap": ("Verification by Card Type", (10, 6)),
+    "region_heatmap": ("Verification by Region", (10, 6)),
+    "rejection_reasons": ("Rejection Reasons", (8, 4)),
+    "rejection_heatmap": ("Rejection Rates by Region (%)", (8, 2)),
+}
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+AGG_SQL = "SELECT bucket, status, card_type, region, n FROM results_agg WHERE bucket >= ?"
+REASONS_SQL = """
+SELECT a.reasons, SUM(a.n) FROM verdicts_reasons_agg a
+WHERE a.status = (SELECT id FROM statuses WHERE name = 'rejected') AND a.bucket >= ?
+GROUP BY a.reasons
+"""
+
+Chart = namedtuple("Chart", ["body", "mimetype", "etag", "last_modified"])
+
+def load_data(conn, hours=None):
+    # Everything a chart needs, as plain tuples: small (aggregate rows), picklable for the worker pool and hashable
+    since = time.time() - hours * 3600 if hours else 0
+    bucket = time.strftime("%Y-%m-%d %H", time.localtime(since)) if hours else ""
+    agg = conn.execute(AGG_SQL, (bucket,)).fetchall()
+    names = dict(conn.execute("SELECT bit, name FROM reason_codes"))
+    reasons = []
+    # Whole hours, like the buckets of AGG_SQL, so every chart counts the same rows
+    for mask, count in conn.execute(REASONS_SQL, (int(since) - int(since) % 3600,)):
+        label = ", ".join(name for bit, name in sorted(names.items()) if mask >> bit & 1) or "None"
+        reasons.append((label, count))
+    return {"agg": sorted(agg), "reasons": sorted(reasons, key=lambda item: -item[1])}
+
+def data_digest(data):
+    return hashlib.sha1(repr(data).encode()).hexdigest()
+
+def _frame(data):
+    import pandas as pd
+    return pd.DataFrame(data["agg"], columns=["bucket", "status", "card_type", "region", "n"])
+
+def _status_pie(ax, data):
+    counts = _frame(data).groupby("status")["n"].sum().sort_values(ascending=False)
+    ax.pie(counts.values, labels=counts.index, autopct="%1.1f%%")
+
+def _heatmap(ax, data, index):
+    import seaborn as sns
+    table = _frame(data).pivot_table(index=index, columns="status", values="n", aggfunc="sum", fill_value=0)
+    sns.heatmap(table, annot=True, fmt="d", ax=ax)
+
+def _rejection_reasons(ax, data):
+    labels = [label for label, _ in data["reasons"]]
+    ax.bar(labels, [count for _, count in data["reasons"]], color="#EF5350")
+    ax.set_xlabel("Reason")
+    ax.set_ylabel("Count")
+    ax.tick_params(axis="x", labelrotation=45)
+
+def _rejection_heatmap(ax, data):
+    import seaborn as sns
+    frame = _frame(data)
+    totals = frame.groupby("region")["n"].sum()
+    rejected = frame[frame["status"] == "rejected"].groupby("region")["n"].sum()
+    rates = (rejected.reindex(totals.index, fill_value=0) / totals * 100).to_frame("rejection_rate").T
+    sns.heatmap(rates, annot=True, cmap="Reds", fmt=".1f", ax=ax)
+
+RENDERERS = {
+    "status_pie": _status_pie,
+    "card_type_heatmap": lambda ax, data: _heatmap(ax, data, "card_type"),
+    "region_heatmap": lambda ax, data: _heatmap(ax, data, "region"),
+    "rejection_reasons": _rejection_reasons,
+    "rejection_heatmap": _rejection_heatmap,
+}
+
+def render(name, data, fmt="png"):
+    # Figure objects render through Agg without touching pyplot's global state, so this is safe in any worker
+    from matplotlib.figure import Figure
+    title, size = CHARTS[name]
+    fig = Figure(figsize=size)
+    ax = fig.add_subplot()
+    if data["agg"]:
+        RENDERERS[name](ax, data)
+    else:
+        ax.text(0.5, 0.5, "No data", ha="center", va="center")
+        ax.set_axis_off()
+    ax.set_title(title)
+    fig.tight_layout()
+    out = io.BytesIO()
+    fig.savefig(out, format=fmt)
+    return out.getvalue()
+
+def write_charts(data, directory="docs/diagrams", names=CHARTS):
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        with open(os.path.join(directory, f"{name}.png"), "wb") as f:
+            f.write(render(name, data))
+
+class ChartService:
+    """Renders charts from the aggregate tables on request, memoized by data version.
+
+    A read-only connection checks `PRAGMA data_version`, which only changes when
+    another connection commits, so unchanged data costs one pragma per request.
+    Rendered charts are kept in an LRU keyed by chart, format, window and a digest
+    of the data they were drawn from. The digest doubles as the ETag, so it stays
+    valid across restarts. Rendering runs in a process pool created on first use.
+    """
+
+    def __init__(self, db_path, cache_size=64, workers=2):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.snapshots = {}
+        self.conn = None
+        self.pool = None
+
+    def connect(self):
+        # mode=ro: a missing database is an error instead of a new empty file
+        return sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+
+    def snapshot(self, hours=None):
+        with self.lock:
+            if self.conn is None:
+                self.conn = self.connect()
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            # A time window also moves on with the clock, one aggregate bucket per hour
+            key = (hours, int(time.time() // 3600) if hours else None)
+            cached = self.snapshots.get(key)
+            if cached is None or cached[0] != version:
+                data = load_data(self.conn, hours)
+                digest = data_digest(data)
+                modified = cached[3] if cached is not None and cached[1] == digest else time.time()
+                self.snapshots = {k: v for k, v in self.snapshots.items() if k[0] != hours}
+                cached = self.snapshots[key] = (version, digest, data, modified)
+            return cached[1:]
+
+    def executor(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def get(self, name, fmt="png", hours=None):
+        digest, data, modified = self.snapshot(hours)
+        key = (name, fmt, hours, digest)
+        with self.lock:
+            future = self.cache.get(key)
+            if future is None:
+                # Concurrent requests for the same chart share one render
+                future = self.cache[key] = self.executor().submit(render, name, data, fmt)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(key)
+        try:
+            body = future.result()
+        except Exception:
+            with self.lock:
+                if self.cache.get(key) is future:
+                    del self.cache[key]
+            raise
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        return Chart(body, FORMATS[fmt], etag, modified)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
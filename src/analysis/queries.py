@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Query parameter, verdicts column and lookup table of each dimension filter
+DIMENSIONS = (("status", "status", "statuses"), ("region", "region", "regions"), ("card_type", "card_type", "card_types"))
+FIELDS = ("id", "status", "timestamp", "reasons", "card_type", "region")
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d")
+MAX_LIMIT = 1000
+# SQLite binds Python ints as signed 64-bit INTEGERs
+MAX_INTEGER = 2 ** 63
+
+Filters = namedtuple("Filters", ["status", "region", "card_type", "reason", "since", "until", "hours"])
+
+def in_range(number, value):
+    # inf, nan and numbers outside int64 would only fail later, when the query is bound
+    if not math.isfinite(number) or abs(number) >= MAX_INTEGER:
+        raise ValueError(f"{value!r} is out of range")
+    return number
+
+def parse_time(value):
+    # Epoch seconds, or a local date/time as the results view prints it
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        return int(in_range(seconds, value))
+    for fmt in TIME_FORMATS:
+        try:
+            return int(time.mktime(time.strptime(value, fmt)))
+        except (ValueError, OverflowError):
+            continue
+    raise ValueError(f"Unrecognized time {value!r}, use epoch seconds or YYYY-MM-DD[ HH:MM[:SS]]")
+
+def parse_filters(args):
+    """Filters from query parameters given as {name: [values]}.
+
+    status, region, card_type and reason take several values, repeated or
+    comma-separated; since/until are a time range and hours a window ending now.
+    """
+    def values(name):
+        return tuple(sorted({value for arg in args.get(name, ()) for value in arg.split(",") if value}))
+    def single(name, convert):
+        given = args.get(name)
+        return convert(given[-1]) if given and given[-1] else None
+    try:
+        hours = single("hours", float)
+    except ValueError:
+        raise ValueError("hours must be a number")
+    if hours is not None:
+        in_range(hours * 3600, args["hours"][-1])
+    return Filters(values("status"), values("region"), values("card_type"), values("reason"),
+                   single("since", parse_time), single("until", parse_time), hours)
+
+def parse_cursor(cursor):
+    try:
+        ts, rowid = map(int, cursor.split("."))
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if abs(ts) >= MAX_INTEGER or abs(rowid) >= MAX_INTEGER:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return ts, rowid
+
+class Lookups:
+    """Both directions of the lookup tables of one connection."""
+
+    def __init__(self, conn):
+        self.ids = {table: dict(conn.execute(f"SELECT name, id FROM {table}")) for _, _, table in DIMENSIONS}
+        self.names = {table: {code: name for name, code in ids.items()} for table, ids in self.ids.items()}
+        self.bits = dict(conn.execute("SELECT name, bit FROM reason_codes"))
+        self.reason_names = sorted((bit, name) for name, bit in self.bits.items())
+        self.last_ts = (None, None)
+
+    def timestamp(self, ts):
+        # Pages are newest first and mostly share a second with the previous row
+        last, text = self.last_ts
+        if ts != last:
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            self.last_ts = (ts, text)
+        return text
+
+    def result(self, row):
+        ts, _, card_id, status, card_type, region, reasons = row
+        return {"id": card_id, "status": self.names["statuses"].get(status),
+                "timestamp": self.timestamp(ts),
+                "reasons": [name for bit, name in self.reason_names if reasons >> bit & 1] if reasons else [],
+                "card_type": self.names["card_types"].get(card_type), "region": self.names["regions"].get(region)}
+
+def build_query(lookups, filters, cursor=None, limit=100, now=None):
+    """SQL and parameters for one page, newest first; None when no row can match."""
+    clauses, params = [], []
+    for name, column, table in DIMENSIONS:
+        names = getattr(filters, name)
+        if names:
+            codes = [lookups.ids[table][value] for value in names if value in lookups.ids[table]]
+            if not codes:
+                return None
+            clauses.append(f"{column} IN ({', '.join('?' * len(codes))})")
+            params += codes
+    if filters.reason:
+        mask = sum(1 << lookups.bits[reason] for reason in filters.reason if reason in lookups.bits)
+        if not mask:
+            return None
+        clauses.append("reasons & ? != 0")
+        params.append(mask)
+    since = filters.since
+    if filters.hours is not None:
+        # Clamped, since a window reaching back almost 2**63 seconds can round past the int64 minimum
+        window_start = max(int((now or time.time()) - filters.hours * 3600), 1 - MAX_INTEGER)
+        since = max(since, window_start) if since is not None else window_start
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if filters.until is not None:
+        clauses.append("ts < ?")
+        params.append(filters.until)
+    if cursor is not None:
+        # Keyset pagination: continue below the last (ts, rowid) served instead of OFFSET-skipping rows
+        clauses.append("(ts, rowid) < (?, ?)")
+        params += parse_cursor(cursor)
+    # With one value per dimension, verdicts_filter (status, region, card_type, ts) yields the page in order.
+    # Otherwise walking verdicts_ts newest first and stopping at `limit` matches beats sorting every match.
+    exact = all(len(getattr(filters, name)) == 1 for name, _, _ in DIMENSIONS)
+    index = "verdicts_filter" if exact else "verdicts_ts"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = (f"SELECT ts, rowid, card_id, status, card_type, region, reasons FROM verdicts INDEXED BY {index} "
+           f"{where} ORDER BY ts DESC, rowid DESC LIMIT ?")
+    return sql, params + [limit]
+
+def format_rows(results, fmt, header=False):
+    if fmt == "ndjson":
+        return "".join(json.dumps(result) + "\n" for result in results)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(FIELDS)
+    # reasons as a JSON list, the way the results view and analysis_results.csv show them
+    writer.writerows([[result["id"], result["status"], result["timestamp"], json.dumps(result["reasons"]),
+                       result["card_type"], result["region"]] for result in results])
+    return out.getvalue()
+
+class ResultsService:
+    """Filtered, keyset-paginated reads of individual verdicts.
+
+    Pages are cached for `ttl` seconds, keyed by filters, cursor and limit. A
+    read-only connection checks `PRAGMA data_version`, which changes when the
+    Analyst commits, and any change drops the whole cache, so a new ingest is
+    visible on the next request. Exports stream every match on a connection of
+    their own and are not cached.
+    """
+
+    def __init__(self, db_path, cache_size=256, ttl=5.0):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.conn = None
+        self.version = None
+        self.lookups = None
+
+    def connect(self):
+        # mode=ro: a missing database is an error instead of a new empty file
+        return sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+
+    def refresh(self):
+        # Called under the lock: new data (and possibly new lookup names) invalidates everything cached
+        if self.conn is None:
+            self.conn = self.connect()
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.version or self.lookups is None:
+            self.cache.clear()
+            self.lookups = Lookups(self.conn)
+            self.version = version
+
+    def page(self, filters, cursor=None, limit=100):
+        """{"results": [...], "count": n, "next": cursor of the following page or None}."""
+        limit = max(1, min(limit, MAX_LIMIT))
+        key = (filters, cursor, limit)
+        with self.lock:
+            self.refresh()
+            cached = self.cache.get(key)
+            now = time.monotonic()
+            if cached is not None and cached[0] > now:
+                self.cache.move_to_end(key)
+                return cached[1]
+            page = self.read_page(self.conn, self.lookups, filters, cursor, limit)
+            self.cache[key] = (now + self.ttl, page)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return page
+
+    def read_page(self, conn, lookups, filters, cursor, limit, now=None):
+        query = build_query(lookups, filters, cursor, limit + 1, now)
+        rows = conn.execute(*query).fetchall() if query is not None else []
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"results": [lookups.result(row) for row in rows], "count": len(rows),
+                "next": f"{rows[-1][0]}.{rows[-1][1]}" if more else None}
+
+    def export(self, filters, fmt="csv", cursor=None, chunk_size=5000):
+        """Yield every match as CSV or NDJSON text, one keyset page per chunk."""
+        # Validate before the response starts, so bad filters are still a 400
+        if cursor is not None:
+            parse_cursor(cursor)
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}")
+        conn = self.connect()
+        try:
+            lookups = Lookups(conn)
+        except Exception:
+            conn.close()
+            raise
+        # An `hours` window is fixed when the export starts
+        now = time.time()
+        def chunks():
+            # Separate read transactions per page, so a long download never holds back WAL checkpoints
+            next_cursor = cursor
+            try:
+                if fmt == "csv":
+                    yield format_rows([], fmt, header=True)
+                while True:
+                    page = self.read_page(conn, lookups, filters, next_cursor, chunk_size, now)
+                    if page["results"]:
+                        yield format_rows(page["results"], fmt)
+                    next_cursor = page["next"]
+                    if next_cursor is None:
+                        break
+            finally:
+                conn.close()
+        return chunks()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self.cache.clear()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import time
+import uuid
+from dotenv import load_dotenv
+from src.analyst.analyst import DECODE_SECONDS, DUPLICATES, ERRORS, MESSAGES, analyze_db, init_db
+from src.analyst.db_writer import writer_from_env
+from src.common.aio_mqtt import AsyncClient
+from src.common.batch import decode_payload
+from src.common.binary import topics as binary_topics
+from src.common.dedup import cache_from_env, payload_key
+from src.common.logs import configure
+from src.common.metrics import quiet, serve_from_env
+
+class AsyncAnalyst:
+    """asyncio variant of Analyst: results are handed to the same group-commit DBWriter.
+
+    Enqueueing normally never blocks; only when the writer queue is full does a
+    message wait, in an executor thread, so the event loop keeps serving the socket.
+    """
+
+    def __init__(self, client_id=None, topics=binary_topics("kyc/result"), share_group=None, db_path="data/kyc_results.db"):
+        load_dotenv()
+        self.broker = os.getenv("MQTT_BROKER", "localhost")
+        self.port = int(os.getenv("MQTT_PORT", 1883))
+        self.qos = int(os.getenv("MQTT_QOS", 1))
+        self.client_id = client_id or f"AsyncAnalyst-{uuid.uuid4().hex[:8]}"
+        self.topics = [f"$share/{share_group}/{topic}" if share_group else topic for topic in topics]
+        self.db_path = db_path
+        self.mqtt = AsyncClient(self.client_id, self.broker, self.port)
+        init_db(self.db_path)
+        self.writer = writer_from_env(self.db_path)
+        self.dedup = cache_from_env()
+        self.quiet = quiet()
+
+    async def start(self):
+        await self.mqtt.connect()
+        for topic in self.topics:
+            await self.mqtt.subscribe(topic, qos=self.qos)
+            logging.info(f"{self.client_id} subscribed to {topic}")
+
+    async def store(self, results):
+        try:
+            self.writer.put_many(results, block=False)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self.writer.put_many, results)
+
+    async def run(self):
+        async for msg in self.mqtt.messages():
+            MESSAGES.inc()
+            if self.dedup is not None and self.dedup.seen(payload_key(msg.payload)):
+                DUPLICATES.inc()
+                continue
+            try:
+                start = time.perf_counter()
+                batch_id, results, _ = decode_payload(msg.payload)
+                DECODE_SECONDS.observe(time.perf_counter() - start)
+                await self.store(results)
+                if not self.quiet:
+                    if batch_id is None:
+                        logging.info("Stored %s", results[0].get("id"),
+                                     extra={"result": results[0], "sample": results[0].get("status")})
+                    else:
+                        logging.info("Stored batch %s: %d results", batch_id, len(results), extra={"batch_id": batch_id})
+            except Exception as e:
+                ERRORS.inc()
+                logging.error(f"Message processing error: {e}")
+
+    async def analyze(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.writer.flush)
+        await loop.run_in_executor(None, analyze_db, self.db_path)
+
+    async def close(self):
+        await self.mqtt.disconnect()
+        await asyncio.get_running_loop().run_in_executor(None, self.writer.close)
+        logging.info(f"{self.client_id} closed: {self.writer.stats()}")
+
+async def serve(duration=None):
+    analyst = AsyncAnalyst()
+    await analyst.start()
+    metrics_server = serve_from_env("ANALYST_METRICS_PORT")
+    print("Running async Analyst" + (f" for {duration} seconds" if duration else ""))
+    try:
+        if duration:
+            try:
+                await asyncio.wait_for(analyst.run(), timeout=duration)
+            except asyncio.TimeoutError:
+                pass
+            await analyst.analyze()
+        else:
+            await analyst.run()
+    finally:
+        await analyst.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio KYC Analyst")
+    parser.add_argument("--duration", type=float, default=None, help="Collect for this many seconds, then analyze and exit")
+    args = parser.parse_args()
+    configure("data/analyst.log")
+    try:
+        asyncio.run(serve(args.duration))
+    except KeyboardInterrupt:
+        pass
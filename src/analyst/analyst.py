@@ -1,14 +1,90 @@
 import paho.mqtt.client as mqtt
-import json
+import argparse
+import csv
 import sqlite3
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import logging
 import os
+import threading
 import time
-from datetime import datetime
 from dotenv import load_dotenv
+from src.analyst.archive import ARCHIVE_DIR, archive, history
+from src.analyst.db_writer import writer_from_env
+from src.analyst.streaming import analytics_from_env
+from src.analyst.migrations import migrate
+from src.analysis.charts import write_charts
+from src.common.batch import decode_payload
+from src.common.binary import topics
+from src.common.dedup import cache_from_env, payload_key
+from src.common.logs import configure
+from src.common.metrics import REGISTRY, quiet, serve_from_env
+
+def init_db(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = migrate(conn)
+    finally:
+        conn.close()
+    logging.info(f"Database initialized at schema version {version}")
+
+def read_aggregates(conn):
+    return pd.read_sql_query(
+        "SELECT status, card_type, region, SUM(n) AS n FROM results_agg GROUP BY status, card_type, region", conn)
+
+def read_range(db_path, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    # Only the three dimension columns are read, and only from partitions overlapping the range
+    frame = history(db_path, ("status", "card_type", "region"), start, end, archive_dir)
+    return frame.groupby(["status", "card_type", "region"]).size().rename("n").reset_index()
+
+def export_results(conn, path, chunk_size=10000):
+    # Streams the table to CSV in chunks instead of materializing it as one DataFrame
+    cursor = conn.execute("SELECT * FROM results")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+
+def analyze_db(db_path, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    # All-time figures come from the aggregate table; a time range is read from the archive plus the hot table
+    try:
+        if start is None and end is None:
+            with sqlite3.connect(db_path) as conn:
+                agg = read_aggregates(conn)
+        else:
+            agg = read_range(db_path, start, end, archive_dir)
+        if agg.empty:
+            print("No data to analyze")
+            logging.info("No data to analyze")
+            return
+        counts = agg.groupby("status")["n"].sum().sort_values(ascending=False).rename("count")
+        rejection_rate = counts.get("rejected", 0) / counts.sum() * 100
+        type_counts = agg.pivot_table(index="card_type", columns="status", values="n", aggfunc="sum", fill_value=0)
+        region_counts = agg.pivot_table(index="region", columns="status", values="n", aggfunc="sum", fill_value=0)
+        print(f"Verification Stats: {counts.to_dict()}")
+        print(f"Rejection Rate: {rejection_rate:.2f}%")
+        print(f"By Card Type:\n{type_counts}")
+        print(f"By Region:\n{region_counts}")
+        logging.info(f"Stats: {counts.to_dict()}, Rejection: {rejection_rate:.2f}%")
+        data = {"agg": [("",) + tuple(row) for row in agg.itertuples(index=False)], "reasons": []}
+        write_charts(data, names=("status_pie", "card_type_heatmap", "region_heatmap"))
+        with sqlite3.connect(db_path) as conn:
+            export_results(conn, "data/analysis_results.csv")
+        logging.info("Exported analysis results")
+    except Exception as e:
+        logging.error(f"Analysis error: {e}")
+
+MESSAGES = REGISTRY.counter("kyc_analyst_messages_total", "Messages received on kyc/result")
+ERRORS = REGISTRY.counter("kyc_analyst_errors_total", "Messages that could not be processed")
+DUPLICATES = REGISTRY.counter("kyc_analyst_duplicates_total", "Redelivered messages skipped by the dedup cache")
+DECODE_SECONDS = REGISTRY.histogram("kyc_analyst_decode_seconds", "Time to decode one kyc/result payload")
+RESULTS = REGISTRY.counter("kyc_analyst_results_total", "Results by what the DB writer did with them", ("outcome",))
+QUEUE_DEPTH = REGISTRY.gauge("kyc_analyst_queue_depth", "Result batches waiting for the DB writer")
 
 class Analyst:
     def __init__(self):
@@ -21,94 +97,128 @@ class Analyst:
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.setup_logging()
+        self.quiet = quiet()
+        # Redeliveries within DEDUP_TTL are dropped here; older ones are absorbed by the UPSERT on msg_key
+        self.dedup = cache_from_env()
         self.setup_db()
+        self.writer = writer_from_env(self.db_path)
+        self.setup_archive()
+        self.setup_streaming()
+        self.setup_metrics()
         try:
             self.client.connect(self.broker, self.port, keepalive=60)
             self.client.loop_start()
+            if self.analytics is not None:
+                self.analytics.start()
             logging.info("Analyst connected")
         except Exception as e:
             logging.error(f"Connection failed: {e}")
             raise
 
     def setup_logging(self):
-        os.makedirs("data", exist_ok=True)
-        logging.basicConfig(filename="data/analyst.log", level=logging.INFO,
-                           format="%(asctime)s - %(levelname)s - %(message)s")
+        configure("data/analyst.log")
         logging.info("Analyst initialized")
 
     def setup_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("CREATE TABLE IF NOT EXISTS results (id TEXT, status TEXT, timestamp TEXT, reasons TEXT, card_type TEXT, region TEXT)")
-        logging.info("Database initialized")
+        init_db(self.db_path)
+
+    def setup_archive(self):
+        # Rows older than ANALYST_ARCHIVE_DAYS move to data/archive every ANALYST_ARCHIVE_INTERVAL seconds (0 = off)
+        self.archive_days = float(os.getenv("ANALYST_ARCHIVE_DAYS", 0))
+        self.archive_interval = float(os.getenv("ANALYST_ARCHIVE_INTERVAL", 3600))
+        self.archive_dir = os.getenv("ANALYST_ARCHIVE_DIR", ARCHIVE_DIR)
+        self.stop_archive = threading.Event()
+        if self.archive_days > 0:
+            threading.Thread(target=self.archive_loop, name="Archiver", daemon=True).start()
+
+    def archive_loop(self):
+        while True:
+            try:
+                count, parts = archive(self.db_path, int(time.time() - self.archive_days * 86400), self.archive_dir)
+                if count:
+                    print(f"Archived {count} results into {len(parts)} part(s)")
+            except Exception as e:
+                logging.error(f"Archive error: {e}")
+            if self.stop_archive.wait(self.archive_interval):
+                return
+
+    def setup_streaming(self):
+        # Windowed summaries and rejection-rate alerts on kyc/analytics/#, updated as results arrive
+        self.analytics = None
+        if os.getenv("ANALYST_STREAMING", "1") != "0":
+            self.analytics = analytics_from_env(
+                lambda topic, payload, retain: self.client.publish(topic, payload, qos=self.qos, retain=retain))
+
+    def setup_metrics(self):
+        for name in ("enqueued", "written", "duplicates", "errors", "shed"):
+            RESULTS.labels(name).set_function(lambda name=name: self.writer.counters[name])
+        QUEUE_DEPTH.set_function(self.writer.queue_depth)
+        self.metrics_server = serve_from_env("ANALYST_METRICS_PORT")
 
     def on_connect(self, client, userdata, flags, reason_code, properties):
         print(f"Analyst connected with code {reason_code}")
-        client.subscribe("kyc/result", qos=self.qos)
-        logging.info("Subscribed to kyc/result")
+        # JSON results on kyc/result, binary ones on kyc/result/bin
+        client.subscribe([(topic, self.qos) for topic in topics("kyc/result")])
+        logging.info("Subscribed to kyc/result and kyc/result/bin")
 
     def on_message(self, client, userdata, msg):
+        MESSAGES.inc()
+        if self.dedup is not None and self.dedup.seen(payload_key(msg.payload)):
+            DUPLICATES.inc()
+            return
         try:
-            result = json.loads(msg.payload.decode())
-            timestamp = result.get("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            reasons = json.dumps(result.get("reasons", []))
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("INSERT INTO results (id, status, timestamp, reasons, card_type, region) VALUES (?, ?, ?, ?, ?, ?)",
-                            (result["id"], result["status"], timestamp, reasons, result.get("card_type", "Unknown"), result.get("region", "Unknown")))
-                conn.commit()
-            print(f"Stored: {result}")
-            logging.info(f"Stored: {result}")
+            start = time.perf_counter()
+            batch_id, results, _ = decode_payload(msg.payload)
+            DECODE_SECONDS.observe(time.perf_counter() - start)
+            if self.analytics is not None:
+                self.analytics.add(results)
+            if batch_id is None:
+                result = results[0]
+                self.writer.put(result)
+                if not self.quiet:
+                    print(f"Stored: {result}")
+                    logging.info("Stored %s", result.get("id"), extra={"result": result, "sample": result.get("status")})
+            else:
+                # The whole batch is queued as one unit, so it is committed in a single transaction
+                self.writer.put_many(results)
+                if not self.quiet:
+                    print(f"Stored batch {batch_id}: {len(results)} results")
+                    logging.info("Stored batch %s: %d results", batch_id, len(results), extra={"batch_id": batch_id})
         except Exception as e:
+            ERRORS.inc()
             logging.error(f"Message processing error: {e}")
 
-    def analyze(self):
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql_query("SELECT * FROM results", conn)
-            if df.empty:
-                print("No data to analyze")
-                logging.info("No data to analyze")
-                return
-            counts = df["status"].value_counts()
-            rejection_rate = counts.get("rejected", 0) / len(df) * 100
-            type_counts = df.groupby(["card_type", "status"]).size().unstack(fill_value=0)
-            region_counts = df.groupby(["region", "status"]).size().unstack(fill_value=0)
-            print(f"Verification Stats: {counts.to_dict()}")
-            print(f"Rejection Rate: {rejection_rate:.2f}%")
-            print(f"By Card Type:\n{type_counts}")
-            print(f"By Region:\n{region_counts}")
-            logging.info(f"Stats: {counts.to_dict()}, Rejection: {rejection_rate:.2f}%")
-            os.makedirs("docs/diagrams", exist_ok=True)
-            plt.figure(figsize=(8, 6))
-            counts.plot(kind="pie", autopct="%1.1f%%")
-            plt.title("KYC Verification Status")
-            plt.savefig("docs/diagrams/status_pie.png")
-            plt.close()
-            plt.figure(figsize=(10, 6))
-            sns.heatmap(type_counts, annot=True, fmt="d")
-            plt.title("Verification by Card Type")
-            plt.savefig("docs/diagrams/card_type_heatmap.png")
-            plt.close()
-            plt.figure(figsize=(10, 6))
-            sns.heatmap(region_counts, annot=True, fmt="d")
-            plt.title("Verification by Region")
-            plt.savefig("docs/diagrams/region_heatmap.png")
-            plt.close()
-            df.to_csv("data/analysis_results.csv", index=False)
-            logging.info("Exported analysis results")
-        except Exception as e:
-            logging.error(f"Analysis error: {e}")
+    def analyze(self, start=None, end=None):
+        analyze_db(self.db_path, start, end, self.archive_dir)
 
     def close(self):
+        self.stop_archive.set()
+        if self.analytics is not None:
+            self.analytics.stop()
         self.client.loop_stop()
         self.client.disconnect()
+        self.writer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
         logging.info("Analyst closed")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KYC Analyst")
+    parser.add_argument("--duration", type=float, default=90,
+                        help="Collect for this many seconds, then analyze and exit (0 runs until Ctrl+C)")
+    args = parser.parse_args()
+    analyst = Analyst()
     try:
-        analyst = Analyst()
-        print("Running Analyst for 90 seconds to collect data...")
-        time.sleep(90)  # Extended for full pipeline
+        if args.duration:
+            print(f"Running Analyst for {args.duration:g} seconds to collect data...")
+            time.sleep(args.duration)
+        else:
+            print("Running Analyst; window summaries and alerts are published on kyc/analytics/#")
+            while True:
+                time.sleep(3600)
+        analyst.writer.flush()
         analyst.analyze()
-        analyst.close()
     except KeyboardInterrupt:
+        pass
+    finally:
         analyst.close()
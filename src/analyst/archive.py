@@ -0,0 +1,194 @@
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+ARCHIVE_DIR = "data/archive"
+COLUMNS = ("msg_key", "card_id", "status", "card_type", "region", "reasons", "ts")
+# Dictionary-encoded columns and their lookup tables
+DIMENSIONS = {"status": "statuses", "card_type": "card_types", "region": "regions"}
+ARCHIVE_SQL = """
+SELECT rowid, msg_key, card_id, status, card_type, region, reasons, ts, date(ts, 'unixepoch', 'localtime')
+FROM verdicts WHERE ts < ? AND rowid <= ? ORDER BY ts, rowid
+"""
+HOT_SQL = "SELECT {columns} FROM verdicts WHERE ts >= ? AND ts < ?"
+# Parts are staged under this suffix, which partitions() does not list, until their rows are deleted
+PENDING = ".pending"
+
+def dictionary(conn, table):
+    # Lookup names indexed by id, so a stored code is its own index into the dictionary
+    names = dict(conn.execute(f"SELECT id, name FROM {table}"))
+    return np.array([names.get(i, "") for i in range(max(names, default=0) + 1)])
+
+def reason_dictionary(conn):
+    names = dict(conn.execute("SELECT bit, name FROM reason_codes"))
+    return np.array([names.get(i, "") for i in range(max(names, default=-1) + 1)])
+
+def code_dtype(size):
+    return np.uint8 if size <= 256 else np.uint16
+
+def write_part(directory, day, rows, dictionaries):
+    # One partition directory per local day, file names carrying the rowid range. The part is written
+    # staged; archive() moves it into place once the rows are gone from the hot table.
+    _, msg_keys, card_ids, statuses, card_types, regions, reasons, ts, _ = zip(*rows)
+    part_dir = os.path.join(directory, f"day={day}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"part-{rows[0][0]}-{rows[-1][0]}.npz")
+    columns = {
+        "msg_key": np.array(msg_keys, dtype=np.int64),
+        "card_id": np.array([card_id.encode() for card_id in card_ids], dtype=np.bytes_),
+        "reasons": np.array(reasons, dtype=np.int64),
+        "ts": np.array(ts, dtype=np.int64),
+        "reason_dict": dictionaries["reasons"],
+    }
+    for name, codes in zip(DIMENSIONS, (statuses, card_types, regions)):
+        names = dictionaries[name]
+        columns[name] = np.array(codes, dtype=code_dtype(len(names)))
+        columns[f"{name}_dict"] = names
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp, path + PENDING)
+    return path
+
+def finish_parts(conn, directory):
+    """Move staged parts whose DELETE committed into place and discard those of runs that never got there."""
+    for (name,) in conn.execute("SELECT path FROM archive_parts").fetchall():
+        path = os.path.join(directory, name)
+        if os.path.exists(path + PENDING):
+            os.replace(path + PENDING, path)
+    with conn:
+        conn.execute("DELETE FROM archive_parts")
+    # Left by a run that stopped before its DELETE: the rows are still hot and get archived again
+    for stale in glob.glob(os.path.join(glob.escape(directory), "day=*", "part-*.npz" + PENDING)):
+        os.remove(stale)
+
+def archive(db_path, before, directory=ARCHIVE_DIR, part_rows=100000):
+    """Move verdicts older than `before` (epoch seconds) into day partitions and prune them from the hot table.
+
+    Aggregates are left as they are, so totals still include archived rows. Returns (rows, parts).
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        finish_parts(conn, directory)
+        dictionaries = {name: dictionary(conn, table) for name, table in DIMENSIONS.items()}
+        dictionaries["reasons"] = reason_dictionary(conn)
+        # Rows inserted while we archive get larger rowids, so the bound keeps them out of the DELETE too
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM verdicts").fetchone()[0]
+        cursor = conn.execute(ARCHIVE_SQL, (before, max_rowid))
+        count, parts, rows = 0, [], []
+        while True:
+            batch = cursor.fetchmany(10000)
+            for row in batch:
+                if rows and (row[8] != rows[-1][8] or len(rows) >= part_rows):
+                    parts.append(write_part(directory, rows[-1][8], rows, dictionaries))
+                    count += len(rows)
+                    rows = []
+                rows.append(row)
+            if not batch:
+                break
+        if rows:
+            parts.append(write_part(directory, rows[-1][8], rows, dictionaries))
+            count += len(rows)
+        # Only rows that made it into a part file are deleted. Recording the parts in the same transaction means
+        # a crash before the commit leaves only staged files to discard, and one after it only renames to finish.
+        if count:
+            with conn:
+                conn.execute("DELETE FROM verdicts WHERE ts < ? AND rowid <= ?", (before, max_rowid))
+                conn.executemany("INSERT OR REPLACE INTO archive_parts (path) VALUES (?)",
+                                 [(os.path.relpath(path, directory),) for path in parts])
+            finish_parts(conn, directory)
+        logging.info(f"Archived {count} rows into {len(parts)} part(s) under {directory}")
+        return count, parts
+    finally:
+        conn.close()
+
+def partitions(directory=ARCHIVE_DIR, start=None, end=None):
+    # Partition pruning: only day directories that can overlap [start, end) are opened
+    first = time.strftime("%Y-%m-%d", time.localtime(start)) if start is not None else None
+    last = time.strftime("%Y-%m-%d", time.localtime(end)) if end is not None else None
+    paths = []
+    for day_dir in sorted(glob.glob(os.path.join(glob.escape(directory), "day=*"))):
+        day = os.path.basename(day_dir)[4:]
+        if (first is None or day >= first) and (last is None or day <= last):
+            paths.extend(sorted(glob.glob(os.path.join(day_dir, "part-*.npz"))))
+    return paths
+
+def read_part(path, columns, start=None, end=None):
+    # np.load on .npz decompresses a member only when it is accessed, so unused columns are never read
+    with np.load(path) as part:
+        mask = None
+        if start is not None or end is not None:
+            ts = part["ts"]
+            mask = np.ones(len(ts), dtype=bool)
+            if start is not None:
+                mask &= ts >= start
+            if end is not None:
+                mask &= ts < end
+        data = {}
+        for column in columns:
+            values = part[column]
+            if mask is not None:
+                values = values[mask]
+            if column in DIMENSIONS:
+                values = part[f"{column}_dict"][values]
+            elif column == "card_id":
+                values = np.char.decode(values)
+            data[column] = values
+    return pd.DataFrame(data, columns=list(columns))
+
+def query(directory=ARCHIVE_DIR, columns=COLUMNS, start=None, end=None):
+    frames = [read_part(path, columns, start, end) for path in partitions(directory, start, end)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(frames, ignore_index=True)
+
+def read_hot(conn, columns=COLUMNS, start=None, end=None):
+    names = []
+    for column in columns:
+        if column in DIMENSIONS:
+            names.append(f"(SELECT name FROM {DIMENSIONS[column]} WHERE id = verdicts.{column}) AS {column}")
+        else:
+            names.append(column)
+    sql = HOT_SQL.format(columns=", ".join(names))
+    return pd.read_sql_query(sql, conn, params=(start if start is not None else 0,
+                                                 end if end is not None else 2 ** 62))
+
+def history(db_path, columns=COLUMNS, start=None, end=None, directory=ARCHIVE_DIR):
+    """Rows in [start, end) from archive partitions and the hot table, with dimensions decoded to names."""
+    archived = query(directory, columns, start, end)
+    with sqlite3.connect(db_path) as conn:
+        hot = read_hot(conn, columns, start, end)
+    frames = [frame for frame in (archived, hot) if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(frames, ignore_index=True)
+
+def parse_time(value):
+    return int(time.mktime(time.strptime(value, "%Y-%m-%d"))) if value else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old verification results into day-partitioned columnar files")
+    parser.add_argument("--db", default="data/kyc_results.db", help="SQLite database path")
+    parser.add_argument("--dir", default=os.getenv("ANALYST_ARCHIVE_DIR", ARCHIVE_DIR), help="Archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("archive", help="Move results older than --days into the archive")
+    run.add_argument("--days", type=float, default=float(os.getenv("ANALYST_ARCHIVE_DAYS", 7)),
+                     help="Keep this many days in the hot table")
+    summary = commands.add_parser("query", help="Count archived and hot results by status, card type and region")
+    summary.add_argument("--start", help="First day (YYYY-MM-DD)")
+    summary.add_argument("--end", help="Day after the last one (YYYY-MM-DD)")
+    args = parser.parse_args()
+    if args.command == "archive":
+        count, parts = archive(args.db, int(time.time() - args.days * 86400), args.dir)
+        print(f"Archived {count} results into {len(parts)} part(s) under {args.dir}")
+    else:
+        frame = history(args.db, ("status", "card_type", "region"), parse_time(args.start), parse_time(args.end), args.dir)
+        print(f"{len(frame)} results")
+        if not frame.empty:
+            print(frame.groupby(["status", "card_type", "region"]).size().to_string())
@@ -0,0 +1,179 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from src.analyst.migrations import INSERT_SQL, Codes
+from src.common.metrics import REGISTRY
+
+_STOP = object()
+
+COMMIT_SECONDS = REGISTRY.histogram("kyc_db_commit_seconds", "Time to encode and commit one batch of results")
+BATCH_ROWS = REGISTRY.histogram("kyc_db_batch_rows", "Results per committed batch",
+                                buckets=(1, 10, 50, 100, 250, 500, 1000, 5000))
+
+class DBWriter:
+    """Single-connection SQLite writer with group commit.
+
+    Results are queued by the MQTT callback and written by one background
+    thread with `executemany`, one transaction per batch of up to
+    `batch_size` rows or `flush_ms` milliseconds of waiting. Rows are encoded
+    into the normalized `verdicts` table on that thread, and redelivered
+    results are ignored by their idempotency key. The database must already
+    be migrated (see `init_db`).
+
+    When the queue is full, a blocking put waits at most `put_timeout`
+    seconds, so a stalled disk cannot hold the MQTT network thread forever;
+    results that still find no room are shed, counted and logged.
+    """
+
+    def __init__(self, db_path, batch_size=500, flush_ms=200, max_queue=10000, put_timeout=5.0):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_ms = flush_ms
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.counters = {"enqueued": 0, "written": 0, "duplicates": 0, "commits": 0, "errors": 0, "shed": 0,
+                         "last_commit_ms": 0.0, "max_commit_ms": 0.0, "total_commit_ms": 0.0}
+        # Opened here so connection errors surface in the caller; only the writer thread uses it afterwards
+        self.conn = self.connect()
+        self.codes = Codes(self.conn)
+        self._thread = threading.Thread(target=self._run, name="DBWriter", daemon=True)
+        self._thread.start()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def put(self, result, block=True, timeout=None):
+        return self.put_many([result], block, timeout)
+
+    def put_many(self, results, block=True, timeout=None):
+        """Queue results as one unit; returns False when they were shed.
+
+        A blocking put waits up to `timeout` seconds (`put_timeout` when None);
+        a non-blocking one raises queue.Full, for callers with a fallback of their own.
+        """
+        results = list(results)
+        try:
+            self.queue.put(results, block=block, timeout=timeout if timeout is not None else self.put_timeout)
+        except queue.Full:
+            if not block:
+                raise
+            with self.lock:
+                self.counters["shed"] += len(results)
+                shed = self.counters["shed"]
+            logging.warning(f"DB writer queue still full after {timeout or self.put_timeout:g}s: "
+                            f"shed {len(results)} result(s), {shed} so far")
+            return False
+        with self.lock:
+            self.counters["enqueued"] += len(results)
+        return True
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        with self.lock:
+            snapshot = dict(self.counters)
+        snapshot["queue_depth"] = self.queue_depth()
+        snapshot["avg_commit_ms"] = snapshot["total_commit_ms"] / snapshot["commits"] if snapshot["commits"] else 0.0
+        return snapshot
+
+    def _collect(self):
+        # Block for the first item, then keep collecting until the batch is full or the deadline passes.
+        # A flush marker (an Event) ends the batch early and is set once the batch is committed.
+        rows, markers = [], []
+        item = self.queue.get()
+        deadline = time.monotonic() + self.flush_ms / 1000
+        while True:
+            if item is _STOP:
+                return rows, markers, True
+            if isinstance(item, threading.Event):
+                markers.append(item)
+                return rows, markers, False
+            rows.extend(item)
+            remaining = deadline - time.monotonic()
+            if len(rows) >= self.batch_size or remaining <= 0:
+                return rows, markers, False
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return rows, markers, False
+
+    def _commit(self, conn, results):
+        start = time.perf_counter()
+        try:
+            with conn:
+                # New lookup names are inserted in the same transaction as the rows that use them
+                rows = self._encode(results)
+                cursor = conn.executemany(INSERT_SQL, rows)
+        except sqlite3.Error as e:
+            # The rollback may have undone lookup rows the cache already holds
+            self.codes = Codes(conn)
+            with self.lock:
+                self.counters["errors"] += 1
+            logging.error(f"Batch insert of {len(results)} rows failed: {e}")
+            return
+        seconds = time.perf_counter() - start
+        COMMIT_SECONDS.observe(seconds)
+        BATCH_ROWS.observe(len(rows))
+        elapsed = seconds * 1000
+        with self.lock:
+            self.counters["written"] += cursor.rowcount
+            self.counters["duplicates"] += len(rows) - cursor.rowcount
+            self.counters["commits"] += 1
+            self.counters["last_commit_ms"] = elapsed
+            self.counters["max_commit_ms"] = max(self.counters["max_commit_ms"], elapsed)
+            self.counters["total_commit_ms"] += elapsed
+
+    def _encode(self, results):
+        rows = []
+        for result in results:
+            try:
+                rows.append(self.codes.row(result))
+            except (KeyError, TypeError, ValueError) as e:
+                with self.lock:
+                    self.counters["errors"] += 1
+                logging.error(f"Skipping malformed result {result!r}: {e}")
+        return rows
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                rows, markers, stopping = self._collect()
+                if rows:
+                    self._commit(self.conn, rows)
+                for marker in markers:
+                    marker.set()
+        finally:
+            self.conn.close()
+
+    def flush(self, timeout=None):
+        if not self._thread.is_alive():
+            return True
+        marker = threading.Event()
+        self.queue.put(marker)
+        return marker.wait(timeout)
+
+    def close(self, timeout=None):
+        if not self._thread.is_alive():
+            return
+        # The stop marker is queued behind pending batches, so everything already accepted is written
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        logging.info(f"DBWriter closed: {self.stats()}")
+
+def writer_from_env(db_path):
+    return DBWriter(
+        db_path,
+        batch_size=int(os.getenv("ANALYST_BATCH_SIZE", 500)),
+        flush_ms=int(os.getenv("ANALYST_FLUSH_MS", 200)),
+        max_queue=int(os.getenv("ANALYST_MAX_QUEUE", 10000)),
+        put_timeout=float(os.getenv("ANALYST_PUT_TIMEOUT", 5))
+    )
@@ -0,0 +1,311 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from src.common.validation import CARD_TYPES, REASONS, REGIONS
+
+STATUSES = ("approved", "rejected")
+LOOKUPS = {
+    "statuses": STATUSES,
+    "card_types": CARD_TYPES + ("Unknown",),
+    "regions": REGIONS + ("Unknown",),
+}
+# Bit 63 would make the mask negative, so at most 63 distinct reasons fit
+MAX_REASON_BITS = 63
+
+# Version 2 copies legacy rows with plain INSERT OR IGNORE; from version 3 the writer UPSERTs: a redelivered
+# verdict changes nothing (and counts as a duplicate), while a new verdict for the same message id replaces
+# the stored one and the update trigger moves it between aggregate buckets
+LEGACY_INSERT_SQL = ("INSERT OR IGNORE INTO verdicts (msg_key, card_id, status, card_type, region, reasons, ts) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)")
+INSERT_SQL = """
+INSERT INTO verdicts (msg_key, card_id, status, card_type, region, reasons, ts) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (msg_key) DO UPDATE SET card_id = excluded.card_id, status = excluded.status, card_type = excluded.card_type,
+    region = excluded.region, reasons = excluded.reasons, ts = excluded.ts
+WHERE (status, card_type, region, reasons) <> (excluded.status, excluded.card_type, excluded.region, excluded.reasons)
+"""
+
+# Version 1: the original six TEXT column table plus the trigger-maintained hourly aggregates
+LEGACY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (id TEXT, status TEXT, timestamp TEXT, reasons TEXT, card_type TEXT, region TEXT);
+"""
+LEGACY_AGGREGATES = """
+CREATE TABLE results_agg (
+    bucket TEXT NOT NULL,
+    status TEXT NOT NULL,
+    card_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bucket, status, card_type, region)
+) WITHOUT ROWID;
+CREATE TRIGGER results_agg_insert AFTER INSERT ON results BEGIN
+    INSERT INTO results_agg (bucket, status, card_type, region, n)
+    VALUES (substr(NEW.timestamp, 1, 13), NEW.status, NEW.card_type, NEW.region, 1)
+    ON CONFLICT (bucket, status, card_type, region) DO UPDATE SET n = n + 1;
+END;
+INSERT INTO results_agg (bucket, status, card_type, region, n)
+    SELECT substr(timestamp, 1, 13), status, card_type, region, COUNT(*) FROM results GROUP BY 1, 2, 3, 4;
+"""
+
+# Version 2: integer-coded dimensions, a reasons bitmask and epoch seconds. msg_key makes QoS 1
+# redeliveries no-ops (INSERT OR IGNORE), and the aggregate trigger only fires for rows actually inserted.
+NORMALIZED_SCHEMA = """
+CREATE TABLE reason_codes (bit INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE verdicts (
+    msg_key INTEGER NOT NULL UNIQUE,
+    card_id TEXT NOT NULL,
+    status INTEGER NOT NULL REFERENCES statuses (id),
+    card_type INTEGER NOT NULL REFERENCES card_types (id),
+    region INTEGER NOT NULL REFERENCES regions (id),
+    reasons INTEGER NOT NULL DEFAULT 0,
+    ts INTEGER NOT NULL
+);
+CREATE INDEX verdicts_ts ON verdicts (ts);
+CREATE INDEX verdicts_filter ON verdicts (status, region, card_type);
+CREATE TABLE verdicts_agg (
+    bucket INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    card_type INTEGER NOT NULL,
+    region INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bucket, status, card_type, region)
+) WITHOUT ROWID;
+CREATE TRIGGER verdicts_agg_insert AFTER INSERT ON verdicts BEGIN
+    INSERT INTO verdicts_agg (bucket, status, card_type, region, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.card_type, NEW.region, 1)
+    ON CONFLICT (bucket, status, card_type, region) DO UPDATE SET n = n + 1;
+END;
+"""
+
+# Version 3: keep verdicts_agg right when an UPSERT changes a stored verdict
+AGG_UPDATE_TRIGGER = """
+CREATE TRIGGER verdicts_agg_update AFTER UPDATE OF status, card_type, region, ts ON verdicts BEGIN
+    UPDATE verdicts_agg SET n = n - 1
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND card_type = OLD.card_type AND region = OLD.region;
+    DELETE FROM verdicts_agg
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND card_type = OLD.card_type AND region = OLD.region
+      AND n <= 0;
+    INSERT INTO verdicts_agg (bucket, status, card_type, region, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.card_type, NEW.region, 1)
+    ON CONFLICT (bucket, status, card_type, region) DO UPDATE SET n = n + 1;
+END;
+"""
+
+# Version 4: with ts last in the filter index, a query fixing status, region and card_type reads its matches newest
+# first straight from the index, which keyset pagination over (ts, rowid) relies on
+FILTER_INDEX = """
+DROP INDEX verdicts_filter;
+CREATE INDEX verdicts_filter ON verdicts (status, region, card_type, ts);
+"""
+
+# Version 5: archive part files are renamed into place only after the DELETE of their rows commits; the part names
+# are recorded in the same transaction, so a run interrupted in between can finish the renames
+ARCHIVE_PARTS = """
+CREATE TABLE archive_parts (path TEXT PRIMARY KEY);
+"""
+
+# Version 6: hourly counts per reasons bitmask, kept by triggers like verdicts_agg, so the rejection-reasons chart
+# reads a small table instead of grouping the hot verdicts on every refresh, and keeps counting archived rows
+REASONS_AGGREGATES = """
+CREATE TABLE verdicts_reasons_agg (
+    bucket INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    reasons INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bucket, status, reasons)
+) WITHOUT ROWID;
+CREATE TRIGGER verdicts_reasons_agg_insert AFTER INSERT ON verdicts BEGIN
+    INSERT INTO verdicts_reasons_agg (bucket, status, reasons, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.reasons, 1)
+    ON CONFLICT (bucket, status, reasons) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER verdicts_reasons_agg_update AFTER UPDATE OF status, reasons, ts ON verdicts BEGIN
+    UPDATE verdicts_reasons_agg SET n = n - 1
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND reasons = OLD.reasons;
+    DELETE FROM verdicts_reasons_agg
+    WHERE bucket = OLD.ts - OLD.ts % 3600 AND status = OLD.status AND reasons = OLD.reasons AND n <= 0;
+    INSERT INTO verdicts_reasons_agg (bucket, status, reasons, n)
+    VALUES (NEW.ts - NEW.ts % 3600, NEW.status, NEW.reasons, 1)
+    ON CONFLICT (bucket, status, reasons) DO UPDATE SET n = n + 1;
+END;
+INSERT INTO verdicts_reasons_agg (bucket, status, reasons, n)
+    SELECT ts - ts % 3600, status, reasons, COUNT(*) FROM verdicts GROUP BY 1, 2, 3;
+"""
+
+# Read-only views with the old column names and formats, so dashboards, exports and ad-hoc
+# queries against `results` and `results_agg` keep working
+COMPAT_VIEWS = """
+CREATE VIEW results AS
+SELECT v.card_id AS id, s.name AS status, datetime(v.ts, 'unixepoch', 'localtime') AS timestamp,
+       CASE WHEN v.reasons = 0 THEN '[]'
+            ELSE (SELECT json_group_array(name) FROM reason_codes WHERE v.reasons >> bit & 1) END AS reasons,
+       c.name AS card_type, r.name AS region
+FROM verdicts v
+JOIN statuses s ON s.id = v.status
+JOIN card_types c ON c.id = v.card_type
+JOIN regions r ON r.id = v.region;
+CREATE VIEW results_agg AS
+SELECT strftime('%Y-%m-%d %H', a.bucket, 'unixepoch', 'localtime') AS bucket, s.name AS status,
+       c.name AS card_type, r.name AS region, a.n AS n
+FROM verdicts_agg a
+JOIN statuses s ON s.id = a.status
+JOIN card_types c ON c.id = a.card_type
+JOIN regions r ON r.id = a.region;
+"""
+
+def msg_key(result):
+    # 64-bit idempotency key: the message id when the producer sets one, otherwise the verdict itself,
+    # which is identical across redeliveries of the same message. sent_ts (sub-second) keeps distinct
+    # cards with identical verdicts in the same second apart.
+    key = result.get("msg_id")
+    if key is None:
+        key = "|".join((result["id"], result.get("timestamp") or "", result["status"], result.get("card_type", "Unknown"),
+                        result.get("region", "Unknown"), ",".join(result.get("reasons", [])), repr(result.get("sent_ts"))))
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big", signed=True)
+
+class Codes:
+    """Name to integer code maps for the lookup tables, loaded once per connection.
+
+    Names not seen before (custom rules, new regions) are added to their lookup
+    table on the connection's current transaction.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {table: dict(conn.execute(f"SELECT name, id FROM {table}")) for table in LOOKUPS}
+        self.bits = dict(conn.execute("SELECT name, bit FROM reason_codes"))
+        self.last_timestamp = (None, None)
+
+    def code(self, table, name):
+        ids = self.ids[table]
+        code = ids.get(name)
+        if code is None:
+            self.conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            code = ids[name] = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        return code
+
+    def reason_mask(self, reasons):
+        mask = 0
+        for reason in reasons:
+            bit = self.bits.get(reason)
+            if bit is None:
+                bit = self.add_reason(reason)
+            mask |= 1 << bit
+        return mask
+
+    def add_reason(self, reason):
+        bit = self.conn.execute("SELECT COALESCE(MAX(bit) + 1, 0) FROM reason_codes").fetchone()[0]
+        if bit >= MAX_REASON_BITS:
+            raise ValueError(f"No reason bit left for {reason!r}")
+        self.conn.execute("INSERT INTO reason_codes (bit, name) VALUES (?, ?)", (bit, reason))
+        self.bits[reason] = bit
+        return bit
+
+    def epoch(self, timestamp):
+        # Results arrive in bursts with the same second-resolution timestamp, so remember the last one
+        if not timestamp:
+            return int(time.time())
+        last, value = self.last_timestamp
+        if timestamp != last:
+            value = int(time.mktime(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S")))
+            self.last_timestamp = (timestamp, value)
+        return value
+
+    def row(self, result):
+        return (msg_key(result), result["id"], self.code("statuses", result["status"]),
+                self.code("card_types", result.get("card_type", "Unknown")),
+                self.code("regions", result.get("region", "Unknown")),
+                self.reason_mask(result.get("reasons", [])), self.epoch(result.get("timestamp")))
+
+def run_script(conn, script):
+    # executescript() would COMMIT the migration's transaction first, so run statement by statement
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+def create_legacy(conn):
+    run_script(conn, LEGACY_SCHEMA)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_agg'").fetchone() is None:
+        run_script(conn, LEGACY_AGGREGATES)
+
+def normalize(conn, chunk_size=10000):
+    for table, names in LOOKUPS.items():
+        conn.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        conn.executemany(f"INSERT INTO {table} (id, name) VALUES (?, ?)", enumerate(names, 1))
+    run_script(conn, NORMALIZED_SCHEMA)
+    conn.executemany("INSERT INTO reason_codes (bit, name) VALUES (?, ?)", enumerate(REASONS))
+    # Copy through the same encoder the writer uses, so duplicate legacy rows collapse and the new aggregates are rebuilt
+    codes = Codes(conn)
+    cursor = conn.execute("SELECT id, status, timestamp, reasons, card_type, region FROM results")
+    copied = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        conn.executemany(LEGACY_INSERT_SQL, [codes.row({"id": id_, "status": status, "timestamp": timestamp,
+                                                         "reasons": json.loads(reasons or "[]"), "card_type": card_type,
+                                                         "region": region})
+                                             for id_, status, timestamp, reasons, card_type, region in rows])
+        copied += len(rows)
+    run_script(conn, """
+DROP TRIGGER IF EXISTS results_agg_insert;
+DROP TABLE IF EXISTS results_agg;
+DROP TABLE results;
+""" + COMPAT_VIEWS)
+    logging.info(f"Copied {copied} legacy rows into verdicts")
+
+MIGRATIONS = (
+    (1, "results table with hourly aggregates", create_legacy),
+    (2, "normalized verdicts table with lookups, reasons bitmask, epoch timestamps and idempotency key", normalize),
+    (3, "aggregate update trigger for UPSERTed verdicts", lambda conn: run_script(conn, AGG_UPDATE_TRIGGER)),
+    (4, "time-ordered filter index for paginated result queries", lambda conn: run_script(conn, FILTER_INDEX)),
+    (5, "archive parts awaiting their rename", lambda conn: run_script(conn, ARCHIVE_PARTS)),
+    (6, "hourly rejection reason aggregates", lambda conn: run_script(conn, REASONS_AGGREGATES)),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to `target`, each in its own transaction, and return the resulting version."""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for version, description, step in MIGRATIONS:
+            if version > target:
+                break
+            # BEGIN IMMEDIATE takes the write lock before re-reading the version, so concurrent starters
+            # (Analyst and AsyncAnalyst on one file) apply each step exactly once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logging.info(f"Migrated database to version {version}: {description}")
+        return schema_version(conn)
+    finally:
+        conn.isolation_level = isolation_level
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the KYC results database")
+    parser.add_argument("--db", default="data/kyc_results.db", help="SQLite database path")
+    parser.add_argument("--target", type=int, default=LATEST_VERSION, help="Schema version to migrate to")
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    with sqlite3.connect(args.db) as conn:
+        before = schema_version(conn)
+        after = migrate(conn, args.target)
+    print(f"{args.db}: schema version {before} -> {after}")
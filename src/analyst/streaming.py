@@ -0,0 +1,254 @@
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.common.batch import decode_payload
+from src.common.binary import topics
+from src.common.logs import configure
+
+# name, span and slot width in seconds: every window is a ring of about 60 slots
+WINDOWS = (("1m", 60, 1), ("5m", 300, 5), ("1h", 3600, 60))
+ALL = ("all", "")
+TOPIC = "kyc/analytics"
+
+class RingWindow:
+    """Approved/rejected counts per segment over the last `span` seconds, in a fixed ring of slots.
+
+    A slot is reset lazily when the ring wraps onto it, so memory is bounded by
+    the number of slots times the number of segments, however many results arrive.
+    """
+
+    def __init__(self, span, width):
+        self.span = span
+        self.width = width
+        # Two spans of slots keep the last complete tumbling window intact while the next one fills
+        self.size = 2 * (span // width)
+        self.slots = [{} for _ in range(self.size)]
+        self.stamps = [None] * self.size
+
+    def add(self, t, keys, rejected):
+        index = int(t // self.width)
+        i = index % self.size
+        if self.stamps[i] != index:
+            self.slots[i] = {}
+            self.stamps[i] = index
+        slot = self.slots[i]
+        column = 1 if rejected else 0
+        for key in keys:
+            counts = slot.get(key)
+            if counts is None:
+                counts = slot[key] = [0, 0]
+            counts[column] += 1
+
+    def totals(self, start, end):
+        # Sum of slots whose time range lies in [start, end)
+        first, last = int(start // self.width), int(end // self.width)
+        totals = {}
+        for stamp, slot in zip(self.stamps, self.slots):
+            if stamp is None or not first <= stamp < last:
+                continue
+            for key, (approved, rejected) in slot.items():
+                counts = totals.get(key)
+                if counts is None:
+                    totals[key] = [approved, rejected]
+                else:
+                    counts[0] += approved
+                    counts[1] += rejected
+        return totals
+
+    def sliding(self, now):
+        # Includes the slot in progress; at most one slot width older than `span`
+        return self.totals(now - self.span + self.width, now + self.width)
+
+    def tumbling(self, boundary):
+        return self.totals(boundary - self.span, boundary)
+
+class EwmaDetector:
+    """Flags segments whose rejection rate rises `threshold` standard deviations above an EWMA baseline.
+
+    The deviation combines the baseline's EW variance with the binomial noise of
+    the current window, so small segments need a larger jump to alert. Anomalous
+    samples do not move the baseline, so a sustained incident keeps alerting until
+    the rate comes back down.
+    """
+
+    def __init__(self, alpha=0.05, threshold=3.0, min_count=20, min_delta=0.05, warmup=10):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_count = min_count
+        self.min_delta = min_delta
+        self.warmup = warmup
+        self.state = {}
+
+    def update(self, key, rate, count):
+        # Returns ("alert" | "clear", z, baseline) on a state change, else None
+        if count < self.min_count:
+            return None
+        state = self.state.get(key)
+        if state is None:
+            self.state[key] = [rate, 0.0, 1, False]
+            return None
+        mean, var, samples, alerting = state
+        deviation = math.sqrt(var + mean * (1 - mean) / count) or 1e-9
+        z = (rate - mean) / deviation
+        anomalous = samples >= self.warmup and rate - mean >= self.min_delta and z >= self.threshold
+        if not anomalous:
+            diff = rate - mean
+            mean += self.alpha * diff
+            var = (1 - self.alpha) * (var + self.alpha * diff * diff)
+        self.state[key] = [mean, var, samples + 1, anomalous]
+        if anomalous != alerting:
+            return ("alert" if anomalous else "clear"), z, mean
+        return None
+
+def segment_keys(result):
+    return (ALL, ("region", result.get("region", "Unknown")), ("card_type", result.get("card_type", "Unknown")))
+
+def summarize(name, kind, end, totals):
+    approved, rejected = totals.get(ALL, (0, 0))
+    total = approved + rejected
+    summary = {"window": name, "kind": kind, "end": end, "total": total, "approved": approved, "rejected": rejected,
+               "rejection_rate": round(rejected / total, 4) if total else 0.0,
+               "by_region": {}, "by_card_type": {}, "by_reason": {}}
+    for (dimension, value), (seg_approved, seg_rejected) in sorted(totals.items()):
+        if dimension == "reason":
+            summary["by_reason"][value] = seg_rejected
+        elif dimension != "all":
+            seg_total = seg_approved + seg_rejected
+            summary[f"by_{dimension}"][value] = {"approved": seg_approved, "rejected": seg_rejected,
+                                                  "rejection_rate": round(seg_rejected / seg_total, 4)}
+    return summary
+
+class StreamingAnalytics:
+    """Sliding and tumbling window summaries of the result stream, with rejection-rate alerts.
+
+    `add` is called for every result (from the MQTT thread); a ticker thread
+    publishes sliding summaries to `<topic>/window/<name>` (retained) every
+    `interval` seconds, tumbling summaries to `<topic>/tumbling/<name>` as each
+    window closes, and alerts to `<topic>/alert`. Alerts are evaluated on the
+    `detect_window` sliding window per region, card type and rejection reason.
+    """
+
+    def __init__(self, publish, interval=5.0, topic=TOPIC, windows=WINDOWS, detector=None, detect_window="1m",
+                 clock=time.time):
+        self.publish = publish
+        self.interval = interval
+        self.topic = topic
+        self.clock = clock
+        self.windows = {name: RingWindow(span, width) for name, span, width in windows}
+        self.detector = detector or EwmaDetector()
+        self.detect_window = detect_window
+        self.lock = threading.Lock()
+        now = clock()
+        self.boundaries = {name: now - now % window.span + window.span for name, window in self.windows.items()}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def add(self, results, now=None):
+        now = self.clock() if now is None else now
+        with self.lock:
+            for result in results:
+                rejected = result.get("status") == "rejected"
+                keys = segment_keys(result)
+                if rejected:
+                    keys += tuple(("reason", reason) for reason in result.get("reasons", []))
+                for window in self.windows.values():
+                    window.add(now, keys, rejected)
+
+    def tick(self, now=None):
+        now = self.clock() if now is None else now
+        with self.lock:
+            sliding = {name: window.sliding(now) for name, window in self.windows.items()}
+            closed = []
+            for name, window in self.windows.items():
+                if now >= self.boundaries[name]:
+                    boundary = self.boundaries[name]
+                    closed.append(summarize(name, "tumbling", boundary, window.tumbling(boundary)))
+                    self.boundaries[name] = now - now % window.span + window.span
+        for name, totals in sliding.items():
+            if totals:
+                self.publish(f"{self.topic}/window/{name}", json.dumps(summarize(name, "sliding", now, totals)), True)
+        for summary in closed:
+            if summary["total"]:
+                self.publish(f"{self.topic}/tumbling/{summary['window']}", json.dumps(summary), False)
+        alerts = self.detect(sliding[self.detect_window], now)
+        for alert in alerts:
+            logging.warning(f"Rejection rate {alert['event']}: {alert}")
+            self.publish(f"{self.topic}/alert", json.dumps(alert), False)
+        return alerts
+
+    def detect(self, totals, now):
+        alerts = []
+        total = sum(totals.get(ALL, (0, 0)))
+        for key, (approved, rejected) in totals.items():
+            # A reason's rate is its share of all results; other segments use their own totals
+            count = total if key[0] == "reason" else approved + rejected
+            if not count:
+                continue
+            change = self.detector.update(key, rejected / count, count)
+            if change is not None:
+                event, z, baseline = change
+                alerts.append({"event": event, "segment": key[0], "value": key[1], "time": now,
+                               "rejection_rate": round(rejected / count, 4), "baseline": round(baseline, 4),
+                               "z": round(z, 2), "count": count, "window": self.detect_window})
+        return alerts
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Streaming analytics error: {e}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="StreamingAnalytics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval + 1)
+
+def analytics_from_env(publish):
+    return StreamingAnalytics(
+        publish,
+        interval=float(os.getenv("STREAM_INTERVAL", 5)),
+        detector=EwmaDetector(alpha=float(os.getenv("STREAM_ALPHA", 0.05)),
+                              threshold=float(os.getenv("STREAM_Z_THRESHOLD", 3.0)),
+                              min_count=int(os.getenv("STREAM_MIN_COUNT", 20)))
+    )
+
+if __name__ == "__main__":
+    # Standalone streaming analytics, without the database
+    parser = argparse.ArgumentParser(description="Windowed KYC result analytics with rejection-rate alerts")
+    parser.add_argument("--share-group", default=None, help="Use a $share/<group>/ subscription")
+    args = parser.parse_args()
+    load_dotenv()
+    configure("data/analytics.log")
+    qos = int(os.getenv("MQTT_QOS", 1))
+    client = mqtt.Client(client_id=f"Analytics-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    analytics = analytics_from_env(lambda topic, payload, retain: client.publish(topic, payload, qos=qos, retain=retain))
+    subscriptions = [f"$share/{args.share_group}/{topic}" if args.share_group else topic for topic in topics("kyc/result")]
+
+    def on_message(client, userdata, msg):
+        try:
+            analytics.add(decode_payload(msg.payload)[1])
+        except Exception as e:
+            logging.error(f"Message processing error: {e}")
+
+    client.on_connect = lambda c, userdata, flags, rc, props: c.subscribe([(topic, qos) for topic in subscriptions])
+    client.on_message = on_message
+    client.connect(os.getenv("MQTT_BROKER", "localhost"), int(os.getenv("MQTT_PORT", 1883)), keepalive=60)
+    analytics.start()
+    print(f"Streaming analytics on {', '.join(subscriptions)}, publishing to {TOPIC}/#")
+    try:
+        client.loop_forever()
+    except KeyboardInterrupt:
+        analytics.stop()
+        client.disconnect()
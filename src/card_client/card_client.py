@@ -1,5 +1,4 @@
 import time
-import json
 import random
 import logging
 import uuid
@@ -9,21 +8,41 @@ import argparse
 import paho.mqtt.client as mqtt  # Fix import
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from jsonschema import validate, ValidationError
+from src.common.batch import encode_message
+from src.common.binary import BINARY_SUFFIX, CARD
+from src.common.logs import configure
+from src.common.metrics import REGISTRY, PublishTimer, quiet, serve_from_env
+from src.common.validation import CARD_TYPES, REGIONS, validate_card
 
-class CardClient:
-    SCHEMA = {
-        "type": "object",
-        "properties": {
-            "id": {"type": "string"},
-            "name": {"type": "string", "minLength": 3},
-            "expiry": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}$"},
-            "region": {"type": "string", "enum": ["US", "EU", "ASIA", "MEA"]},
-            "card_type": {"type": "string", "enum": ["Visa", "MasterCard", "Amex", "Discover"]}
-        },
-        "required": ["id", "name", "expiry", "region", "card_type"]
+CARDS = REGISTRY.counter("kyc_card_client_cards_total", "Cards published", ("outcome",))
+PUBLISH_SECONDS = REGISTRY.histogram("kyc_card_client_publish_seconds", "From publishing a message to its PUBACK")
+
+NAMES = ("Alice Smith", "Bob Jones", "Charlie Brown", "Diana Lee", "Ahmed Khan", "Fatima Ali")
+
+def random_card(rng=random, invalid_ratio=0.3, names=NAMES):
+    is_invalid = rng.random() < invalid_ratio
+    id_formats = [
+        f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        f"{rng.randint(100000, 999999)}-{rng.randint(1000, 9999)}"
+    ]
+    id_number = rng.choice(id_formats)
+    if is_invalid and rng.random() < 0.3:
+        id_number = "invalid_id"
+    name = rng.choice(names)
+    if is_invalid and rng.random() < 0.2:
+        name = "A"
+    expiry_date = datetime.now() + timedelta(days=rng.randint(0, 1095))
+    if is_invalid and rng.random() < 0.3:
+        expiry_date = datetime.now() - timedelta(days=rng.randint(1, 365))
+    return {
+        "id": id_number,
+        "name": name,
+        "expiry": expiry_date.strftime("%Y-%m-%d"),
+        "region": rng.choice(REGIONS),
+        "card_type": rng.choice(CARD_TYPES)
     }
 
+class CardClient:
     def __init__(self):
         load_dotenv()
         self.broker = os.getenv("MQTT_BROKER", "localhost")
@@ -31,19 +50,24 @@ class CardClient:
         self.qos = int(os.getenv("MQTT_QOS", 1))
         self.client = mqtt.Client(client_id=f"CardClient-{uuid.uuid4()}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
         self.setup_logging()
+        self.quiet = quiet()
         self.cards = []
-        self.regions = ["US", "EU", "ASIA", "MEA"]
-        self.card_types = ["Visa", "MasterCard", "Amex", "Discover"]
-        self.names = ["Alice Smith", "Bob Jones", "Charlie Brown", "Diana Lee", "Ahmed Khan", "Fatima Ali"]
+        self.names = list(NAMES)
         self.metrics = {"sent": 0, "failed": 0}
+        self.setup_metrics()
         self.retry_connect()
 
     def setup_logging(self):
-        os.makedirs("data", exist_ok=True)
-        logging.basicConfig(filename="data/card_client.log", level=logging.INFO,
-                           format="%(asctime)s - %(levelname)s - %(message)s")
+        configure("data/card_client.log")
         logging.info("CardClient initialized")
 
+    def setup_metrics(self):
+        for name in ("sent", "failed"):
+            CARDS.labels(name).set_function(lambda name=name: self.metrics[name])
+        self.publish_timer = PublishTimer(PUBLISH_SECONDS)
+        self.client.on_publish = self.publish_timer.on_publish
+        self.metrics_server = serve_from_env("CARD_CLIENT_METRICS_PORT")
+
     def retry_connect(self, max_attempts=5):
         for attempt in range(max_attempts):
             try:
@@ -57,56 +81,66 @@ class CardClient:
         raise Exception("Connection failed after retries")
 
     def generate_card(self):
-        is_invalid = random.random() < 0.3
-        id_formats = [
-            f"{random.randint(1000, 9999)}-{random.randint(1000, 9999)}-{random.randint(1000, 9999)}",
-            f"{random.randint(100000, 999999)}-{random.randint(1000, 9999)}"
-        ]
-        id_number = random.choice(id_formats)
-        if is_invalid and random.random() < 0.3:
-            id_number = "invalid_id"
-        name = random.choice(self.names)
-        if is_invalid and random.random() < 0.2:
-            name = "A"
-        expiry_date = datetime.now() + timedelta(days=random.randint(0, 1095))
-        if is_invalid and random.random() < 0.3:
-            expiry_date = datetime.now() - timedelta(days=random.randint(1, 365))
-        card = {
-            "id": id_number,
-            "name": name,
-            "expiry": expiry_date.strftime("%Y-%m-%d"),
-            "region": random.choice(self.regions),
-            "card_type": random.choice(self.card_types)
-        }
-        try:
-            validate(instance=card, schema=self.SCHEMA)
-            logging.info(f"Valid card: {card}")
-        except ValidationError as e:
-            logging.warning(f"Schema invalid: {card}, Error: {e}")
+        card = random_card(names=self.names)
+        # Downstream services deduplicate and UPSERT by this id, so a redelivered card is counted once
+        card["msg_id"] = uuid.uuid4().hex
+        if not self.quiet:
+            reasons = validate_card(card)
+            if reasons:
+                logging.warning("Invalid card %s", card["id"], extra={"card": card, "reasons": reasons, "sample": "rejected"})
+            else:
+                logging.info("Valid card %s", card["id"], extra={"card": card, "sample": "approved"})
         self.cards.append(card)
         return card
 
-    def publish_cards(self, count=30, topic="kyc/card_data"):
+    def publish_cards(self, count=30, topic="kyc/card_data", batch_size=1, compress=False, interval=0.15, binary=False):
         try:
+            if batch_size > 1:
+                self.publish_batches(count, topic, batch_size, compress, interval, binary)
+                return
             for i in range(count):
                 card_data = self.generate_card()
-                payload = json.dumps(card_data)
-                result = self.client.publish(topic, payload, qos=self.qos)
+                payload, encoded_binary = encode_message([card_data], CARD, binary=binary)
+                start = time.perf_counter()
+                result = self.client.publish(topic + BINARY_SUFFIX if encoded_binary else topic, payload, qos=self.qos)
                 self.metrics["sent"] += 1
                 if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                    print(f"Published [{i+1}/{count}]: {card_data}")
-                    logging.info(f"Published: {card_data}")
+                    self.publish_timer.track(result, start)
+                    if not self.quiet:
+                        print(f"Published [{i+1}/{count}]: {card_data}")
+                        logging.info("Published %s", card_data["id"], extra={"card": card_data})
                 else:
                     self.metrics["failed"] += 1
                     logging.error(f"Publish failed: {result.rc}")
-                time.sleep(0.15)
+                time.sleep(interval)
             self.save_metrics()
         except Exception as e:
             logging.error(f"Publish error: {e}")
 
+    def publish_batches(self, count, topic, batch_size, compress, interval, binary=False):
+        # One publish (and one PUBACK) per batch envelope instead of per card
+        sent = 0
+        while sent < count:
+            cards = [self.generate_card() for _ in range(min(batch_size, count - sent))]
+            payload, encoded_binary = encode_message(cards, CARD, uuid.uuid4().hex, compress, binary)
+            start = time.perf_counter()
+            result = self.client.publish(topic + BINARY_SUFFIX if encoded_binary else topic, payload, qos=self.qos)
+            sent += len(cards)
+            self.metrics["sent"] += len(cards)
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.publish_timer.track(result, start)
+                if not self.quiet:
+                    print(f"Published batch [{sent}/{count}]: {len(cards)} cards, {len(payload)} bytes")
+                    logging.info("Published batch of %d cards (%d bytes)", len(cards), len(payload))
+            else:
+                self.metrics["failed"] += len(cards)
+                logging.error(f"Batch publish failed: {result.rc}")
+            time.sleep(interval)
+        self.save_metrics()
+
     def save_metrics(self):
         with open("data/card_metrics.csv", "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "name", "expiry", "region", "card_type"])
+            writer = csv.DictWriter(f, fieldnames=["id", "name", "expiry", "region", "card_type"], extrasaction="ignore")
             writer.writeheader()
             writer.writerows(self.cards)
         logging.info(f"Metrics saved: {self.metrics}")
@@ -114,16 +148,22 @@ class CardClient:
     def close(self):
         self.client.loop_stop()
         self.client.disconnect()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
         logging.info(f"CardClient closed: {self.metrics}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="KYC Card Client")
     parser.add_argument("--count", type=int, default=30, help="Number of cards to publish")
     parser.add_argument("--sleep", type=float, default=0.15, help="Sleep time between publishes")
+    parser.add_argument("--batch-size", type=int, default=1, help="Cards per published message (1 = one card per message)")
+    parser.add_argument("--compress", action="store_true", help="zlib-compress batch messages")
+    parser.add_argument("--binary", action="store_true", help="Send cards in the compact binary encoding on kyc/card_data/bin")
     args = parser.parse_args()
     try:
         client = CardClient()
-        client.publish_cards(count=args.count)  # Update call
+        client.publish_cards(count=args.count, batch_size=args.batch_size, compress=args.compress, interval=args.sleep,
+                             binary=args.binary)
         time.sleep(args.sleep)
         client.close()
     except Exception as e:
@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.card_client.card_client import random_card
+from src.common.batch import CONTENT_TYPE, decode_payload
+from src.common.binary import BINARY_SUFFIX, CARD, FLOAT, encode_card, header as binary_header, topics
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadGenerator:
+    """Publishes pre-generated cards at a target rate and measures end-to-end latency.
+
+    Every card carries a `sent_ts` epoch timestamp that the Verifier copies into
+    its result, so a listener on `kyc/result` can compute publish-to-verdict latency.
+    A `rate` of 0 publishes open-loop as fast as the clients allow. With
+    `binary`, cards go out in the binary encoding on `<topic>/bin`.
+    """
+
+    def __init__(self, count=10000, rate=0, publishers=1, batch_size=1, invalid_ratio=0.3, seed=None,
+                 topic="kyc/card_data", result_topic="kyc/result", max_inflight=1000, binary=False,
+                 broker=None, port=None, qos=None):
+        load_dotenv()
+        # Explicit settings win over MQTT_BROKER, MQTT_PORT and MQTT_QOS
+        self.broker = broker or os.getenv("MQTT_BROKER", "localhost")
+        self.port = int(port or os.getenv("MQTT_PORT", 1883))
+        self.qos = int(qos if qos is not None else os.getenv("MQTT_QOS", 1))
+        self.count = count
+        self.rate = rate
+        self.publishers = max(1, publishers)
+        self.batch_size = max(1, batch_size)
+        self.binary = binary
+        self.topic = topic + BINARY_SUFFIX if binary else topic
+        self.result_topic = result_topic
+        self.max_inflight = max_inflight
+        self.latencies = []
+        self.arrivals = []
+        self.started_at = 0.0
+        self.received = 0
+        self.bytes_sent = []
+        self.first_result = None
+        self.last_result = None
+        self.payloads = self.pregenerate(count, invalid_ratio, random.Random(seed))
+
+    def pregenerate(self, count, invalid_ratio, rng):
+        # Cards are serialized up front minus their send timestamp, which is appended at publish time:
+        # JSON cards lack the closing brace, binary records their trailing float64
+        prefixes = []
+        for _ in range(count):
+            # Ids are unique per run even with --seed, so repeated runs into one database are all stored
+            card = dict(random_card(rng, invalid_ratio), msg_id=uuid.uuid4().hex)
+            if self.binary:
+                prefixes.append(encode_card(dict(card, sent_ts=0.0))[:-FLOAT.size])
+                continue
+            card = json.dumps(card, separators=(",", ":"))
+            prefixes.append(card[:-1].encode() + b',"sent_ts":')
+        return prefixes
+
+    def make_client(self, role):
+        client = mqtt.Client(client_id=f"LoadGen-{role}-{uuid.uuid4().hex[:8]}",
+                             callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        client.max_inflight_messages_set(self.max_inflight)
+        return client
+
+    def on_result(self, client, userdata, msg):
+        now = time.time()
+        try:
+            _, results, _ = decode_payload(msg.payload)
+        except Exception as e:
+            logging.error(f"Undecodable result: {e}")
+            return
+        for result in results:
+            sent_ts = result.get("sent_ts")
+            if sent_ts is None or sent_ts < self.started_at:
+                continue
+            self.latencies.append(now - sent_ts)
+            self.arrivals.append(now)
+            self.received += 1
+        if self.first_result is None:
+            self.first_result = now
+        self.last_result = now
+
+    def start_listener(self):
+        subscribed = threading.Event()
+        listener = self.make_client("listener")
+        listener.on_message = self.on_result
+        # The Verifier answers binary cards on <result_topic>/bin, unless a result does not fit the binary layout
+        listener.on_connect = lambda client, userdata, flags, rc, props: client.subscribe(
+            [(topic, self.qos) for topic in topics(self.result_topic)])
+        listener.on_subscribe = lambda client, userdata, mid, rcs, props: subscribed.set()
+        listener.connect(self.broker, self.port, keepalive=60)
+        listener.loop_start()
+        if not subscribed.wait(10):
+            raise Exception(f"Could not subscribe to {self.result_topic}")
+        return listener
+
+    def encode(self, prefixes):
+        if self.binary:
+            stamp = FLOAT.pack(time.time())
+            batch_id = uuid.uuid4().hex if self.batch_size > 1 else None
+            return binary_header(CARD, len(prefixes), batch_id) + b"".join([prefix + stamp for prefix in prefixes])
+        stamp = repr(time.time()).encode()
+        cards = [prefix + stamp + b"}" for prefix in prefixes]
+        if self.batch_size == 1:
+            return cards[0]
+        header = json.dumps({"content_type": CONTENT_TYPE, "batch_id": uuid.uuid4().hex})[:-1].encode()
+        return header + b',"items":[' + b",".join(cards) + b"]}"
+
+    def publish_slice(self, index, prefixes, sent, elapsed):
+        client = self.make_client(f"pub{index}")
+        client.connect(self.broker, self.port, keepalive=60)
+        client.loop_start()
+        # Each publisher paces its own share of the target rate against a fixed schedule
+        messages_per_sec = self.rate / self.publishers / self.batch_size if self.rate else 0
+        infos = []
+        start = time.perf_counter()
+        for n, offset in enumerate(range(0, len(prefixes), self.batch_size)):
+            if messages_per_sec:
+                delay = start + n / messages_per_sec - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            chunk = prefixes[offset:offset + self.batch_size]
+            payload = self.encode(chunk)
+            infos.append(client.publish(self.topic, payload, qos=self.qos))
+            sent[index] += len(chunk)
+            self.bytes_sent[index] += len(payload)
+        for info in infos:
+            info.wait_for_publish(timeout=30)
+        elapsed[index] = time.perf_counter() - start
+        client.loop_stop()
+        client.disconnect()
+
+    def run(self, drain_timeout=10.0):
+        self.started_at = time.time()
+        listener = self.start_listener()
+        sent = [0] * self.publishers
+        self.bytes_sent = [0] * self.publishers
+        elapsed = [0.0] * self.publishers
+        slices = [self.payloads[i::self.publishers] for i in range(self.publishers)]
+        threads = [threading.Thread(target=self.publish_slice, args=(i, slices[i], sent, elapsed), daemon=True)
+                   for i in range(self.publishers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        publish_seconds = max(elapsed)
+        deadline = time.time() + drain_timeout
+        while self.received < sum(sent) and time.time() < deadline:
+            time.sleep(0.05)
+        listener.loop_stop()
+        listener.disconnect()
+        return self.report(sum(sent), publish_seconds)
+
+    def report(self, sent, publish_seconds):
+        latencies = sorted(self.latencies)
+        result_seconds = (self.last_result - self.first_result) if self.last_result else 0.0
+        return {
+            "sent": sent,
+            "received": self.received,
+            "target_rate": self.rate,
+            "publishers": self.publishers,
+            "batch_size": self.batch_size,
+            "encoding": "binary" if self.binary else "json",
+            "bytes_per_card": round(sum(self.bytes_sent) / sent, 1) if sent else 0.0,
+            "publish_seconds": round(publish_seconds, 3),
+            "publish_rate": round(sent / publish_seconds, 1) if publish_seconds else 0.0,
+            "result_rate": round(self.received / result_seconds, 1) if result_seconds else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+            }
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KYC load generator")
+    parser.add_argument("--count", type=int, default=10000, help="Number of cards to publish")
+    parser.add_argument("--rate", type=float, default=0, help="Target cards/sec across all publishers (0 = as fast as possible)")
+    parser.add_argument("--publishers", type=int, default=1, help="Number of concurrent publishing clients")
+    parser.add_argument("--batch-size", type=int, default=1, help="Cards per published message")
+    parser.add_argument("--invalid-ratio", type=float, default=0.3, help="Share of cards with injected edge cases")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible card sets")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="Seconds to wait for outstanding results")
+    parser.add_argument("--binary", action="store_true", help="Send cards in the binary encoding on <topic>/bin")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    generator = LoadGenerator(count=args.count, rate=args.rate, publishers=args.publishers,
+                              batch_size=args.batch_size, invalid_ratio=args.invalid_ratio, seed=args.seed,
+                              binary=args.binary)
+    report = generator.run(drain_timeout=args.drain_timeout)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
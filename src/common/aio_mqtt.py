@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import socket
+import paho.mqtt.client as mqtt
+
+class AsyncClient:
+    """Drives a paho client from an asyncio event loop instead of a loop_start() thread.
+
+    Socket readiness is wired to loop.add_reader/add_writer through paho's
+    socket callbacks, so every paho read, write and callback happens on the
+    event loop; only the blocking TCP connect runs in an executor. Incoming
+    messages are exposed as an async iterator; when more than `max_pending`
+    messages are waiting, socket reads pause until the consumer catches up,
+    which pushes backpressure to the broker over TCP.
+
+    When the broker goes away, publishes waiting for a PUBACK fail and the
+    client reconnects with exponential backoff (`reconnect_delay` doubling up
+    to `reconnect_max` seconds), then restores its subscriptions, as the
+    threaded services do. With `reconnect=False` the message iterator raises
+    ConnectionError instead.
+    """
+
+    def __init__(self, client_id, broker="localhost", port=1883, keepalive=60, max_pending=1000, max_inflight=1000,
+                 reconnect=True, reconnect_delay=1.0, reconnect_max=30.0, connect_timeout=10.0):
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.max_pending = max_pending
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max = reconnect_max
+        self.connect_timeout = connect_timeout
+        self.loop = None
+        self.client = mqtt.Client(client_id=client_id, callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.on_socket_open = lambda client, userdata, sock: self._on_loop(self._on_socket_open, sock)
+        self.client.on_socket_close = lambda client, userdata, sock: self._on_loop(self._on_socket_close, sock)
+        self.client.on_socket_register_write = lambda client, userdata, sock: self._on_loop(self.loop.add_writer, sock,
+                                                                                             client.loop_write)
+        self.client.on_socket_unregister_write = lambda client, userdata, sock: self._on_loop(self.loop.remove_writer, sock)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = lambda *args: self._on_loop(self._on_disconnect, *args)
+        self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
+        self.client.on_subscribe = self._on_subscribe
+        self.messages_queue = None
+        self.sock = None
+        self.reading_paused = False
+        self.misc_task = None
+        self.reconnect_task = None
+        self.connected = None
+        self.closing = False
+        self.pending = {}
+        # Restored after a reconnect: with a clean session the broker forgets them
+        self.subscriptions = {}
+
+    def _on_loop(self, function, *args):
+        # paho calls the socket callbacks from whichever thread runs connect(); loop state is only touched on the loop
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def _on_socket_open(self, sock):
+        self.sock = sock
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048 * 1024)
+        self.loop.add_reader(sock, self.client.loop_read)
+        self.reading_paused = False
+        self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, sock):
+        try:
+            self.loop.remove_reader(sock)
+            self.loop.remove_writer(sock)
+        except ValueError:
+            # Already closed by the time a call from the connect thread got here
+            pass
+        if self.sock is sock:
+            self.sock = None
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+
+    async def _misc_loop(self):
+        # Keep-alives and retries; paho expects loop_misc roughly once a second
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if self.connected is not None and not self.connected.done():
+            if reason_code.is_failure:
+                self.connected.set_exception(ConnectionError(f"Connection refused: {reason_code}"))
+            else:
+                self.connected.set_result(reason_code)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        logging.info(f"Disconnected with code {reason_code}")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Disconnected before acknowledgement"))
+        self.pending.clear()
+        if self.closing or self.loop is None:
+            return
+        if not self.reconnect:
+            self.messages_queue.put_nowait(ConnectionError(f"Connection lost: {reason_code}"))
+        elif self.reconnect_task is None or self.reconnect_task.done():
+            self.reconnect_task = self.loop.create_task(self._reconnect())
+
+    def _on_message(self, client, userdata, msg):
+        self.messages_queue.put_nowait(msg)
+        if not self.reading_paused and self.messages_queue.qsize() >= self.max_pending and self.sock is not None:
+            self.loop.remove_reader(self.sock)
+            self.reading_paused = True
+
+    def _resolve(self, mid, value):
+        future = self.pending.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def _on_publish(self, client, userdata, mid, reason_code, properties):
+        self._resolve(mid, reason_code)
+
+    def _on_subscribe(self, client, userdata, mid, reason_codes, properties):
+        self._resolve(mid, reason_codes)
+
+    async def _open(self):
+        self.connected = self.loop.create_future()
+        # The TCP connect and DNS lookup block, so they run off the loop
+        await self.loop.run_in_executor(None, self.client.connect, self.broker, self.port, self.keepalive)
+        return await asyncio.wait_for(self.connected, self.connect_timeout)
+
+    async def connect(self):
+        self.loop = asyncio.get_running_loop()
+        self.messages_queue = asyncio.Queue()
+        self.closing = False
+        return await self._open()
+
+    async def _reconnect(self):
+        delay = self.reconnect_delay
+        while not self.closing:
+            await asyncio.sleep(delay)
+            try:
+                await self._open()
+                for topic, qos in list(self.subscriptions.items()):
+                    await self.subscribe(topic, qos)
+                logging.info(f"Reconnected to {self.broker}:{self.port}")
+                return
+            except (OSError, ConnectionError) as e:
+                delay = min(delay * 2, self.reconnect_max)
+                logging.warning(f"Reconnect to {self.broker}:{self.port} failed: {e}; retrying in {delay:g}s")
+
+    def _track(self, rc, mid):
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"MQTT request failed: {mqtt.error_string(rc)}")
+        future = self.loop.create_future()
+        self.pending[mid] = future
+        return future
+
+    async def subscribe(self, topic, qos=1):
+        self.subscriptions[topic] = qos
+        rc, mid = self.client.subscribe(topic, qos=qos)
+        return await self._track(rc, mid)
+
+    def publish_nowait(self, topic, payload, qos=1):
+        """Queue a publish and return a future that completes on PUBACK (or immediately for QoS 0)."""
+        info = self.client.publish(topic, payload, qos=qos)
+        if qos == 0:
+            future = self.loop.create_future()
+            future.set_result(info.rc)
+            return future
+        return self._track(info.rc, info.mid)
+
+    async def publish(self, topic, payload, qos=1):
+        return await self.publish_nowait(topic, payload, qos)
+
+    async def messages(self):
+        while True:
+            msg = await self.messages_queue.get()
+            if msg is None:
+                return
+            if isinstance(msg, Exception):
+                raise msg
+            if self.reading_paused and self.messages_queue.qsize() <= self.max_pending // 2 and self.sock is not None:
+                self.loop.add_reader(self.sock, self.client.loop_read)
+                self.reading_paused = False
+            yield msg
+
+    async def disconnect(self):
+        self.closing = True
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+        self.client.disconnect()
+        if self.messages_queue is not None:
+            self.messages_queue.put_nowait(None)
+        # Let the DISCONNECT packet flush and the socket callbacks run
+        await asyncio.sleep(0)
@@ -0,0 +1,51 @@
+import json
+import uuid
+import zlib
+from src.common.binary import MAGIC, decode_binary, encode_binary
+
+# Batch envelope for kyc/card_data and kyc/result:
+#   {"content_type": CONTENT_TYPE, "batch_id": "...", "items": [...]}
+# optionally zlib-compressed as a whole. Plain single-card/single-result JSON objects are still accepted,
+# and so are the binary messages of src/common/binary.py (sent on the /bin topics).
+CONTENT_TYPE = "application/vnd.kyc.batch+json"
+_ZLIB_HEADER = 0x78
+
+def encode_batch(items, batch_id=None, compress=False):
+    envelope = {"content_type": CONTENT_TYPE, "batch_id": batch_id or uuid.uuid4().hex, "items": items}
+    data = json.dumps(envelope, separators=(",", ":")).encode()
+    return zlib.compress(data) if compress else data
+
+def encode_message(items, kind, batch_id=None, compress=False, binary=False):
+    """Encode items as one message and return (payload, binary).
+
+    With `binary`, items the binary layout cannot carry exactly (custom
+    reasons, extra fields) are sent as JSON instead, so callers pick the
+    topic from the returned flag. Without a batch id, the single item is plain
+    JSON as before.
+    """
+    if binary:
+        try:
+            data = encode_binary(kind, items, batch_id)
+            return (zlib.compress(data) if compress else data), True
+        except ValueError:
+            pass
+    if batch_id is None:
+        return json.dumps(items[0]).encode(), False
+    return encode_batch(items, batch_id=batch_id, compress=compress), False
+
+def decode_message(payload):
+    """Return (batch_id, items, compressed, binary); batch_id is None for a single message."""
+    compressed = len(payload) > 0 and payload[0] == _ZLIB_HEADER
+    if compressed:
+        payload = zlib.decompress(payload)
+    if len(payload) > 0 and payload[0] == MAGIC:
+        batch_id, items = decode_binary(payload)
+        return batch_id, items, compressed, True
+    message = json.loads(payload)
+    if isinstance(message, dict) and message.get("content_type") == CONTENT_TYPE:
+        return message["batch_id"], message["items"], compressed, False
+    return None, [message], compressed, False
+
+def decode_payload(payload):
+    """Return (batch_id, items, compressed); batch_id is None for a single legacy message."""
+    return decode_message(payload)[:3]
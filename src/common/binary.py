@@ -0,0 +1,275 @@
+import struct
+import time
+from src.common.validation import CARD_TYPES, REASONS, REGIONS
+
+# Compact binary encoding for kyc/card_data and kyc/result, sent on the same topics with a /bin suffix.
+#
+#   header   magic 0xC1, kind (1 card, 2 result; | 0x80 for a batch), item count (uint16)
+#            batch only: batch id as uint8 length + UTF-8
+#   card     flags, card_type, region, id and name length (characters), text length (bytes)
+#            [msg_id: 16 bytes] id + name + expiry (UTF-8) [literal card_type] [literal region] [sent_ts: float64]
+#   result   flags, card_type, region, reasons bitmask (uint16), timestamp (uint32 epoch), id length (bytes)
+#            [msg_id: 16 bytes] id [literal card_type] [literal region] [sent_ts: float64]
+#
+# card_type and region are 1-based indexes into the known names (0 = missing, 0xFF = a literal
+# uint8-length string follows). Integers are little-endian. sent_ts comes last so the load generator
+# can stamp pre-encoded cards. 0xC1 never occurs in UTF-8, so a payload cannot be mistaken for JSON.
+MAGIC = 0xC1
+CARD = 1
+RESULT = 2
+BATCH = 0x80
+BINARY_SUFFIX = "/bin"
+CONTENT_TYPE = "application/vnd.kyc.binary"
+
+HAS_MSG_ID = 0x01
+HAS_SENT_TS = 0x02
+HAS_TIMESTAMP = 0x04
+REJECTED = 0x08
+LITERAL = 0xFF
+
+HEADER = struct.Struct("<BBH")
+CARD_FIXED = struct.Struct("<BBBBBH")
+RESULT_FIXED = struct.Struct("<BBBHIB")
+FLOAT = struct.Struct("<d")
+
+CARD_TYPE_NAMES = (None,) + CARD_TYPES + ("Unknown",)
+REGION_NAMES = (None,) + REGIONS + ("Unknown",)
+CARD_TYPE_CODES = {name: code for code, name in enumerate(CARD_TYPE_NAMES) if name}
+REGION_CODES = {name: code for code, name in enumerate(REGION_NAMES) if name}
+CARD_KEYS = frozenset(("id", "name", "expiry", "region", "card_type", "msg_id", "sent_ts"))
+RESULT_KEYS = frozenset(("id", "status", "reasons", "timestamp", "card_type", "region", "msg_id", "sent_ts"))
+
+# Rules report reasons in REASONS order, so every reasons list a verdict can carry is one of these
+REASON_BITS = {reason: 1 << bit for bit, reason in enumerate(REASONS)}
+REASON_LISTS = [[reason for bit, reason in enumerate(REASONS) if mask >> bit & 1] for mask in range(1 << len(REASONS))]
+
+def topics(topic):
+    # Services subscribe to both encodings of a topic
+    return (topic, topic + BINARY_SUFFIX)
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] == MAGIC
+
+def header(kind, count, batch_id=None):
+    if batch_id is None:
+        return HEADER.pack(MAGIC, kind, count)
+    raw = batch_id.encode()
+    return HEADER.pack(MAGIC, kind | BATCH, count) + bytes((len(raw),)) + raw
+
+def _msg_id(value):
+    # Producers use uuid4().hex; any other id shape is left to JSON
+    raw = bytes.fromhex(value)
+    if len(raw) != 16 or raw.hex() != value:
+        raise ValueError(f"msg_id {value!r} is not 32 lowercase hex digits")
+    return raw
+
+def _code(value, codes):
+    code = codes.get(value)
+    if code is not None:
+        return code, b""
+    raw = value.encode()
+    if len(raw) > 255:
+        raise ValueError(f"{value!r} is too long")
+    return LITERAL, bytes((len(raw),)) + raw
+
+class Timestamps:
+    """Converts verdict timestamps ("%Y-%m-%d %H:%M:%S", local time) to epoch seconds and back.
+
+    Results arrive in bursts stamped with the same second, so the last
+    conversion in each direction is remembered. A timestamp that would not
+    come back unchanged (another format, a DST gap) cannot be encoded.
+    """
+
+    def __init__(self):
+        self.last_text = (None, None)
+        self.last_epoch = (None, None)
+
+    def epoch(self, text):
+        last, value = self.last_text
+        if text == last:
+            return value
+        if not (len(text) == 19 and text[4] == "-" and text[7] == "-" and text[10] == " " and text[13] == ":"
+                and text[16] == ":"):
+            raise ValueError(f"Unsupported timestamp {text!r}")
+        value = int(time.mktime((int(text[:4]), int(text[5:7]), int(text[8:10]), int(text[11:13]), int(text[14:16]),
+                                 int(text[17:19]), 0, 0, -1)))
+        if not 0 <= value < 1 << 32 or self.text(value) != text:
+            raise ValueError(f"Timestamp {text!r} does not round-trip")
+        self.last_text = (text, value)
+        return value
+
+    def text(self, value):
+        last, text = self.last_epoch
+        if value != last:
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(value))
+            self.last_epoch = (value, text)
+        return text
+
+timestamps = Timestamps()
+
+def encode_card(card):
+    """One card record; raises ValueError for cards the layout cannot carry exactly (send those as JSON)."""
+    if not card.keys() <= CARD_KEYS:
+        raise ValueError(f"Unsupported card fields {sorted(card.keys() - CARD_KEYS)}")
+    try:
+        card_id, name = card["id"], card["name"]
+        text = (card_id + name + card["expiry"]).encode()
+        flags = 0
+        msg_id = b""
+        if "msg_id" in card:
+            flags |= HAS_MSG_ID
+            msg_id = _msg_id(card["msg_id"])
+        card_type, card_type_literal = _code(card["card_type"], CARD_TYPE_CODES) if "card_type" in card else (0, b"")
+        region, region_literal = _code(card["region"], REGION_CODES) if "region" in card else (0, b"")
+        sent_ts = b""
+        if "sent_ts" in card:
+            flags |= HAS_SENT_TS
+            sent_ts = FLOAT.pack(card["sent_ts"])
+        return (CARD_FIXED.pack(flags, card_type, region, len(card_id), len(name), len(text)) + msg_id + text
+                + card_type_literal + region_literal + sent_ts)
+    except (KeyError, TypeError, AttributeError, struct.error) as e:
+        raise ValueError(f"Card cannot be encoded: {e!r}") from e
+
+def encode_result(result):
+    """One result record; raises ValueError for results the layout cannot carry exactly."""
+    if not result.keys() <= RESULT_KEYS:
+        raise ValueError(f"Unsupported result fields {sorted(result.keys() - RESULT_KEYS)}")
+    try:
+        status = result["status"]
+        if status == "rejected":
+            flags = REJECTED
+        elif status == "approved":
+            flags = 0
+        else:
+            raise ValueError(f"Unsupported status {status!r}")
+        reasons = result["reasons"]
+        mask = 0
+        for reason in reasons:
+            mask |= REASON_BITS[reason]
+        if REASON_LISTS[mask] != reasons:
+            raise ValueError(f"Reasons {reasons!r} are not in rule order")
+        epoch = 0
+        if "timestamp" in result:
+            flags |= HAS_TIMESTAMP
+            epoch = timestamps.epoch(result["timestamp"])
+        msg_id = b""
+        if "msg_id" in result:
+            flags |= HAS_MSG_ID
+            msg_id = _msg_id(result["msg_id"])
+        card_type, card_type_literal = _code(result["card_type"], CARD_TYPE_CODES) if "card_type" in result else (0, b"")
+        region, region_literal = _code(result["region"], REGION_CODES) if "region" in result else (0, b"")
+        sent_ts = b""
+        if "sent_ts" in result:
+            flags |= HAS_SENT_TS
+            sent_ts = FLOAT.pack(result["sent_ts"])
+        raw_id = result["id"].encode()
+        return (RESULT_FIXED.pack(flags, card_type, region, mask, epoch, len(raw_id)) + msg_id + raw_id
+                + card_type_literal + region_literal + sent_ts)
+    except (KeyError, TypeError, AttributeError, struct.error) as e:
+        raise ValueError(f"Result cannot be encoded: {e!r}") from e
+
+ENCODERS = {CARD: encode_card, RESULT: encode_result}
+
+def encode_binary(kind, items, batch_id=None):
+    """Encode cards or results; with `batch_id` None, `items` must hold a single item sent on its own."""
+    if batch_id is None and len(items) != 1:
+        raise ValueError("A message without a batch id carries exactly one item")
+    if len(items) > 0xFFFF:
+        raise ValueError(f"{len(items)} items do not fit in one binary message")
+    encode = ENCODERS[kind]
+    return header(kind, len(items), batch_id) + b"".join([encode(item) for item in items])
+
+def _literal(view, offset):
+    end = offset + 1 + view[offset]
+    return str(view[offset + 1:end], "utf-8"), end
+
+def decode_binary(payload):
+    """Return (batch_id, items) from a binary payload, reading straight from its buffer."""
+    view = memoryview(payload)
+    magic, kind, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a binary KYC payload")
+    offset = HEADER.size
+    batch_id = None
+    if kind & BATCH:
+        batch_id, offset = _literal(view, offset)
+        kind &= ~BATCH
+    if kind == CARD:
+        items = _decode_cards(view, offset, count)
+    elif kind == RESULT:
+        items = _decode_results(view, offset, count)
+    else:
+        raise ValueError(f"Unknown binary payload kind {kind}")
+    return batch_id, items
+
+def _decode_cards(view, offset, count):
+    unpack = CARD_FIXED.unpack_from
+    fixed_size = CARD_FIXED.size
+    cards = []
+    for _ in range(count):
+        flags, card_type, region, id_len, name_len, text_len = unpack(view, offset)
+        offset += fixed_size
+        if flags & HAS_MSG_ID:
+            msg_id = view[offset:offset + 16].hex()
+            offset += 16
+        # One UTF-8 decode for all three strings; the lengths of id and name are in characters
+        text = str(view[offset:offset + text_len], "utf-8")
+        offset += text_len
+        name_end = id_len + name_len
+        card = {"id": text[:id_len], "name": text[id_len:name_end], "expiry": text[name_end:]}
+        # Keys in the order producers write them: region before card_type
+        if card_type == LITERAL:
+            card_type, offset = _literal(view, offset)
+        else:
+            card_type = CARD_TYPE_NAMES[card_type]
+        if region == LITERAL:
+            card["region"], offset = _literal(view, offset)
+        elif region:
+            card["region"] = REGION_NAMES[region]
+        if card_type is not None:
+            card["card_type"] = card_type
+        if flags & HAS_MSG_ID:
+            card["msg_id"] = msg_id
+        if flags & HAS_SENT_TS:
+            card["sent_ts"] = FLOAT.unpack_from(view, offset)[0]
+            offset += 8
+        cards.append(card)
+    if offset != len(view):
+        raise ValueError(f"{len(view) - offset} trailing bytes after {count} cards")
+    return cards
+
+def _decode_results(view, offset, count):
+    unpack = RESULT_FIXED.unpack_from
+    fixed_size = RESULT_FIXED.size
+    results = []
+    for _ in range(count):
+        flags, card_type, region, mask, epoch, id_len = unpack(view, offset)
+        offset += fixed_size
+        if flags & HAS_MSG_ID:
+            msg_id = view[offset:offset + 16].hex()
+            offset += 16
+        result = {"id": str(view[offset:offset + id_len], "utf-8"),
+                  "status": "rejected" if flags & REJECTED else "approved",
+                  "reasons": list(REASON_LISTS[mask])}
+        offset += id_len
+        if flags & HAS_TIMESTAMP:
+            result["timestamp"] = timestamps.text(epoch)
+        if card_type:
+            if card_type == LITERAL:
+                result["card_type"], offset = _literal(view, offset)
+            else:
+                result["card_type"] = CARD_TYPE_NAMES[card_type]
+        if region:
+            if region == LITERAL:
+                result["region"], offset = _literal(view, offset)
+            else:
+                result["region"] = REGION_NAMES[region]
+        if flags & HAS_MSG_ID:
+            result["msg_id"] = msg_id
+        if flags & HAS_SENT_TS:
+            result["sent_ts"] = FLOAT.unpack_from(view, offset)[0]
+            offset += 8
+        results.append(result)
+    if offset != len(view):
+        raise ValueError(f"{len(view) - offset} trailing bytes after {count} results")
+    return results
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+def payload_key(payload):
+    # An MQTT redelivery carries the same bytes, so a digest of the raw payload identifies it without decoding
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests; `capacity` keys at false-positive rate `error`."""
+
+    def __init__(self, capacity, error=1e-6):
+        self.size = max(8, int(-capacity * math.log(error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Keys are already uniform digests: double hashing on two 64-bit halves gives the k positions
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] >> (p & 7) & 1 for p in self.positions(key))
+
+    def add(self, key):
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+class DedupCache:
+    """Remembers recently seen message keys, bounded by count (LRU) and age (TTL).
+
+    `seen(key)` records the key and reports whether it was already there, so
+    a redelivered message costs one digest and one dict lookup. With
+    `bloom=True` keys live in two rotating Bloom filters instead of a dict:
+    a few bytes per key instead of ~100, at the price that a fresh message is
+    taken for a duplicate with probability `error`. The current filter takes
+    new keys and is retired to "previous" after `ttl` seconds or `max_size`
+    keys, so a key is remembered for at least one and at most two generations.
+    """
+
+    def __init__(self, max_size=100000, ttl=600.0, bloom=False, error=1e-6, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.bloom = bloom
+        self.error = error
+        self.hits = 0
+        if bloom:
+            self.current = BloomFilter(max_size, error)
+            self.previous = None
+            self.rotated_at = clock()
+        else:
+            self.entries = OrderedDict()
+
+    def seen(self, key):
+        with self.lock:
+            if self.bloom:
+                duplicate = self._seen_bloom(key)
+            else:
+                duplicate = self._seen_exact(key)
+            if duplicate:
+                self.hits += 1
+            return duplicate
+
+    def _seen_exact(self, key):
+        now = self.clock()
+        entries = self.entries
+        expires = entries.get(key)
+        if expires is not None and expires > now:
+            entries.move_to_end(key)
+            return True
+        entries[key] = now + self.ttl
+        entries.move_to_end(key)
+        # Least recently seen first: drop over-size entries, then expired ones at the front
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        while entries:
+            oldest = next(iter(entries))
+            if entries[oldest] > now:
+                break
+            del entries[oldest]
+        return False
+
+    def _seen_bloom(self, key):
+        now = self.clock()
+        if now - self.rotated_at >= self.ttl or self.current.count >= self.max_size:
+            self.previous, self.current = self.current, BloomFilter(self.max_size, self.error)
+            self.rotated_at = now
+        if key in self.current or (self.previous is not None and key in self.previous):
+            return True
+        self.current.add(key)
+        return False
+
+    def __len__(self):
+        with self.lock:
+            if self.bloom:
+                return self.current.count + (self.previous.count if self.previous is not None else 0)
+            return len(self.entries)
+
+def cache_from_env():
+    # DEDUP_SIZE=0 turns deduplication off
+    size = int(os.getenv("DEDUP_SIZE", 100000))
+    if size <= 0:
+        return None
+    return DedupCache(size, ttl=float(os.getenv("DEDUP_TTL", 600)), bloom=os.getenv("DEDUP_BLOOM", "0") == "1",
+                      error=float(os.getenv("DEDUP_BLOOM_ERROR", 1e-6)))
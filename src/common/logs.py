@@ -0,0 +1,203 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from src.common.metrics import REGISTRY
+
+DROPPED = REGISTRY.counter("kyc_log_dropped_total", "Log records dropped because the log queue was full")
+SAMPLED_OUT = REGISTRY.counter("kyc_log_sampled_out_total", "Per-message log records skipped by sampling", ("sample",))
+# Attributes every LogRecord has; anything else on a record came in through `extra=` and is emitted as a field
+RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and every `extra=` field."""
+
+    def format(self, record):
+        entry = {"time": round(record.created, 6), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        for key, value in record.__dict__.items():
+            if key not in RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+class SampleFilter(logging.Filter):
+    """Keeps one in `rates[sample]` records tagged with `extra={"sample": <key>}`.
+
+    Untagged records and keys without a rate always pass, so only the
+    per-message lines that opt in (approvals, say) are thinned out.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {key: rate for key, rate in rates.items() if rate > 1}
+        self.counters = {key: itertools.count() for key in self.rates}
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        rate = self.rates.get(key)
+        if rate is None or next(self.counters[key]) % rate == 0:
+            return True
+        SAMPLED_OUT.labels(key).inc()
+        return False
+
+class LazyQueueHandler(QueueHandler):
+    """Hands the record to the listener thread untouched.
+
+    The stock QueueHandler formats the message on the caller's thread so the
+    record can be pickled; our listener runs in the same process, so `%`
+    interpolation and JSON encoding are left to it. Callers must not mutate
+    objects passed as log arguments afterwards. A full queue drops the record
+    instead of blocking the message thread, unless `block` is set: then
+    `records` must be a bounded queue.Queue, and the caller waits for room.
+    """
+
+    def __init__(self, records, max_size=10000, block=False):
+        super().__init__(records)
+        self.max_size = max_size
+        self.block = block
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        # SimpleQueue has no bound of its own, but its put is a single C call, several times cheaper than Queue's
+        if self.queue.qsize() >= self.max_size:
+            DROPPED.inc()
+            return
+        self.queue.put_nowait(record)
+
+class BlockingQueueListener(QueueListener):
+    """QueueListener for a bounded queue: the stop sentinel waits for room instead of raising queue.Full."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that writes through the file buffer and flushes at most every `flush_interval` seconds.
+
+    The stock handler stats the path, formats each record twice and seeks to
+    the end of the file (which flushes) on every record to decide whether to
+    roll over; this one tracks the size it has written instead. Warnings and
+    errors are flushed straight away, and a timer flushes whatever is buffered
+    once the stream goes quiet.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backups=5, flush_interval=1.0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.flush_interval = flush_interval
+        self.size = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        self.last_flush = time.monotonic()
+        self.stop_event = threading.Event()
+        threading.Thread(target=self._flush_loop, name="LogFlush", daemon=True).start()
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + self.terminator
+            if self.maxBytes and self.size and self.size + len(line) >= self.maxBytes:
+                self.doRollover()
+                self.size = 0
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(line)
+            # JSON lines are ASCII, so characters are bytes; text lines may undercount slightly
+            self.size += len(line)
+            if record.levelno >= logging.WARNING or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.flush()
+            self.last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        super().close()
+
+def file_handler(filename):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    handler = BufferedRotatingFileHandler(filename, max_bytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+                                          backups=int(os.getenv("LOG_BACKUPS", 5)),
+                                          flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", 1.0)))
+    if os.getenv("LOG_FORMAT", "json") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    return handler
+
+def sample_rates():
+    # LOG_SAMPLE_APPROVED=N keeps one approval line in N; rejections are kept unless LOG_SAMPLE_REJECTED is set too
+    return {"approved": int(os.getenv("LOG_SAMPLE_APPROVED", 1)), "rejected": int(os.getenv("LOG_SAMPLE_REJECTED", 1))}
+
+_listeners = {}
+_lock = threading.Lock()
+
+def configure(filename, level=logging.INFO, logger=None, sample=True, block=False, queue_size=None):
+    """Route `logger` (the root logger by default) through a queue to a rotating JSON file.
+
+    Replaces `logging.basicConfig(filename=...)` in the services: the calling
+    thread only appends the record to a bounded queue, and a QueueListener
+    thread formats and writes it. Like basicConfig, a second call for an
+    already configured logger does nothing. Returns the QueueListener.
+
+    Logs that must be complete, such as the audit trail, pass `sample=False`
+    to skip LOG_SAMPLE_* and `block=True` to wait rather than drop when the
+    queue (`queue_size`, LOG_QUEUE_SIZE by default) is full.
+    """
+    target = logger if logger is not None else logging.getLogger()
+    # Record attributes no service format uses; skipping them is the logging HOWTO's own advice for hot paths
+    # (_srcfile = None avoids a stack walk per record to find the caller's file and line)
+    logging._srcfile = None
+    logging.logProcesses = logging.logMultiprocessing = False
+    with _lock:
+        listener = _listeners.get(target.name)
+        if listener is not None:
+            return listener
+        size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", 10000))
+        records = queue.Queue(maxsize=size) if block else queue.SimpleQueue()
+        handler = LazyQueueHandler(records, size, block)
+        if sample:
+            handler.addFilter(SampleFilter(sample_rates()))
+        target.addHandler(handler)
+        target.setLevel(level)
+        listener = (BlockingQueueListener if block else QueueListener)(records, file_handler(filename),
+                                                                       respect_handler_level=True)
+        listener.start()
+        _listeners[target.name] = listener
+        atexit.register(shutdown, target.name)
+        return listener
+
+def shutdown(name=None):
+    # Stops the listener after it has written every queued record, then closes the file
+    with _lock:
+        names = [name] if name is not None else list(_listeners)
+        listeners = [(key, _listeners.pop(key)) for key in names if key in _listeners]
+    for key, listener in listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        target = logging.getLogger(key if key != "root" else None)
+        for handler in list(target.handlers):
+            if isinstance(handler, LazyQueueHandler):
+                target.removeHandler(handler)
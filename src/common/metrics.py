@@ -0,0 +1,373 @@
+import bisect
+import collections
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Seconds; spans a sub-10µs rule check up to a multi-second stalled commit or PUBACK
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Value:
+    """One counter or gauge time series."""
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+        self.function = None
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        # Read at scrape time, so state a service already keeps (queue sizes, counter dicts) costs nothing per message
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+class HistogramValue:
+    """One histogram time series: per-bucket counts, turned cumulative only when scraped."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return Timer(self.observe)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+class Timer:
+    def __init__(self, observe):
+        self.observe = observe
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.observe(time.perf_counter() - self.start)
+
+class Metric:
+    """A named metric family; with `labels`, each combination of label values is its own series."""
+
+    def __init__(self, kind, name, help, labels=(), buckets=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.default = self.labels()
+            # Unlabelled metrics are used directly: counter.inc(), histogram.observe(...)
+            for attr in ("inc", "dec", "set", "set_function", "get", "observe", "time"):
+                if hasattr(self.default, attr):
+                    setattr(self, attr, getattr(self.default, attr))
+
+    def labels(self, *values, **named):
+        if named:
+            values = tuple(named[name] for name in self.label_names)
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = HistogramValue(self.buckets) if self.kind == "histogram" else Value()
+                    self.children[values] = child
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            if self.kind != "histogram":
+                try:
+                    value = child.get()
+                except Exception as e:
+                    logging.error(f"Metric {self.name} unavailable: {e}")
+                    continue
+                lines.append(f"{self.name}{format_labels(self.label_names, values)} {format_value(float(value))}")
+                continue
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = format_labels(self.label_names, values, (("le", format_value(float(bound))),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text exposition format.
+
+    Registering an existing name returns the metric already there, so modules
+    can declare their metrics at import time and tests can build services twice.
+    """
+
+    def __init__(self):
+        self.metrics = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def register(self, kind, name, help, labels=(), buckets=None):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(kind, name, help, labels, buckets)
+            elif metric.kind != kind or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.label_names}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register("counter", name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self.register("gauge", name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        return self.register("histogram", name, help, labels, buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+REGISTRY = Registry()
+
+class PublishTimer:
+    """Measures publish latency: from `client.publish()` to paho's on_publish (the PUBACK for QoS 1).
+
+    Call `track(info)` with the MessageInfo returned by publish and install
+    `on_publish` as the client's callback. An acknowledgement can beat `track`
+    to the lock; such messages are simply not timed.
+    """
+
+    def __init__(self, histogram, max_pending=10000):
+        self.histogram = histogram
+        self.max_pending = max_pending
+        self.pending = {}
+        self.acked = set()
+        self.lock = threading.Lock()
+
+    def track(self, info, start=None):
+        start = time.perf_counter() if start is None else start
+        with self.lock:
+            if info.mid in self.acked:
+                self.acked.discard(info.mid)
+                return
+            if len(self.pending) >= self.max_pending:
+                # Lost acknowledgements must not grow the table forever
+                self.pending.clear()
+            self.pending[info.mid] = start
+
+    def on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        now = time.perf_counter()
+        with self.lock:
+            start = self.pending.pop(mid, None)
+            if start is None:
+                if len(self.acked) >= self.max_pending:
+                    self.acked.clear()
+                self.acked.add(mid)
+                return
+        self.histogram.observe(now - start)
+
+class SamplingProfiler:
+    """Statistical profiler: samples every thread's stack each `interval` seconds while running.
+
+    Stacks are aggregated in the collapsed format (`frame;frame;frame count`)
+    that flamegraph.pl and speedscope read. Nothing is sampled until `start()`,
+    so it can stay wired into a service and be switched on only while needed.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=None):
+        with self.lock:
+            if self.running:
+                return False
+            if interval:
+                self.interval = interval
+            self.stacks.clear()
+            self.samples = 0
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        with self.lock:
+            if not self.running:
+                return False
+            self.stop_event.set()
+            self.thread.join()
+            return True
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self, top=None):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(top)) + "\n"
+
+PROFILER = SamplingProfiler()
+# Shorter intervals make the sampler spin on one core; longer ones collect too few samples to read
+PROFILE_INTERVAL_RANGE = (0.001, 1.0)
+
+def clamp_interval(interval):
+    low, high = PROFILE_INTERVAL_RANGE
+    return min(max(interval, low), high)
+
+def profile_control():
+    # METRICS_PROFILE_HTTP=1 lets /profile/start and /profile/stop switch the profiler; off by default,
+    # since the scrape port listens on every interface without authentication
+    return os.getenv("METRICS_PROFILE_HTTP", "0") == "1"
+
+def handle(path, query="", registry=REGISTRY, profiler=PROFILER, method="GET", control=None):
+    """Route a metrics or profiler request; returns (status, content type, body).
+
+    Shared by the standalone scrape server and the Flask app:
+      /metrics                            Prometheus text format
+      POST /profile/start?interval=0.01   start sampling (all threads)
+      POST /profile/stop                  stop sampling and return collapsed stacks
+      /profile?top=20                     collapsed stacks collected so far
+
+    Starting and stopping need `control`, which defaults to METRICS_PROFILE_HTTP.
+    """
+    params = parse_qs(query)
+    if path == "/metrics":
+        return 200, CONTENT_TYPE, registry.render()
+    if path in ("/profile/start", "/profile/stop"):
+        if not (profile_control() if control is None else control):
+            return 403, "text/plain", "Profiler control is off; set METRICS_PROFILE_HTTP=1\n"
+        if method != "POST":
+            return 405, "text/plain", "Use POST\n"
+        if path == "/profile/stop":
+            profiler.stop()
+            return 200, "text/plain", profiler.collapsed()
+        try:
+            interval = float(params.get("interval", [0])[0])
+        except ValueError:
+            return 400, "text/plain", "interval must be a number of seconds\n"
+        if not math.isfinite(interval):
+            return 400, "text/plain", "interval must be a number of seconds\n"
+        started = profiler.start(clamp_interval(interval) if interval else None)
+        return 200, "text/plain", "started\n" if started else "already running\n"
+    if path == "/profile":
+        try:
+            top = int(params.get("top", [0])[0]) or None
+        except ValueError:
+            return 400, "text/plain", "top must be an integer\n"
+        return 200, "text/plain", profiler.collapsed(top)
+    return 404, "text/plain", "Not found\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            status, content_type, body = handle(url.path, url.query, method=self.command)
+        except Exception as e:
+            status, content_type, body = 500, "text/plain", f"{e}\n"
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise fill stderr
+        pass
+
+def serve(port, host="0.0.0.0"):
+    """Expose /metrics and the profiler on `port` from a daemon thread; returns the server or None."""
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        # A second instance on the same host must not fail to start over its scrape port
+        logging.error(f"Metrics endpoint on port {port} unavailable: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    logging.info(f"Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def serve_from_env(variable, default=0):
+    # <SERVICE>_METRICS_PORT; 0 leaves the endpoint off. METRICS_PROFILE=1 samples from startup.
+    port = int(os.getenv(variable, default))
+    if os.getenv("METRICS_PROFILE", "0") == "1":
+        PROFILER.start(clamp_interval(float(os.getenv("METRICS_PROFILE_INTERVAL", 0.005))))
+    return serve(port) if port > 0 else None
+
+def quiet():
+    # KYC_QUIET=1 drops the per-message print/log lines; the same information is in the metrics
+    return os.getenv("KYC_QUIET", "0") == "1"
@@ -0,0 +1,168 @@
+import itertools
+import re
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+REGIONS = ("US", "EU", "ASIA", "MEA")
+CARD_TYPES = ("Visa", "MasterCard", "Amex", "Discover")
+REGION_SET = frozenset(REGIONS)
+CARD_TYPE_SET = frozenset(CARD_TYPES)
+ID_PATTERN = re.compile(r"^\d{4}-\d{4}-\d{4}$|^\d{6}-\d{4}$")
+
+# A rule either carries an arbitrary `check(card) -> bool`, or is declared as a field that must
+# match a compiled pattern or belong to an allow-list; Validator tests the latter without calling `check`.
+Rule = namedtuple("Rule", ["name", "reason", "check", "field", "pattern", "allowed"], defaults=(None, None, None))
+
+class FieldCheck:
+    """check(card) of a pattern or allow-list rule; a class rather than a closure, so rule tables pickle."""
+
+    def __init__(self, field, pattern=None, allowed=None):
+        self.field = field
+        self.pattern = pattern
+        self.allowed = allowed
+
+    def __call__(self, card):
+        if self.allowed is not None:
+            return card.get(self.field) in self.allowed
+        return self.pattern.match(card[self.field]) is not None
+
+def pattern_rule(name, reason, field, pattern):
+    return Rule(name, reason, FieldCheck(field, pattern=pattern), field=field, pattern=pattern)
+
+def allowed_rule(name, reason, field, allowed):
+    allowed = frozenset(allowed)
+    return Rule(name, reason, FieldCheck(field, allowed=allowed), field=field, allowed=allowed)
+
+class TodayCache:
+    """Caches today's date and only recomputes it once the next midnight has passed."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.refresh()
+        # Bound once so the hot path is a single call plus a float compare
+        self.get = self._get
+
+    def refresh(self):
+        now = datetime.fromtimestamp(self.clock())
+        self.today = now.date()
+        self.next_midnight = datetime.combine(self.today + timedelta(days=1), datetime.min.time()).timestamp()
+
+    def _get(self):
+        if self.clock() >= self.next_midnight:
+            self.refresh()
+        return self.today
+
+today = TodayCache()
+
+def parse_expiry(value):
+    # Fast path for the fixed YYYY-MM-DD layout; anything else goes through strptime so errors match
+    if (len(value) == 10 and value[4] == "-" and value[7] == "-" and value.isascii()
+            and value[:4].isdigit() and value[5:7].isdigit() and value[8:].isdigit()):
+        return date(int(value[:4]), int(value[5:7]), int(value[8:]))
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+_expiry_verdicts = {}
+_expiry_day = None
+EXPIRY_CACHE_SIZE = 8192
+
+def check_expiry(card):
+    # Expiry dates repeat a lot, so verdicts are memoized per day; the cache resets when the date rolls over.
+    # A card expiring today is already expired: the expiry date is compared at midnight.
+    global _expiry_day
+    expiry = card["expiry"]
+    current = today.get()
+    if current is not _expiry_day:
+        _expiry_verdicts.clear()
+        _expiry_day = current
+    verdict = _expiry_verdicts.get(expiry)
+    if verdict is None:
+        verdict = parse_expiry(expiry) > current
+        if len(_expiry_verdicts) >= EXPIRY_CACHE_SIZE:
+            _expiry_verdicts.clear()
+        _expiry_verdicts[expiry] = verdict
+    return verdict
+
+def check_name(card):
+    name = card["name"]
+    return len(name) >= 3 and len(name.split()) >= 2
+
+REASONS = ("Invalid ID format", "Card expired", "Invalid name", "Invalid region", "Invalid card type")
+
+RULES = (
+    pattern_rule("id", "Invalid ID format", "id", ID_PATTERN),
+    Rule("expiry", "Card expired", check_expiry),
+    Rule("name", "Invalid name", check_name),
+    allowed_rule("region", "Invalid region", "region", REGION_SET),
+    allowed_rule("card_type", "Invalid card type", "card_type", CARD_TYPE_SET),
+)
+
+class Validator:
+    def __init__(self, rules=RULES):
+        self.rules = tuple(rules)
+        self.timing = None
+        self._compile()
+
+    def _compile(self):
+        # The rule table is bound once into a tuple the loop unpacks: pattern and allow-list rules test
+        # their field directly, so only custom rules cost a Python call per card.
+        checks = tuple((rule.field, rule.allowed, rule.pattern.match if rule.pattern is not None else None,
+                        rule.check, rule.reason) for rule in self.rules)
+        def validate(card):
+            reasons = []
+            for field, allowed, match, check, reason in checks:
+                if allowed is not None:
+                    passed = card.get(field) in allowed
+                elif match is not None:
+                    passed = match(card[field]) is not None
+                else:
+                    passed = check(card)
+                if not passed:
+                    reasons.append(reason)
+            return reasons
+        self.validate = validate
+        if self.timing is not None:
+            histogram, every = self.timing
+            observers = tuple(histogram.labels(rule.name).observe for rule in self.rules)
+            perf_counter = time.perf_counter
+            def validate_timed(card):
+                reasons = []
+                start = perf_counter()
+                for (field, allowed, match, check, reason), observe in zip(checks, observers):
+                    if allowed is not None:
+                        passed = card.get(field) in allowed
+                    elif match is not None:
+                        passed = match(card[field]) is not None
+                    else:
+                        passed = check(card)
+                    if not passed:
+                        reasons.append(reason)
+                    end = perf_counter()
+                    observe(end - start)
+                    start = end
+                return reasons
+            self.validate = self._sampled(validate, validate_timed, every)
+
+    @staticmethod
+    def _sampled(fast, timed, every):
+        # Only every `every`-th card pays for the timers; the rest take the untimed function
+        calls = itertools.count()
+        def validate(card):
+            if next(calls) % every:
+                return fast(card)
+            return timed(card)
+        return validate
+
+    def instrument(self, histogram, every=100):
+        """Time each rule on one card in `every` into `histogram`, which must be labelled by rule."""
+        self.timing = (histogram, max(1, int(every))) if histogram is not None else None
+        self._compile()
+
+    def add_rule(self, rule):
+        self.rules = self.rules + (rule,)
+        self._compile()
+
+default_validator = Validator()
+
+def validate_card(card):
+    return default_validator.validate(card)
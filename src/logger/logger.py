@@ -1,9 +1,94 @@
 # src/logger/logger.py
-import paho.mqtt.client as mqtt
+import argparse
 import json
+import logging
+import os
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.common.batch import decode_payload
+from src.common.logs import configure
+from src.common.metrics import REGISTRY, serve_from_env
+
+MESSAGES = REGISTRY.counter("kyc_logger_messages_total", "Messages received by the logger")
+ITEMS = REGISTRY.counter("kyc_logger_items_total", "Cards and results written to the audit log", ("topic",))
+
+class LogService:
+    """Subscribes to the KYC topics and appends every card and result to data/logger.log as JSON lines.
+
+    Writes go through the `kyc.audit` logger, which has its own queue, listener
+    and buffered rotating file, so the MQTT thread never touches the disk and
+    the file is flushed about once per LOG_FLUSH_INTERVAL rather than per line.
+    Unlike the services' own logs, nothing is sampled or dropped: LOG_SAMPLE_*
+    does not apply, and when LOGGER_QUEUE_SIZE lines are waiting the MQTT thread
+    blocks until the listener catches up.
+    """
+
+    def __init__(self, topics=("kyc/result", "kyc/result/bin"), path="data/logger.log", ack=True):
+        load_dotenv()
+        self.broker = os.getenv("MQTT_BROKER", "localhost")
+        self.port = int(os.getenv("MQTT_PORT", 1883))
+        self.qos = int(os.getenv("MQTT_QOS", 1))
+        self.topics = topics
+        self.ack = ack
+        self.audit = logging.getLogger("kyc.audit")
+        # Audit lines stay out of the root logger's file
+        self.audit.propagate = False
+        configure(path, logger=self.audit, sample=False, block=True,
+                  queue_size=int(os.getenv("LOGGER_QUEUE_SIZE", 100000)))
+        self.client = mqtt.Client(client_id=f"Logger-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def start(self):
+        self.client.connect(self.broker, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        for topic in self.topics:
+            client.subscribe(topic, qos=self.qos)
+        logging.info(f"Logger subscribed to {', '.join(self.topics)}")
+
+    def on_message(self, client, userdata, msg):
+        MESSAGES.inc()
+        try:
+            batch_id, items, _ = decode_payload(msg.payload)
+        except Exception as e:
+            logging.error(f"Logger could not decode message on {msg.topic}: {e}")
+            return
+        self.log_items(msg.topic, batch_id, items)
+        if self.ack:
+            # One acknowledgement per message rather than per item
+            ids = [item.get("id") for item in items]
+            client.publish("kyc/log", json.dumps({"log": f"Processed {', '.join(map(str, ids))}", "ids": ids,
+                                                  "batch_id": batch_id}))
+
+    def log_items(self, topic, batch_id, items):
+        for item in items:
+            self.audit.info("Logged %s", item.get("id"), extra={"topic": topic, "batch_id": batch_id, "item": item})
+        ITEMS.labels(topic).inc(len(items))
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
 
-def on_message(client, userdata, msg):
-    data = json.loads(msg.payload.decode())
-    with open("data/logger.log", "a") as f:
-        f.write(f"Logged: {data}\n")
-    client.publish("kyc/log", json.dumps({"log": f"Processed {data['id']}"}))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KYC audit logger")
+    parser.add_argument("--topics", default=os.getenv("LOGGER_TOPICS", "kyc/result,kyc/result/bin"),
+                        help="Comma-separated topics to record (e.g. kyc/card_data,kyc/card_data/bin,kyc/result)")
+    parser.add_argument("--output", default="data/logger.log", help="Audit log file")
+    parser.add_argument("--no-ack", action="store_true", help="Do not publish acknowledgements on kyc/log")
+    args = parser.parse_args()
+    configure("data/logger_service.log")
+    service = LogService(tuple(topic for topic in args.topics.split(",") if topic), args.output, ack=not args.no_ack)
+    metrics_server = serve_from_env("LOGGER_METRICS_PORT")
+    service.start()
+    print(f"Logging {args.topics} to {args.output}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        service.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
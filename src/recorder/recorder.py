@@ -0,0 +1,318 @@
+# src/recorder/recorder.py
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+import numpy as np
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.common.binary import topics as binary_topics
+from src.common.logs import configure
+from src.common.metrics import REGISTRY, serve_from_env
+
+# Traffic log: a file header, then one record per message, appended in arrival order.
+#   header  magic b"KYCTRAF1", recording start (int64 epoch nanoseconds)
+#   record  offset from the start (int64 ns), payload length (uint32), topic length (uint16),
+#           flags (uint8: QoS in bits 0-1, retain in bit 2), then the topic and the payload bytes
+# Offsets come from the wall clock, so a recorder restarted on the same file keeps one timeline.
+MAGIC = b"KYCTRAF1"
+FILE_HEADER = struct.Struct("<8sq")
+RECORD = struct.Struct("<qIHB")
+RETAIN = 0x04
+
+RECORDED = REGISTRY.counter("kyc_recorder_messages_total", "Messages appended to the traffic log", ("topic",))
+RECORDED_BYTES = REGISTRY.counter("kyc_recorder_bytes_total", "Bytes appended to the traffic log")
+
+def scan(buffer, start=FILE_HEADER.size):
+    """Offsets (ns) and positions of the complete records in `buffer`, plus the end of the last one."""
+    times, positions = [], []
+    unpack = RECORD.unpack_from
+    size = len(buffer)
+    position = start
+    while position + RECORD.size <= size:
+        offset, payload_len, topic_len, _ = unpack(buffer, position)
+        end = position + RECORD.size + topic_len + payload_len
+        if end > size:
+            # A torn write at the tail: the recorder was killed mid-record
+            break
+        times.append(offset)
+        positions.append(position)
+        position = end
+    return np.array(times, dtype=np.int64), np.array(positions, dtype=np.int64), position
+
+class TrafficWriter:
+    """Appends records to a traffic log through a large write buffer, flushed every `flush_interval` seconds.
+
+    Reopening an existing log keeps its start time; a torn record left at the
+    tail by a crash is cut off first, so the framing stays intact.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.started_ns = self._prepare()
+        self.file = open(path, "ab", buffering=1024 * 1024)
+        self.lock = threading.Lock()
+        self.records = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        if flush_interval > 0:
+            self.thread = threading.Thread(target=self._flush_loop, args=(flush_interval,), name="TrafficFlush",
+                                           daemon=True)
+            self.thread.start()
+
+    def _prepare(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            started_ns = time.time_ns()
+            with open(self.path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, started_ns))
+            return started_ns
+        with open(self.path, "r+b") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                magic, started_ns = FILE_HEADER.unpack_from(buffer)
+                if magic != MAGIC:
+                    raise ValueError(f"{self.path} is not a traffic log")
+                end = scan(buffer)[2]
+                size = len(buffer)
+            if end < size:
+                logging.warning(f"Dropping {size - end} bytes of a torn record at the end of {self.path}")
+                f.truncate(end)
+        return started_ns
+
+    def write(self, topic, payload, qos=0, retain=False, now_ns=None):
+        topic = topic.encode()
+        offset = (now_ns if now_ns is not None else time.time_ns()) - self.started_ns
+        header = RECORD.pack(offset, len(payload), len(topic), qos | (RETAIN if retain else 0))
+        with self.lock:
+            # One write call per record, so a crash can tear at most the last one
+            self.file.write(header + topic + payload)
+            self.records += 1
+        return RECORD.size + len(topic) + len(payload)
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def _flush_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            self.file.close()
+
+class Recorder:
+    """Subscribes to the KYC topics and appends every message, untouched, to a traffic log.
+
+    Cards are recorded in both encodings (kyc/card_data and kyc/card_data/bin);
+    pass `results=True` to capture kyc/result as well.
+    """
+
+    def __init__(self, path="data/traffic.kyc", topics=None, results=False):
+        load_dotenv()
+        self.broker = os.getenv("MQTT_BROKER", "localhost")
+        self.port = int(os.getenv("MQTT_PORT", 1883))
+        self.qos = int(os.getenv("MQTT_QOS", 1))
+        self.topics = list(topics or binary_topics("kyc/card_data"))
+        if results:
+            self.topics += binary_topics("kyc/result")
+        self.writer = TrafficWriter(path, float(os.getenv("RECORDER_FLUSH_INTERVAL", 1.0)))
+        self.client = mqtt.Client(client_id=f"Recorder-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def start(self):
+        self.client.connect(self.broker, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        client.subscribe([(topic, self.qos) for topic in self.topics])
+        logging.info(f"Recording {', '.join(self.topics)} to {self.writer.path}")
+
+    def on_message(self, client, userdata, msg):
+        size = self.writer.write(msg.topic, msg.payload, msg.qos, msg.retain)
+        RECORDED.labels(msg.topic).inc()
+        RECORDED_BYTES.inc(size)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        self.writer.close()
+        logging.info(f"Recorder closed: {self.writer.records} messages")
+
+class Recording:
+    """Read-only, memory-mapped view of a traffic log.
+
+    Record positions and time offsets are indexed once on open, so seeking is
+    a search over the index; payloads are sliced straight out of the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.started_ns = FILE_HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a traffic log")
+        self.times, self.positions, _ = scan(self.buffer)
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def duration(self):
+        return (int(self.times.max()) / 1e9) if len(self.times) else 0.0
+
+    def find(self, seconds):
+        # Index of the first record at or after `seconds` into the recording
+        later = np.flatnonzero(self.times >= int(seconds * 1e9))
+        return int(later[0]) if len(later) else len(self)
+
+    def record(self, index):
+        """(offset ns, topic bytes, payload bytes, qos, retain) of one record."""
+        position = int(self.positions[index])
+        offset, payload_len, topic_len, flags = RECORD.unpack_from(self.buffer, position)
+        start = position + RECORD.size
+        return (offset, self.buffer[start:start + topic_len], self.buffer[start + topic_len:start + topic_len + payload_len],
+                flags & 0x03, bool(flags & RETAIN))
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+class Replayer:
+    """Republishes a recording through `publish(topic, payload, qos, retain)`.
+
+    `speed` 1 keeps the original gaps between messages, 10 replays ten times
+    faster and 0 as fast as `publish` returns. Playback starts `start` seconds
+    into the recording, stops at `end` and runs `loops` times (0 loops forever).
+    Only records whose topic is in `topics` (all when None) are sent; payloads
+    are passed on as recorded.
+    """
+
+    def __init__(self, recording, publish, speed=1.0, start=0.0, end=None, loops=1, topics=None, qos=None,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.recording = recording
+        self.publish = publish
+        self.speed = speed
+        self.first = recording.find(start)
+        self.last = recording.find(end) if end is not None else len(recording)
+        self.loops = loops
+        self.topics = {topic.encode() for topic in topics} if topics is not None else None
+        self.qos = qos
+        self.clock = clock
+        self.sleep = sleep
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        sent = 0
+        size = 0
+        behind = 0.0
+        loop = 0
+        begin = self.clock()
+        while (self.loops == 0 or loop < self.loops) and self.first < self.last and not self.stopped.is_set():
+            loop_start = self.clock()
+            base = int(self.recording.times[self.first])
+            for index in range(self.first, self.last):
+                if self.stopped.is_set():
+                    break
+                offset, topic, payload, qos, retain = self.recording.record(index)
+                if self.topics is not None and topic not in self.topics:
+                    continue
+                if self.speed > 0:
+                    # Scheduled against the loop start, so sleep overshoot does not accumulate
+                    due = loop_start + max(0, offset - base) / 1e9 / self.speed
+                    delay = due - self.clock()
+                    if delay > 0:
+                        self.sleep(delay)
+                    else:
+                        behind = max(behind, -delay)
+                self.publish(topic.decode(), payload, self.qos if self.qos is not None else qos, retain)
+                sent += 1
+                size += len(payload)
+            loop += 1
+        seconds = self.clock() - begin
+        return {"messages": sent, "bytes": size, "loops": loop, "seconds": round(seconds, 3),
+                "rate": round(sent / seconds, 1) if seconds else 0.0, "max_behind_ms": round(behind * 1000, 2)}
+
+class MqttPublisher:
+    """Publishes replayed messages, keeping at most `window` QoS 1 messages unacknowledged."""
+
+    def __init__(self, window=1000):
+        load_dotenv()
+        self.client = mqtt.Client(client_id=f"Replayer-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self.client.max_inflight_messages_set(window)
+        self.window = window
+        self.pending = deque()
+        self.client.connect(os.getenv("MQTT_BROKER", "localhost"), int(os.getenv("MQTT_PORT", 1883)), keepalive=60)
+        self.client.loop_start()
+
+    def __call__(self, topic, payload, qos, retain):
+        info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if qos > 0:
+            self.pending.append(info)
+            if len(self.pending) >= self.window:
+                self.pending.popleft().wait_for_publish(timeout=30)
+
+    def close(self):
+        for info in self.pending:
+            info.wait_for_publish(timeout=30)
+        self.client.loop_stop()
+        self.client.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record KYC traffic to a file and replay it")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Append kyc/card_data (and optionally kyc/result) to a traffic log")
+    record.add_argument("--output", default="data/traffic.kyc", help="Traffic log to append to")
+    record.add_argument("--results", action="store_true", help="Record kyc/result as well")
+    replay = commands.add_parser("replay", help="Republish a traffic log")
+    replay.add_argument("path", help="Traffic log to replay")
+    replay.add_argument("--speed", type=float, default=1.0, help="1 = original timing, N = N times faster, 0 = full throttle")
+    replay.add_argument("--start", type=float, default=0.0, help="Seconds into the recording to start from")
+    replay.add_argument("--end", type=float, default=None, help="Seconds into the recording to stop at")
+    replay.add_argument("--loops", type=int, default=1, help="Times to replay (0 = until Ctrl+C)")
+    replay.add_argument("--topics", default="kyc/card_data,kyc/card_data/bin",
+                        help="Comma-separated topics to replay ('' = every recorded topic)")
+    replay.add_argument("--qos", type=int, default=None, choices=(0, 1), help="Override the recorded QoS")
+    args = parser.parse_args()
+    configure("data/recorder.log")
+    if args.command == "record":
+        recorder = Recorder(args.output, results=args.results)
+        metrics_server = serve_from_env("RECORDER_METRICS_PORT")
+        recorder.start()
+        print(f"Recording {', '.join(recorder.topics)} to {args.output}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            recorder.close()
+            if metrics_server is not None:
+                metrics_server.shutdown()
+    else:
+        recording = Recording(args.path)
+        print(f"{args.path}: {len(recording)} messages over {recording.duration:.1f}s")
+        publisher = MqttPublisher()
+        replayer = Replayer(recording, publisher, speed=args.speed, start=args.start, end=args.end, loops=args.loops,
+                            topics=[topic for topic in args.topics.split(",") if topic] or None, qos=args.qos)
+        try:
+            summary = replayer.run()
+        except KeyboardInterrupt:
+            replayer.stop()
+            summary = None
+        publisher.close()
+        recording.close()
+        if summary is not None:
+            print(json.dumps(summary, indent=2))
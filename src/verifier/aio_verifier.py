@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from dotenv import load_dotenv
+from src.common.aio_mqtt import AsyncClient
+from src.common.binary import topics as binary_topics
+from src.common.dedup import cache_from_env, payload_key
+from src.common.logs import configure
+from src.common.metrics import quiet, serve_from_env
+from src.common.validation import Validator
+from src.verifier.result_writer import writer_from_env
+from src.verifier.verifier import DUPLICATES, ERRORS, MESSAGES, ResultBatch, result_message, verify_message
+
+class AsyncVerifier:
+    """asyncio variant of Verifier: same validation, counters, results window and CSV output.
+
+    Several instances can share one event loop (and one ResultWriter); with a
+    `share_group` each subscribes through `$share/<group>/<topic>` so the broker
+    load-balances cards between them.
+    """
+
+    def __init__(self, client_id=None, topics=binary_topics("kyc/card_data"), share_group=None, writer=None,
+                 max_inflight=1000):
+        load_dotenv()
+        self.broker = os.getenv("MQTT_BROKER", "localhost")
+        self.port = int(os.getenv("MQTT_PORT", 1883))
+        self.qos = int(os.getenv("MQTT_QOS", 1))
+        self.client_id = client_id or f"AsyncVerifier-{uuid.uuid4().hex[:8]}"
+        self.topics = [f"$share/{share_group}/{topic}" if share_group else topic for topic in topics]
+        self.mqtt = AsyncClient(self.client_id, self.broker, self.port, max_inflight=max_inflight)
+        self.validations = {"total": 0, "approved": 0, "rejected": 0}
+        self.validator = Validator()
+        self.dedup = cache_from_env()
+        self.quiet = quiet()
+        self.results = deque(maxlen=int(os.getenv("VERIFIER_RESULTS_WINDOW", 1000)))
+        self.owns_writer = writer is None
+        self.writer = writer or writer_from_env()
+        # Bounds publishes waiting for PUBACK so a slow broker slows consumption instead of growing memory
+        self.inflight = asyncio.Semaphore(max_inflight)
+
+    async def start(self):
+        await self.mqtt.connect()
+        for topic in self.topics:
+            await self.mqtt.subscribe(topic, qos=self.qos)
+            logging.info(f"{self.client_id} subscribed to {topic}")
+
+    async def run(self):
+        async for msg in self.mqtt.messages():
+            MESSAGES.inc()
+            if self.dedup is not None and self.dedup.seen(payload_key(msg.payload)):
+                DUPLICATES.inc()
+                continue
+            try:
+                await self.handle_result(self.process_payload(msg.payload))
+            except Exception as e:
+                ERRORS.inc()
+                logging.error(f"Message processing error: {e}")
+
+    def process_payload(self, payload):
+        return verify_message(payload, self.validator)
+
+    async def publish(self, topic, payload):
+        await self.inflight.acquire()
+        try:
+            future = self.mqtt.publish_nowait(topic, payload, qos=self.qos)
+        except Exception:
+            self.inflight.release()
+            raise
+        future.add_done_callback(lambda f: self.inflight.release())
+
+    async def handle_result(self, result):
+        results = result.results if isinstance(result, ResultBatch) else [result]
+        for item in results:
+            self.validations["total"] += 1
+            self.validations[item["status"]] += 1
+            self.writer.write(item)
+        self.results.extend(results)
+        if isinstance(result, ResultBatch) and result.batch_id is not None:
+            await self.publish(*result_message(result.results, result.batch_id, result.compressed, result.binary))
+            if not self.quiet:
+                logging.info("Verified batch %s: %d cards", result.batch_id, len(results),
+                             extra={"batch_id": result.batch_id, "stats": dict(self.validations)})
+        else:
+            binary = isinstance(result, ResultBatch)
+            result = results[0]
+            await self.publish(*result_message(results, binary=binary))
+            if not self.quiet:
+                logging.info("Verified %s", result["id"],
+                             extra={"result": result, "stats": dict(self.validations), "sample": result["status"]})
+
+    async def close(self):
+        await self.mqtt.disconnect()
+        if self.owns_writer:
+            self.writer.close()
+        logging.info(f"{self.client_id} closed: {self.validations}")
+
+async def serve(instances=1, share_group=None):
+    # All instances share one loop and one CSV writer; the broker splits traffic when share_group is set
+    writer = writer_from_env()
+    verifiers = [AsyncVerifier(share_group=share_group, writer=writer) for _ in range(instances)]
+    for verifier in verifiers:
+        await verifier.start()
+    metrics_server = serve_from_env("VERIFIER_METRICS_PORT")
+    print(f"Running {instances} async verifier(s)" + (f" in share group '{share_group}'" if share_group else ""))
+    try:
+        await asyncio.gather(*(verifier.run() for verifier in verifiers))
+    finally:
+        for verifier in verifiers:
+            await verifier.close()
+        writer.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio KYC Verifier")
+    parser.add_argument("--instances", type=int, default=1, help="Verifier instances on this event loop")
+    parser.add_argument("--share-group", default=None, help="Use $share/<group>/ subscriptions to load-balance instances")
+    args = parser.parse_args()
+    configure("data/verifier.log")
+    try:
+        asyncio.run(serve(args.instances, args.share_group))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,239 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from json.encoder import encode_basestring_ascii
+import numpy as np
+import pandas as pd
+from src.common.logs import configure
+from src.common.validation import RULES, check_expiry, check_name, parse_expiry, today
+from src.verifier.result_writer import FIELDNAMES
+
+CARD_FIELDS = ("id", "name", "expiry", "region", "card_type", "msg_id")
+# Whitespace between two non-whitespace characters is exactly `len(name.split()) >= 2`
+TWO_WORDS = re.compile(r"\S\s+\S")
+
+def present(frame, field):
+    # A missing column or a NULL is a card without that key
+    if field not in frame:
+        return np.zeros(len(frame), dtype=bool)
+    return frame[field].notna().to_numpy()
+
+def strings(frame, field):
+    """The column as an object Series plus a mask of the rows holding a str."""
+    if field not in frame:
+        return pd.Series([None] * len(frame), index=frame.index, dtype=object), np.zeros(len(frame), dtype=bool)
+    column = frame[field].astype(object)
+    if pd.api.types.infer_dtype(column, skipna=False) == "string":
+        return column, np.ones(len(column), dtype=bool)
+    return column, np.fromiter((type(value) is str for value in column), dtype=bool, count=len(column))
+
+def map_bool(function, values):
+    # map() keeps the loop in C; the regex match objects are turned into bools on the way
+    return np.fromiter(map(bool, map(function, values)), dtype=bool, count=len(values))
+
+def check_expiry_column(frame, field="expiry"):
+    # Expiry dates repeat a lot: each distinct value goes through the online parser once
+    column, is_str = strings(frame, field)
+    codes, uniques = pd.factorize(column.where(is_str, None))
+    current = today.get()
+    verdicts = np.empty(len(uniques) + 1, dtype=np.int8)
+    for i, value in enumerate(uniques):
+        try:
+            verdicts[i] = parse_expiry(value) > current
+        except (TypeError, ValueError):
+            verdicts[i] = -1
+    # Code -1 (no str value) picks the last slot
+    verdicts[-1] = -1
+    verdict = verdicts[codes]
+    return verdict == 1, verdict < 0
+
+def check_name_column(frame, field="name"):
+    # Names repeat too, so each distinct one is checked once
+    column, is_str = strings(frame, field)
+    codes, uniques = pd.factorize(column.where(is_str, ""))
+    uniques = uniques.tolist()
+    ok = (np.fromiter(map(len, uniques), dtype=np.int64, count=len(uniques)) >= 3) & map_bool(TWO_WORDS.search, uniques)
+    return ok[codes] & is_str, ~is_str
+
+def check_rule(rule, frame):
+    """Evaluate one rule over a frame: (passed, malformed) boolean arrays.
+
+    A row is malformed where the online validator would raise for that card
+    (missing key, wrong type, unparseable date); the Verifier skips such cards.
+    """
+    if rule.allowed is not None:
+        if rule.field not in frame:
+            return np.zeros(len(frame), dtype=bool), np.zeros(len(frame), dtype=bool)
+        return frame[rule.field].isin(rule.allowed).to_numpy(), np.zeros(len(frame), dtype=bool)
+    if rule.pattern is not None:
+        column, is_str = strings(frame, rule.field)
+        matched = map_bool(rule.pattern.match, column.where(is_str, "").tolist())
+        return matched & is_str, ~is_str
+    if rule.check is check_expiry:
+        return check_expiry_column(frame)
+    if rule.check is check_name:
+        return check_name_column(frame)
+    # Custom rules have no column form: call them on each card
+    passed = np.zeros(len(frame), dtype=bool)
+    malformed = np.zeros(len(frame), dtype=bool)
+    for i, card in enumerate(records(frame)):
+        try:
+            passed[i] = rule.check(card)
+        except Exception:
+            malformed[i] = True
+    return passed, malformed
+
+def records(frame):
+    columns = [field for field in frame.columns]
+    for row in frame.itertuples(index=False, name=None):
+        yield {field: value for field, value in zip(columns, row) if value is not None and value == value}
+
+def verify_frame(frame, rules=RULES):
+    """Verify every card in a DataFrame; returns (verdicts, malformed count).
+
+    `verdicts` holds the rows the online verifier would answer, with the
+    columns of a kyc/result message plus `mask`, the failed rules as bits.
+    """
+    frame = frame.reset_index(drop=True)
+    mask = np.zeros(len(frame), dtype=np.int64)
+    malformed = ~present(frame, "id")
+    for bit, rule in enumerate(rules):
+        passed, bad = check_rule(rule, frame)
+        mask |= (~passed).astype(np.int64) << bit
+        malformed |= bad
+    keep = ~malformed
+    verdicts = pd.DataFrame({"id": frame["id"].to_numpy()[keep] if "id" in frame else [], "mask": mask[keep]})
+    for field in ("card_type", "region"):
+        if field in frame:
+            verdicts[field] = frame[field].astype(object).where(present(frame, field), "Unknown").to_numpy()[keep]
+        else:
+            verdicts[field] = "Unknown"
+    if "msg_id" in frame:
+        verdicts["msg_id"] = frame["msg_id"].astype(object).where(present(frame, "msg_id"), None).to_numpy()[keep]
+    return verdicts, int(malformed.sum())
+
+def reason_lists(masks, rules=RULES):
+    # Rules append their reason in table order, so the failed bits give the reasons list
+    return {int(mask): [rule.reason for bit, rule in enumerate(rules) if int(mask) >> bit & 1] for mask in np.unique(masks)}
+
+def dumps(value):
+    return encode_basestring_ascii(value) if type(value) is str else json.dumps(value)
+
+def to_ndjson(verdicts, timestamp, rules=RULES):
+    """One line per verdict, byte for byte what the Verifier publishes for the card on kyc/result."""
+    reasons = {mask: json.dumps(names) for mask, names in reason_lists(verdicts["mask"], rules).items()}
+    statuses = {mask: '"rejected"' if mask else '"approved"' for mask in reasons}
+    stamp = encode_basestring_ascii(timestamp)
+    # card_type and region take a handful of values: encode each distinct one once
+    enums = {field: {value: dumps(value) for value in verdicts[field].unique()} for field in ("card_type", "region")}
+    card_types, regions = enums["card_type"], enums["region"]
+    msg_ids = verdicts["msg_id"].tolist() if "msg_id" in verdicts else [None] * len(verdicts)
+    lines = []
+    for card_id, mask, card_type, region, msg_id in zip(verdicts["id"].tolist(), verdicts["mask"].tolist(),
+                                                          verdicts["card_type"].tolist(), verdicts["region"].tolist(),
+                                                          msg_ids):
+        line = (f'{{"id": {dumps(card_id)}, "status": {statuses[mask]}, "reasons": {reasons[mask]}, '
+                f'"timestamp": {stamp}, "card_type": {card_types[card_type]}, "region": {regions[region]}')
+        lines.append(line + (f', "msg_id": {dumps(msg_id)}}}\n' if msg_id is not None else "}\n"))
+    return "".join(lines)
+
+def to_csv(verdicts, timestamp, rules=RULES):
+    """Rows in the layout of verifier_results.csv (no header)."""
+    reasons = {mask: str(names) for mask, names in reason_lists(verdicts["mask"], rules).items()}
+    out = io.StringIO()
+    csv.writer(out).writerows(
+        (card_id, "rejected" if mask else "approved", reasons[mask], timestamp, card_type, region)
+        for card_id, mask, card_type, region in zip(verdicts["id"].tolist(), verdicts["mask"].tolist(),
+                                                    verdicts["card_type"].tolist(), verdicts["region"].tolist()))
+    return out.getvalue()
+
+FORMATS = {"ndjson": to_ndjson, "csv": to_csv}
+
+def verify_chunk(frame, output_format="ndjson"):
+    # Module-level so process pools can pickle it; returns (text, verified, approved, malformed)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    verdicts, malformed = verify_frame(frame)
+    text = FORMATS[output_format](verdicts, timestamp)
+    return text, len(verdicts), int((verdicts["mask"] == 0).sum()), malformed
+
+def read_chunks(path, chunk_size=100000, table="cards", query=None):
+    """Stream cards from a CSV file or a SQLite database as DataFrames of at most `chunk_size` rows."""
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            if query is None:
+                columns = table_columns(conn, table)
+                selected = ", ".join(f'"{field}"' for field in CARD_FIELDS if field in columns)
+                query = f'SELECT {selected} FROM "{table}"'
+            yield from pd.read_sql_query(query, conn, chunksize=chunk_size, coerce_float=False)
+        finally:
+            conn.close()
+        return
+    # Every CSV field is kept as the exact text; an empty field is an empty string, as the Card Client wrote it
+    yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_filter=False,
+                           usecols=lambda column: column in CARD_FIELDS)
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+def run(source, output, output_format="ndjson", chunk_size=100000, workers=None, table="cards", query=None):
+    """Verify every card in `source` and write the verdicts to `output`; returns a summary dict."""
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    totals = {"verified": 0, "approved": 0, "rejected": 0, "malformed": 0}
+    chunks = read_chunks(source, chunk_size, table, query)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", newline="") as out:
+        if output_format == "csv":
+            csv.writer(out).writerow(FIELDNAMES)
+        for text, verified, approved, malformed in verify_chunks(chunks, output_format, workers):
+            out.write(text)
+            totals["verified"] += verified
+            totals["approved"] += approved
+            totals["rejected"] += verified - approved
+            totals["malformed"] += malformed
+    seconds = time.perf_counter() - start
+    totals["seconds"] = round(seconds, 3)
+    totals["cards_per_sec"] = round((totals["verified"] + totals["malformed"]) / seconds, 1) if seconds else 0.0
+    if totals["malformed"]:
+        logging.warning(f"Skipped {totals['malformed']} malformed cards in {source}")
+    logging.info(f"Bulk verification of {source} into {output}: {totals}")
+    return totals
+
+def verify_chunks(chunks, output_format, workers):
+    # Chunks are verified in worker processes and written in input order; at most two per worker are in flight
+    if workers <= 1:
+        for frame in chunks:
+            yield verify_chunk(frame, output_format)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for frame in chunks:
+            pending.append(pool.submit(verify_chunk, frame, output_format))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-verify a backlog of cards offline with the Verifier's rules")
+    parser.add_argument("source", help="Cards as CSV (e.g. data/card_metrics.csv) or a SQLite database (.db)")
+    parser.add_argument("--output", default="data/bulk_results.ndjson", help="Where to write the verdicts")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson",
+                        help="ndjson: kyc/result messages, one per line; csv: the verifier_results.csv layout")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Cards per chunk")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--table", default="cards", help="SQLite table holding the cards")
+    parser.add_argument("--query", default=None, help="SQLite query returning card columns (overrides --table)")
+    args = parser.parse_args()
+    configure("data/verifier.log")
+    summary = run(args.source, args.output, args.format, args.chunk_size, args.workers or None, args.table, args.query)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BACKPRESSURE_POLICIES = ("block", "drop_newest", "drop_oldest")
+# Payloads per pool task when none is given: one pickle round trip per chunk, not per payload, for processes
+DEFAULT_CHUNK_SIZE = {"thread": 1, "process": 32}
+_STOP = object()
+
+def process_chunk(process, payloads):
+    # Runs in the pool; a failing payload only fails its own slot of the chunk
+    outcomes = []
+    for payload in payloads:
+        try:
+            outcomes.append((True, process(payload)))
+        except Exception as e:
+            outcomes.append((False, e))
+    return outcomes
+
+class VerificationPipeline:
+    """Moves verification work off the MQTT network thread.
+
+    `submit()` only enqueues the raw payload on a bounded queue. A dispatcher
+    thread hands payloads to a thread or process pool running `process`, and
+    a single emitter thread passes each finished result to `emit`, either in
+    arrival order (`ordered=True`) or as soon as it completes. When the queue
+    is full, `backpressure` decides whether the caller blocks or a payload
+    is dropped.
+
+    The dispatcher hands the pool up to `chunk_size` payloads per task,
+    taking only what is already queued, so a quiet pipeline never waits to
+    fill a chunk. `initializer(*initargs)` runs once in every worker.
+    """
+
+    def __init__(self, process, emit, workers=4, mode="thread", ordered=True, queue_size=1000,
+                 backpressure="block", chunk_size=None, initializer=None, initargs=()):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown pool mode: {mode}")
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.process = process
+        self.emit = emit
+        self.ordered = ordered
+        self.backpressure = backpressure
+        self.chunk_size = max(1, chunk_size or DEFAULT_CHUNK_SIZE[mode])
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.done = queue.Queue()
+        # Caps chunks handed to the pool but not yet emitted, so the pool never holds the whole backlog
+        self.in_flight = threading.BoundedSemaphore(workers * 4)
+        pool = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+        self.executor = pool(max_workers=workers, initializer=initializer, initargs=initargs)
+        self.lock = threading.Lock()
+        # Held by submit() and close(): nothing is queued behind the stop marker, and drop_oldest never evicts it
+        self.submit_lock = threading.Lock()
+        self.counters = {"submitted": 0, "dropped": 0, "processed": 0, "errors": 0}
+        self.closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="PipelineDispatch", daemon=True)
+        self._emitter = threading.Thread(target=self._drain, name="PipelineEmit", daemon=True)
+        self._dispatcher.start()
+        self._emitter.start()
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counters[key] += n
+
+    def stats(self):
+        with self.lock:
+            snapshot = dict(self.counters)
+        snapshot["queue_depth"] = self.inbox.qsize()
+        return snapshot
+
+    def submit(self, payload):
+        with self.submit_lock:
+            if self.closed:
+                raise RuntimeError("Pipeline is closed")
+            if self.backpressure == "block":
+                self.inbox.put(payload)
+            elif self.backpressure == "drop_newest":
+                try:
+                    self.inbox.put_nowait(payload)
+                except queue.Full:
+                    self._count("dropped")
+                    return False
+            else:
+                while True:
+                    try:
+                        self.inbox.put_nowait(payload)
+                        break
+                    except queue.Full:
+                        try:
+                            self.inbox.get_nowait()
+                            self._count("dropped")
+                        except queue.Empty:
+                            pass
+        self._count("submitted")
+        return True
+
+    def _next_chunk(self):
+        # Blocks for the first payload only; returns (chunk, stop)
+        payload = self.inbox.get()
+        if payload is _STOP:
+            return [], True
+        chunk = [payload]
+        while len(chunk) < self.chunk_size:
+            try:
+                payload = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if payload is _STOP:
+                return chunk, True
+            chunk.append(payload)
+        return chunk, False
+
+    def _dispatch(self):
+        stop = False
+        while not stop:
+            chunk, stop = self._next_chunk()
+            if not chunk:
+                continue
+            self.in_flight.acquire()
+            future = self.executor.submit(process_chunk, self.process, chunk)
+            if self.ordered:
+                self.done.put((future, len(chunk)))
+            else:
+                future.add_done_callback(lambda future, size=len(chunk): self.done.put((future, size)))
+        # Every future is queued (ordered) or has fired its callback (unordered) once the pool shuts down
+        self.executor.shutdown(wait=True)
+        self.done.put(_STOP)
+
+    def _drain(self):
+        while True:
+            item = self.done.get()
+            if item is _STOP:
+                break
+            future, size = item
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                # The whole task failed, e.g. a worker process died or the chunk did not pickle
+                outcomes = [(False, e)] * size
+            try:
+                for ok, value in outcomes:
+                    try:
+                        if not ok:
+                            raise value
+                        if value is not None:
+                            self.emit(value)
+                        self._count("processed")
+                    except Exception as e:
+                        self._count("errors")
+                        logging.error(f"Pipeline processing error: {e}")
+            finally:
+                self.in_flight.release()
+
+    def close(self, timeout=None):
+        with self.submit_lock:
+            if self.closed:
+                return
+            self.closed = True
+            # The dispatcher keeps draining, so this put waits at most for one free slot
+            self.inbox.put(_STOP)
+        self._dispatcher.join(timeout)
+        self._emitter.join(timeout)
+        logging.info(f"Pipeline closed: {self.stats()}")
@@ -0,0 +1,127 @@
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+FIELDNAMES = ["id", "status", "reasons", "timestamp", "card_type", "region"]
+
+class ResultWriter:
+    """Append-only CSV writer for verification results.
+
+    Rows are buffered and flushed every `flush_rows` rows or `flush_ms`
+    milliseconds, whichever comes first. The active file is rotated once it
+    grows past `max_bytes` or is older than `rotate_seconds` (0 disables
+    either trigger), so the cost of a write never depends on how many
+    results came before it.
+    """
+
+    def __init__(self, path="data/verifier_results.csv", flush_rows=100, flush_ms=1000,
+                 max_bytes=50 * 1024 * 1024, rotate_seconds=0):
+        self.path = path
+        self.flush_rows = max(1, flush_rows)
+        self.flush_ms = flush_ms
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.buffer = []
+        self.rows_written = 0
+        self.lock = threading.Lock()
+        self.file = None
+        self.writer = None
+        self.opened_at = 0.0
+        self.last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._open()
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_ms > 0:
+            self._timer = threading.Thread(target=self._flush_loop, name="ResultWriter", daemon=True)
+            self._timer.start()
+
+    def _open(self):
+        self.file = open(self.path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDNAMES, extrasaction="ignore")
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+        self.opened_at = time.monotonic()
+
+    def _rotated_path(self):
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        candidate = f"{root}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(candidate):
+            candidate = f"{root}.{stamp}.{n}{ext}"
+            n += 1
+        return candidate
+
+    def _should_rotate(self):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        if self.rotate_seconds and time.monotonic() - self.opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    def _rotate(self):
+        self.file.close()
+        target = self._rotated_path()
+        os.replace(self.path, target)
+        logging.info(f"Rotated verification results to {target}")
+        self._open()
+
+    def _flush_locked(self):
+        if self.buffer:
+            self.writer.writerows(self.buffer)
+            self.rows_written += len(self.buffer)
+            self.buffer.clear()
+            self.file.flush()
+        self.last_flush = time.monotonic()
+        if self._should_rotate():
+            self._rotate()
+
+    def _flush_loop(self):
+        interval = self.flush_ms / 1000
+        while not self._stop.wait(interval):
+            with self.lock:
+                if self.file is None:
+                    return
+                if self.buffer and time.monotonic() - self.last_flush >= interval:
+                    self._flush_locked()
+                elif self.rotate_seconds and self._should_rotate():
+                    self._rotate()
+
+    def write(self, result):
+        with self.lock:
+            self.buffer.append(result)
+            if len(self.buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self._flush_locked()
+
+    def close(self):
+        self._stop.set()
+        with self.lock:
+            if self.file is None:
+                return
+            self._flush_locked()
+            self.file.close()
+            self.file = None
+        if self._timer is not None:
+            self._timer.join(timeout=1)
+
+def shard_path(instance_id, base=None):
+    root, ext = os.path.splitext(base or os.getenv("VERIFIER_RESULTS_PATH", "data/verifier_results.csv"))
+    return f"{root}.{instance_id}{ext}"
+
+def writer_from_env(path=None):
+    return ResultWriter(
+        path=path or os.getenv("VERIFIER_RESULTS_PATH", "data/verifier_results.csv"),
+        flush_rows=int(os.getenv("VERIFIER_FLUSH_ROWS", 100)),
+        flush_ms=int(os.getenv("VERIFIER_FLUSH_MS", 1000)),
+        max_bytes=int(float(os.getenv("VERIFIER_ROTATE_MB", 50)) * 1024 * 1024),
+        rotate_seconds=int(os.getenv("VERIFIER_ROTATE_SECONDS", 0))
+    )
@@ -0,0 +1,94 @@
+import argparse
+import csv
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+from src.verifier.result_writer import FIELDNAMES
+from src.verifier.verifier import STATS_TOPIC
+
+# Snapshots older than this many of their instance's publish intervals are ignored
+STALE_INTERVALS = 3
+DEFAULT_INTERVAL = 5.0
+
+def shard_files(base="data/verifier_results.csv"):
+    root, ext = os.path.splitext(base)
+    return sorted(path for path in glob.glob(f"{glob.escape(root)}.*{ext}") if os.path.abspath(path) != os.path.abspath(base))
+
+def merge_shards(paths, output):
+    # Each shard (and each rotated file) is already in timestamp order, so a streaming k-way merge suffices
+    files = [open(path, newline="") for path in paths]
+    try:
+        readers = [csv.DictReader(f) for f in files]
+        with open(output, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=FIELDNAMES, extrasaction="ignore")
+            writer.writeheader()
+            count = 0
+            for row in heapq.merge(*readers, key=lambda row: row["timestamp"]):
+                writer.writerow(row)
+                count += 1
+    finally:
+        for f in files:
+            f.close()
+    return count
+
+def aggregate_stats(snapshots, now=None, stale_intervals=STALE_INTERVALS):
+    # A snapshot not refreshed for a few publish intervals is left over from an instance that is gone
+    now = time.time() if now is None else now
+    live = {instance: snapshot for instance, snapshot in snapshots.items()
+            if now - snapshot.get("timestamp", 0) <= stale_intervals * snapshot.get("interval", DEFAULT_INTERVAL)}
+    totals = {"total": 0, "approved": 0, "rejected": 0}
+    for snapshot in live.values():
+        for key in totals:
+            totals[key] += snapshot["validations"].get(key, 0)
+    return {"instances": len(live), "validations": totals, "per_instance": live,
+            "stale": sorted(set(snapshots) - set(live))}
+
+def collect_stats(wait=2.0):
+    # Instances publish retained snapshots, so a short subscription sees every live (and last-seen) verifier
+    load_dotenv()
+    snapshots = {}
+    lock = threading.Lock()
+
+    def on_message(client, userdata, msg):
+        if not msg.payload:
+            # A cleared snapshot: the instance was closed or its last will fired
+            with lock:
+                snapshots.pop(msg.topic.rsplit("/", 1)[-1], None)
+            return
+        snapshot = json.loads(msg.payload)
+        with lock:
+            snapshots[snapshot["instance"]] = snapshot
+
+    client = mqtt.Client(client_id=f"ShardStats-{uuid.uuid4().hex[:8]}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.on_message = on_message
+    client.on_connect = lambda c, userdata, flags, rc, props: c.subscribe(f"{STATS_TOPIC}/+", qos=1)
+    client.connect(os.getenv("MQTT_BROKER", "localhost"), int(os.getenv("MQTT_PORT", 1883)), keepalive=60)
+    client.loop_start()
+    time.sleep(wait)
+    client.loop_stop()
+    client.disconnect()
+    with lock:
+        return aggregate_stats(dict(snapshots))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge verifier result shards and aggregate per-instance stats")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("merge", help="Merge per-instance CSV shards into one file ordered by timestamp")
+    merge.add_argument("--base", default=os.getenv("VERIFIER_RESULTS_PATH", "data/verifier_results.csv"),
+                       help="Base results path; shards are <base>.<instance>.csv")
+    merge.add_argument("--output", default="data/verifier_results.merged.csv", help="Merged CSV path")
+    stats = commands.add_parser("stats", help="Sum the stats every verifier instance publishes on kyc/metrics/verifier")
+    stats.add_argument("--wait", type=float, default=2.0, help="Seconds to listen for instance snapshots")
+    args = parser.parse_args()
+    if args.command == "merge":
+        paths = [path for path in shard_files(args.base) if os.path.abspath(path) != os.path.abspath(args.output)]
+        count = merge_shards(paths, args.output)
+        print(f"Merged {count} results from {len(paths)} shard(s) into {args.output}")
+    else:
+        print(json.dumps(collect_stats(args.wait), indent=2))
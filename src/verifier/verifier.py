@@ -1,98 +1,352 @@
 import paho.mqtt.client as mqtt
 import json
-import re
 import logging
 import os
-import csv
+import pickle
+import socket
+import threading
 import time
-from datetime import datetime
+from collections import deque, namedtuple
+from types import SimpleNamespace
 from dotenv import load_dotenv
+from src.common.batch import decode_message, encode_message
+from src.common.binary import BINARY_SUFFIX, RESULT, topics
+from src.common.dedup import cache_from_env, payload_key
+from src.common.logs import configure
+from src.common.metrics import REGISTRY, PublishTimer, quiet, serve_from_env
+from src.common.validation import RULES, Validator, default_validator
+from src.verifier.pipeline import VerificationPipeline
+from src.verifier.result_writer import shard_path, writer_from_env
+
+def verify_card(card, validator=default_validator):
+    reasons = validator.validate(card)
+    result = {
+        "id": card["id"],
+        "status": "rejected" if reasons else "approved",
+        "reasons": reasons,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "card_type": card.get("card_type", "Unknown"),
+        "region": card.get("region", "Unknown")
+    }
+    # The message id makes the result idempotent downstream; load-generator cards also carry their send time
+    # so end-to-end latency can be measured on kyc/result
+    if "msg_id" in card:
+        result["msg_id"] = card["msg_id"]
+    if "sent_ts" in card:
+        result["sent_ts"] = card["sent_ts"]
+    return result
+
+STATS_TOPIC = "kyc/metrics/verifier"
+
+MESSAGES = REGISTRY.counter("kyc_verifier_messages_total", "Messages received on kyc/card_data")
+ERRORS = REGISTRY.counter("kyc_verifier_errors_total", "Messages that could not be processed")
+DUPLICATES = REGISTRY.counter("kyc_verifier_duplicates_total", "Redelivered messages skipped by the dedup cache")
+RESULTS = REGISTRY.counter("kyc_verifier_results_total", "Cards verified", ("status",))
+DECODE_SECONDS = REGISTRY.histogram("kyc_verifier_decode_seconds", "Time to decode one card_data payload")
+VERIFY_SECONDS = REGISTRY.histogram("kyc_verifier_verify_seconds", "Time to validate the cards of one message")
+RULE_SECONDS = REGISTRY.histogram("kyc_verifier_rule_seconds", "Time per validation rule, sampled", ("rule",))
+PUBLISH_SECONDS = REGISTRY.histogram("kyc_verifier_publish_seconds", "From publishing a result to its PUBACK")
+QUEUE_DEPTH = REGISTRY.gauge("kyc_verifier_queue_depth", "Payloads waiting for a pipeline worker")
+
+# binary: the cards came in the binary encoding, so the results go back in it on kyc/result/bin.
+# A single binary card gives a ResultBatch with batch_id None.
+ResultBatch = namedtuple("ResultBatch", ["batch_id", "results", "compressed", "binary"], defaults=(False,))
+
+def result_message(results, batch_id=None, compressed=False, binary=False):
+    # Returns (topic, payload); results the binary layout cannot carry go out as JSON on kyc/result
+    payload, binary = encode_message(results, RESULT, batch_id, compressed, binary)
+    return ("kyc/result" + BINARY_SUFFIX if binary else "kyc/result"), payload
+
+def timed_verify(payload, validator):
+    """(result, decode seconds, verify seconds) of one card_data payload."""
+    start = time.perf_counter()
+    batch_id, cards, compressed, binary = decode_message(payload)
+    decoded = time.perf_counter()
+    if batch_id is None:
+        result = verify_card(cards[0], validator)
+        if binary:
+            result = ResultBatch(None, [result], compressed, True)
+    else:
+        results = []
+        for card in cards:
+            try:
+                results.append(verify_card(card, validator))
+            except Exception as e:
+                logging.error(f"Skipping malformed card in batch {batch_id}: {e}")
+        result = ResultBatch(batch_id, results, compressed, binary)
+    return result, decoded - start, time.perf_counter() - decoded
+
+def verify_message(payload, validator=default_validator):
+    result, decode_seconds, verify_seconds = timed_verify(payload, validator)
+    DECODE_SECONDS.observe(decode_seconds)
+    VERIFY_SECONDS.observe(verify_seconds)
+    return result
+
+# What a process worker sends back: the metrics of a child process never reach /metrics,
+# so its timings travel with the result and the Verifier records them
+WorkerResult = namedtuple("WorkerResult", ["result", "decode_seconds", "verify_seconds", "rule_seconds"])
+
+class RuleSamples:
+    """Stands in for RULE_SECONDS in a process worker, collecting (rule, seconds) until drained."""
 
-class Verifier:
     def __init__(self):
+        self.samples = []
+
+    def labels(self, rule):
+        return SimpleNamespace(observe=lambda seconds: self.samples.append((rule, seconds)))
+
+    def drain(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+# The rule table of a process pool worker and its rule timings, installed by init_worker
+_worker_validator = default_validator
+_worker_rule_samples = RuleSamples()
+
+def init_worker(rules, rule_sample=0):
+    # Process pool initializer: every worker rebuilds the parent's rule table, custom rules included
+    global _worker_validator
+    _worker_validator = Validator(rules)
+    if rule_sample > 0:
+        _worker_validator.instrument(_worker_rule_samples, rule_sample)
+
+def verify_payload(payload):
+    # Module-level so process pools can pickle it
+    result, decode_seconds, verify_seconds = timed_verify(payload, _worker_validator)
+    return WorkerResult(result, decode_seconds, verify_seconds, _worker_rule_samples.drain())
+
+class Verifier:
+    def __init__(self, rules=RULES):
         load_dotenv()
         self.broker = os.getenv("MQTT_BROKER", "localhost")
         self.port = int(os.getenv("MQTT_PORT", 1883))
         self.qos = int(os.getenv("MQTT_QOS", 1))
-        self.client = mqtt.Client(client_id="Verifier", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        # Every instance needs its own client id, otherwise a second verifier kicks the first off the broker
+        self.instance_id = os.getenv("VERIFIER_INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.share_group = os.getenv("VERIFIER_SHARE_GROUP")
+        # Cards arrive as JSON on kyc/card_data and in the binary encoding on kyc/card_data/bin
+        self.topics = [f"$share/{self.share_group}/{topic}" if self.share_group else topic
+                       for topic in topics("kyc/card_data")]
+        self.stats_interval = float(os.getenv("VERIFIER_STATS_INTERVAL", 5))
+        self.stats_topic = f"{STATS_TOPIC}/{self.instance_id}"
+        self.client = mqtt.Client(client_id=f"Verifier-{self.instance_id}", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        if self.stats_interval > 0:
+            # If the instance dies without close(), the broker clears its retained snapshot for it
+            self.client.will_set(self.stats_topic, b"", qos=self.qos, retain=True)
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
+        self.client.on_unsubscribe = self.on_unsubscribe
+        self._unsubscribed = threading.Event()
         self.setup_logging()
+        self.quiet = quiet()
         self.validations = {"total": 0, "approved": 0, "rejected": 0}
-        self.results = []
+        self.lock = threading.Lock()
+        self.validator = Validator(rules)
+        # Per-rule timings cost two perf_counter calls per rule, so only one card in VERIFIER_RULE_SAMPLE is timed
+        self.rule_sample = int(os.getenv("VERIFIER_RULE_SAMPLE", 100))
+        # The rule table process workers were started with; None with thread workers or no pool
+        self.worker_rules = None
+        # QoS 1 redeliveries are dropped by payload digest before they are decoded, verified or republished
+        self.dedup = cache_from_env()
+        # Only the most recent results are kept in memory; everything else lives in the CSV
+        self.results = deque(maxlen=int(os.getenv("VERIFIER_RESULTS_WINDOW", 1000)))
+        # Set up first: a rule table process workers cannot take fails here, before any file is opened
+        self.pipeline = self.setup_pipeline()
+        # In scale-out mode each instance appends to its own shard; merge them with src.verifier.shards
+        self.writer = writer_from_env(shard_path(self.instance_id) if self.share_group else None)
+        self.setup_metrics()
+        self._stop_stats = threading.Event()
+        self._stats_thread = None
         try:
             self.client.connect(self.broker, self.port, keepalive=60)
             self.client.loop_start()
-            logging.info("Verifier connected")
+            logging.info(f"Verifier {self.instance_id} connected")
         except Exception as e:
             logging.error(f"Connection failed: {e}")
             raise
 
     def setup_logging(self):
-        os.makedirs("data", exist_ok=True)
-        logging.basicConfig(filename="data/verifier.log", level=logging.INFO,
-                           format="%(asctime)s - %(levelname)s - %(message)s")
+        configure("data/verifier.log")
         logging.info("Verifier initialized")
 
+    def setup_pipeline(self):
+        # VERIFIER_WORKERS=0 (the default) keeps all processing inside the MQTT callback
+        workers = int(os.getenv("VERIFIER_WORKERS", 0))
+        if workers <= 0:
+            return None
+        mode = os.getenv("VERIFIER_POOL", "thread")
+        initargs = ()
+        if mode == "process":
+            # Workers get a copy of the rule table, so every check must pickle: lambdas and local functions cannot
+            self.worker_rules = self.validator.rules
+            try:
+                pickle.dumps(self.worker_rules)
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise ValueError(f"VERIFIER_POOL=process needs rules whose checks are module-level functions: {e}")
+            initargs = (self.worker_rules, self.rule_sample)
+        pipeline = VerificationPipeline(
+            process=verify_payload if mode == "process" else self.process_payload,
+            emit=self.handle_worker_result if mode == "process" else self.handle_result,
+            workers=workers,
+            mode=mode,
+            ordered=os.getenv("VERIFIER_ORDERED", "1") == "1",
+            queue_size=int(os.getenv("VERIFIER_QUEUE_SIZE", 1000)),
+            backpressure=os.getenv("VERIFIER_BACKPRESSURE", "block"),
+            chunk_size=int(os.getenv("VERIFIER_CHUNK_SIZE", 0)) or None,
+            initializer=init_worker if mode == "process" else None,
+            initargs=initargs
+        )
+        logging.info(f"Verification pipeline started: {workers} {mode} workers")
+        return pipeline
+
+    def setup_metrics(self):
+        if self.rule_sample > 0:
+            self.validator.instrument(RULE_SECONDS, self.rule_sample)
+        for status in ("approved", "rejected"):
+            RESULTS.labels(status).set_function(lambda status=status: self.validations[status])
+        QUEUE_DEPTH.set_function(self.pipeline.inbox.qsize if self.pipeline is not None else lambda: 0)
+        self.publish_timer = PublishTimer(PUBLISH_SECONDS)
+        self.client.on_publish = self.publish_timer.on_publish
+        self.metrics_server = serve_from_env("VERIFIER_METRICS_PORT")
+
+    def start_stats_publisher(self):
+        if self.stats_interval <= 0 or self._stats_thread is not None:
+            return
+        self._stats_thread = threading.Thread(target=self._stats_loop, name="VerifierStats", daemon=True)
+        self._stats_thread.start()
+
+    def _stats_loop(self):
+        while not self._stop_stats.wait(self.stats_interval):
+            self.publish_stats()
+
+    def publish_stats(self):
+        with self.lock:
+            stats = dict(self.validations)
+        message = {"instance": self.instance_id, "share_group": self.share_group, "validations": stats,
+                   "timestamp": time.time(), "interval": self.stats_interval}
+        # Retained, so an aggregator that starts late still sees every instance's latest numbers
+        return self.client.publish(self.stats_topic, json.dumps(message), qos=self.qos, retain=True)
+
+    def clear_stats(self):
+        # An empty retained payload deletes the snapshot, so a stopped instance drops out of `shards stats`
+        return self.client.publish(self.stats_topic, b"", qos=self.qos, retain=True)
+
     def on_connect(self, client, userdata, flags, reason_code, properties):
         print(f"Verifier connected with code {reason_code}")
-        client.subscribe("kyc/card_data", qos=self.qos)
-        logging.info("Subscribed to kyc/card_data")
+        client.subscribe([(topic, self.qos) for topic in self.topics])
+        logging.info(f"Subscribed to {', '.join(self.topics)}")
+        self.start_stats_publisher()
+
+    def on_unsubscribe(self, client, userdata, mid, reason_codes, properties):
+        self._unsubscribed.set()
+
+    def unsubscribe(self, timeout=5):
+        # The broker delivers everything it sent before the UNSUBACK ahead of it, and paho runs on_message
+        # in order, so once the ack arrives no further card can reach the pipeline
+        if not self.client.is_connected():
+            return
+        self._unsubscribed.clear()
+        result, mid = self.client.unsubscribe(self.topics)
+        if result != mqtt.MQTT_ERR_SUCCESS or not self._unsubscribed.wait(timeout):
+            logging.warning(f"No UNSUBACK for {', '.join(self.topics)}; closing the pipeline anyway")
 
     def on_message(self, client, userdata, msg):
+        MESSAGES.inc()
+        if self.pipeline is not None and self.pipeline.closed:
+            # Rejected before the dedup cache records it, so a redelivery is still verified
+            ERRORS.inc()
+            logging.warning("Message arrived after the pipeline closed; not verified")
+            return
+        if self.dedup is not None and self.dedup.seen(payload_key(msg.payload)):
+            DUPLICATES.inc()
+            return
         try:
-            card = json.loads(msg.payload.decode())
-            self.validations["total"] += 1
-            reasons = []
-            # ID validation
-            id_valid = bool(re.match(r"^\d{4}-\d{4}-\d{4}$|^\d{6}-\d{4}$", card["id"]))
-            if not id_valid:
-                reasons.append("Invalid ID format")
-            # Expiry validation
-            expiry_valid = datetime.strptime(card["expiry"], "%Y-%m-%d") >= datetime.now()
-            if not expiry_valid:
-                reasons.append("Card expired")
-            # Name validation
-            name_valid = len(card["name"].split()) >= 2 and len(card["name"]) >= 3
-            if not name_valid:
-                reasons.append("Invalid name")
-            # Region and type
-            region_valid = card.get("region") in ["US", "EU", "ASIA", "MEA"]
-            if not region_valid:
-                reasons.append("Invalid region")
-            type_valid = card.get("card_type") in ["Visa", "MasterCard", "Amex", "Discover"]
-            if not type_valid:
-                reasons.append("Invalid card type")
-            # Status
-            status = "approved" if id_valid and expiry_valid and name_valid and region_valid and type_valid else "rejected"
-            self.validations[status] += 1
-            result = {
-                "id": card["id"],
-                "status": status,
-                "reasons": reasons,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "card_type": card.get("card_type", "Unknown"),
-                "region": card.get("region", "Unknown")
-            }
-            self.results.append(result)
-            client.publish("kyc/result", json.dumps(result), qos=self.qos)
-            print(f"Verified: {result}")
-            logging.info(f"Verified: {result}, Stats: {self.validations}")
-            self.save_results()
+            if self.pipeline is not None:
+                if self.worker_rules is not None and self.validator.rules is not self.worker_rules:
+                    raise RuntimeError("Rules changed after the process workers started; pass them to Verifier(rules=...)")
+                self.pipeline.submit(msg.payload)
+            else:
+                self.handle_result(self.process_payload(msg.payload))
         except Exception as e:
+            ERRORS.inc()
             logging.error(f"Message processing error: {e}")
 
+    def process_payload(self, payload):
+        return verify_message(payload, self.validator)
+
+    def handle_worker_result(self, worker_result):
+        DECODE_SECONDS.observe(worker_result.decode_seconds)
+        VERIFY_SECONDS.observe(worker_result.verify_seconds)
+        for rule, seconds in worker_result.rule_seconds:
+            RULE_SECONDS.labels(rule).observe(seconds)
+        self.handle_result(worker_result.result)
+
+    def handle_result(self, result):
+        binary = False
+        if isinstance(result, ResultBatch):
+            if result.batch_id is not None:
+                self.handle_batch(result)
+                return
+            result, binary = result.results[0], True
+        with self.lock:
+            self.validations["total"] += 1
+            self.validations[result["status"]] += 1
+            stats = dict(self.validations)
+        self.results.append(result)
+        start = time.perf_counter()
+        topic, payload = result_message([result], binary=binary)
+        self.publish_timer.track(self.client.publish(topic, payload, qos=self.qos), start)
+        if not self.quiet:
+            print(f"Verified: {result}")
+            # Formatted on the log listener thread; approvals can be sampled with LOG_SAMPLE_APPROVED
+            logging.info("Verified %s", result["id"], extra={"result": result, "stats": stats, "sample": result["status"]})
+        self.writer.write(result)
+
+    def handle_batch(self, batch):
+        approved = sum(1 for result in batch.results if result["status"] == "approved")
+        with self.lock:
+            self.validations["total"] += len(batch.results)
+            self.validations["approved"] += approved
+            self.validations["rejected"] += len(batch.results) - approved
+            stats = dict(self.validations)
+        self.results.extend(batch.results)
+        # A batch is answered with one batched result message under the same batch id
+        start = time.perf_counter()
+        topic, payload = result_message(batch.results, batch.batch_id, batch.compressed, batch.binary)
+        self.publish_timer.track(self.client.publish(topic, payload, qos=self.qos), start)
+        if not self.quiet:
+            print(f"Verified batch {batch.batch_id}: {len(batch.results)} cards, {approved} approved")
+            logging.info("Verified batch %s: %d cards", batch.batch_id, len(batch.results),
+                         extra={"batch_id": batch.batch_id, "approved": approved, "stats": stats})
+        for result in batch.results:
+            self.writer.write(result)
+
     def save_results(self):
-        with open("data/verifier_results.csv", "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "status", "reasons", "timestamp", "card_type", "region"])
-            writer.writeheader()
-            writer.writerows(self.results)
+        self.writer.flush()
         logging.info("Saved verification results")
 
     def close(self):
-        self.client.loop_stop()
-        self.client.disconnect()
-        logging.info(f"Verifier closed: {self.validations}")
+        try:
+            # Drain the pipeline while the network loop is still running so queued results get published,
+            # but only after unsubscribing: a card accepted during the drain would be acked and then lost
+            if self.pipeline is not None:
+                self.unsubscribe()
+                self.pipeline.close()
+            self._stop_stats.set()
+            if self.stats_interval > 0 and self.client.is_connected():
+                try:
+                    self.clear_stats().wait_for_publish(timeout=1)
+                except (RuntimeError, ValueError) as e:
+                    # paho refuses to wait once the connection is gone; the shutdown must go on regardless
+                    logging.warning(f"Stats snapshot not cleared: {e}")
+        finally:
+            # Disconnecting first wakes the network thread, so loop_stop() does not wait out its select timeout
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.writer.close()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+            logging.info(f"Verifier closed: {self.validations}")
 
 if __name__ == "__main__":
     try:
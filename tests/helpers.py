@@ -0,0 +1,22 @@
+# Fixtures shared by the test modules
+
+def make_result(i, status="approved", timestamp="2025-04-15 01:40:05", card_type="Visa", region="US", **extra):
+    """A result as the Verifier publishes it; rejections carry "Card expired", `extra` adds fields such as msg_id."""
+    result = {"id": f"1234-5678-{i:04d}", "status": status, "reasons": [] if status == "approved" else ["Card expired"],
+              "timestamp": timestamp, "card_type": card_type, "region": region}
+    result.update(extra)
+    return result
+
+class FakeClock:
+    """A clock that only moves when told to: `now` is read by calling it and advanced by `sleep`."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.broker import Broker
+from src.common.aio_mqtt import AsyncClient
+from src.verifier.aio_verifier import AsyncVerifier
+from src.verifier.result_writer import ResultWriter
+
+async def next_message(client, timeout=5):
+    return await asyncio.wait_for(client.messages().__anext__(), timeout)
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.broker = Broker()
+        self.port = self.broker.start()
+
+    def tearDown(self):
+        self.broker.stop()
+
+    async def connected_client(self, **options):
+        client = AsyncClient("aio-test", "127.0.0.1", self.port, reconnect_delay=0.05, **options)
+        await client.connect()
+        self.addAsyncCleanup(client.disconnect)
+        await client.subscribe("kyc/test", qos=1)
+        return client
+
+    async def wait_for(self, condition, timeout=5):
+        for _ in range(int(timeout / 0.02)):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+        self.fail("Timed out")
+
+    async def test_round_trip(self):
+        client = await self.connected_client()
+        await client.publish("kyc/test", b"hello", qos=1)
+        msg = await next_message(client)
+        self.assertEqual((msg.topic, msg.payload), ("kyc/test", b"hello"))
+
+    async def test_reconnects_and_resubscribes_after_broker_restart(self):
+        client = await self.connected_client()
+        self.broker.stop()
+        await self.wait_for(lambda: client.reconnect_task is not None)
+        self.broker = Broker(port=self.port)
+        self.broker.start()
+        await self.wait_for(lambda: client.reconnect_task.done())
+        # The subscription is restored on the new broker, so a fresh publish comes back
+        await asyncio.wait_for(client.publish("kyc/test", b"after restart", qos=1), 5)
+        msg = await next_message(client)
+        self.assertEqual(msg.payload, b"after restart")
+
+    async def test_without_reconnect_the_iterator_raises(self):
+        client = await self.connected_client(reconnect=False)
+        self.broker.stop()
+        with self.assertRaises(ConnectionError):
+            await next_message(client)
+
+    async def test_async_verifier_answers_a_card(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch.dict(os.environ, {"MQTT_BROKER": "127.0.0.1", "MQTT_PORT": str(self.port)}):
+            verifier = AsyncVerifier(writer=ResultWriter(os.path.join(tmp.name, "results.csv")))
+        await verifier.start()
+        task = asyncio.create_task(verifier.run())
+        self.addAsyncCleanup(verifier.close)
+        self.addCleanup(task.cancel)
+        client = AsyncClient("aio-card-client", "127.0.0.1", self.port)
+        await client.connect()
+        self.addAsyncCleanup(client.disconnect)
+        await client.subscribe("kyc/result", qos=1)
+        card = {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-01-01", "region": "US", "card_type": "Visa"}
+        await client.publish("kyc/card_data", json.dumps(card).encode(), qos=1)
+        result = json.loads((await next_message(client)).payload)
+        self.assertEqual((result["id"], result["status"]), ("1234-5678-9012", "approved"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+from helpers import make_result
+from src.analyst import archive as archive_module
+from src.analyst.analyst import init_db, read_aggregates, read_range
+from src.analyst.archive import archive, partitions, query
+from src.analyst.db_writer import DBWriter
+
+def on_day(i, day, status="approved"):
+    return make_result(i, status, f"2025-04-{day:02d} 10:00:{i % 60:02d}")
+
+def epoch(day):
+    return int(time.mktime(time.strptime(f"2025-04-{day:02d}", "%Y-%m-%d")))
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "kyc_results.db")
+        self.archive_dir = os.path.join(self.tmp.name, "archive")
+        init_db(self.db_path)
+        writer = DBWriter(self.db_path)
+        writer.put_many([on_day(i, 14) for i in range(5)] + [on_day(i, 15, "rejected") for i in range(3)]
+                        + [on_day(i, 16) for i in range(2)])
+        writer.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def hot_count(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def test_archive_prunes_hot_table(self):
+        count, parts = archive(self.db_path, epoch(16), self.archive_dir)
+        self.assertEqual((count, len(parts)), (8, 2))
+        self.assertEqual(self.hot_count(), 2)
+        # Aggregates keep counting archived rows
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(read_aggregates(conn)["n"].sum(), 10)
+        self.assertEqual(archive(self.db_path, epoch(16), self.archive_dir), (0, []))
+
+    def test_crash_before_delete_does_not_duplicate_rows(self):
+        write_part = archive_module.write_part
+        calls = []
+        def crash_on_second_part(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return write_part(*args)
+        with mock.patch.object(archive_module, "write_part", side_effect=crash_on_second_part):
+            with self.assertRaises(OSError):
+                archive(self.db_path, epoch(16), self.archive_dir)
+        self.assertEqual(self.hot_count(), 10)
+        # A late result for an already written day changes that part's rowid range, and so its file name
+        writer = DBWriter(self.db_path)
+        writer.put_many([on_day(5, 14)])
+        writer.close()
+        self.assertEqual(archive(self.db_path, epoch(16), self.archive_dir)[0], 9)
+        self.assertEqual(len(query(self.archive_dir)), 9)
+        self.assertEqual(self.hot_count(), 2)
+
+    def test_crash_after_delete_finishes_on_the_next_run(self):
+        # The first call, before anything is staged, has nothing to do; the second dies before any rename
+        with mock.patch.object(archive_module, "finish_parts", side_effect=[None, OSError("killed")]):
+            with self.assertRaises(OSError):
+                archive(self.db_path, epoch(16), self.archive_dir)
+        self.assertEqual(self.hot_count(), 2)
+        self.assertEqual(len(query(self.archive_dir)), 0)
+        self.assertEqual(archive(self.db_path, epoch(16), self.archive_dir), (0, []))
+        self.assertEqual(len(query(self.archive_dir)), 8)
+
+    def test_query_prunes_partitions_and_columns(self):
+        archive(self.db_path, epoch(16), self.archive_dir)
+        self.assertEqual(len(partitions(self.archive_dir, epoch(15), epoch(15) + 3600)), 1)
+        frame = query(self.archive_dir, ("status", "card_id"), epoch(15), epoch(16))
+        self.assertEqual(list(frame.columns), ["status", "card_id"])
+        self.assertEqual(frame["status"].tolist(), ["rejected"] * 3)
+        self.assertEqual(frame["card_id"].iloc[0], "1234-5678-0000")
+
+    def test_range_spans_archive_and_hot_table(self):
+        archive(self.db_path, epoch(15), self.archive_dir)
+        agg = read_range(self.db_path, epoch(14), epoch(17), self.archive_dir)
+        self.assertEqual(dict(zip(agg["status"], agg["n"])), {"approved": 7, "rejected": 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+import json
+from src.common.batch import decode_payload, encode_batch
+from src.verifier.verifier import ResultBatch, verify_message
+
+CARDS = [
+    {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-01-01", "region": "US", "card_type": "Visa"},
+    {"id": "invalid_id", "name": "Bob Jones", "expiry": "2999-01-01", "region": "EU", "card_type": "Amex"},
+]
+
+class TestBatchEnvelope(unittest.TestCase):
+    def test_roundtrip(self):
+        for compress in (False, True):
+            batch_id, items, compressed = decode_payload(encode_batch(CARDS, batch_id="b1", compress=compress))
+            self.assertEqual((batch_id, items, compressed), ("b1", CARDS, compress))
+
+    def test_single_message_is_backward_compatible(self):
+        self.assertEqual(decode_payload(json.dumps(CARDS[0]).encode()), (None, [CARDS[0]], False))
+
+    def test_verify_batch(self):
+        batch = verify_message(encode_batch(CARDS + [{"name": "No Id"}], batch_id="b2", compress=True))
+        self.assertIsInstance(batch, ResultBatch)
+        self.assertEqual(batch.batch_id, "b2")
+        self.assertTrue(batch.compressed)
+        self.assertEqual([r["status"] for r in batch.results], ["approved", "rejected"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import unittest
+from unittest import mock
+from benchmarks import encoding, pipeline
+from benchmarks.pipeline import StoreMonitor, compare
+
+def make_run(rate=100, result_rate=1000.0, p99=10.0, rss=50.0):
+    return {"scenario": {"rate": rate, "batch_size": 1},
+            "load": {"result_rate": result_rate, "latency_ms": {"p95": 5.0, "p99": p99}},
+            "store": {"rate": result_rate, "lag_ms": {"p95": 200.0}},
+            "resources": {"verifier": {"cpu_ms_per_1k": 400.0, "max_rss_mb": rss}}}
+
+class TestCompare(unittest.TestCase):
+    def test_flags_regressions_beyond_tolerance(self):
+        regressions = compare([make_run(result_rate=700.0, p99=11.0, rss=80.0)], [make_run()], tolerance=0.2)
+        self.assertEqual(sorted(r["metric"] for r in regressions),
+                         ["load.result_rate", "resources.verifier.max_rss_mb", "store.rate"])
+
+    def test_improvements_and_new_scenarios_pass(self):
+        self.assertEqual(compare([make_run(result_rate=2000.0, p99=2.0)], [make_run()]), [])
+        self.assertEqual(compare([make_run(rate=500, result_rate=1.0)], [make_run()]), [])
+
+class TestRunScenario(unittest.TestCase):
+    def test_settings_are_passed_without_touching_the_environment(self):
+        scenario = {"qos": 0, "verifier_workers": 0, "streaming": False, "count": 10, "rate": 0, "publishers": 1,
+                    "batch_size": 1, "invalid_ratio": 0.3, "encoding": "json"}
+        before = dict(os.environ)
+        with mock.patch.object(pipeline, "Service") as service, mock.patch.object(pipeline, "wait_ready"), \
+                mock.patch.object(pipeline, "StoreMonitor"), mock.patch.object(pipeline, "LoadGenerator") as generator:
+            service.return_value.proc.returncode = 0
+            generator.return_value.run.return_value = {"sent": 10, "received": 10}
+            pipeline.run_scenario("127.0.0.1", 18830, scenario)
+        self.assertEqual(dict(os.environ), before)
+        settings = generator.call_args.kwargs
+        self.assertEqual((settings["broker"], settings["port"], settings["qos"]), ("127.0.0.1", 18830, 0))
+
+class TestEncodingBenchmark(unittest.TestCase):
+    def test_binary_payloads_are_smaller(self):
+        json_report = encoding.measure(200, 50, binary=False, rounds=1)
+        binary_report = encoding.measure(200, 50, binary=True, rounds=1)
+        self.assertLess(binary_report["card_bytes"] * 2, json_report["card_bytes"])
+        self.assertLess(binary_report["result_bytes"] * 2, json_report["result_bytes"])
+        self.assertGreater(binary_report["cpu_us_per_card"], 0)
+
+class TestStoreMonitor(unittest.TestCase):
+    def test_lag_from_first_sample_seeing_each_row(self):
+        monitor = StoreMonitor.__new__(StoreMonitor)
+        monitor.interval = 0.02
+        monitor.samples = [(10.0, 0), (10.2, 2), (10.3, 2), (10.4, 3)]
+        report = monitor.report([9.9, 10.0, 10.3])
+        self.assertEqual(report["stored"], 3)
+        self.assertEqual((report["lag_ms"]["p50"], report["lag_ms"]["p99"]), (200.0, 300.0))
+        self.assertEqual(report["rate"], 6.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+from src.common.batch import decode_message, decode_payload, encode_message
+from src.common.binary import CARD, RESULT, encode_binary, encode_card
+from src.verifier.verifier import ResultBatch, result_message, verify_message
+
+CARDS = [
+    {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-01-01", "region": "US", "card_type": "Visa",
+     "msg_id": "0123456789abcdef0123456789abcdef", "sent_ts": 1714000000.25},
+    # Unknown enum values travel as literals, missing ones stay missing
+    {"id": "invalid_id", "name": "Zoë Ørsted", "expiry": "2020-02-01", "region": "Mars"},
+]
+RESULTS = [
+    {"id": "1234-5678-9012", "status": "approved", "reasons": [], "timestamp": "2025-04-01 12:00:00",
+     "card_type": "Visa", "region": "US", "msg_id": "0123456789abcdef0123456789abcdef"},
+    {"id": "invalid_id", "status": "rejected", "reasons": ["Invalid ID format", "Invalid region"],
+     "timestamp": "2025-04-01 12:00:01", "card_type": "Unknown", "region": "Mars", "sent_ts": 1714000000.25},
+]
+
+class TestBinaryCodec(unittest.TestCase):
+    def test_cards_roundtrip(self):
+        for card in CARDS:
+            self.assertEqual(decode_payload(encode_binary(CARD, [card])), (None, [card], False))
+        batch_id, cards, _ = decode_payload(encode_binary(CARD, CARDS, "b1"))
+        self.assertEqual((batch_id, cards), ("b1", CARDS))
+        self.assertEqual([list(card) for card in cards], [list(card) for card in CARDS])  # Same key order as JSON
+
+    def test_results_roundtrip(self):
+        payload, binary = encode_message(RESULTS, RESULT, "b2", compress=True, binary=True)
+        self.assertTrue(binary)
+        self.assertEqual(decode_message(payload), ("b2", RESULTS, True, True))
+        self.assertLess(len(encode_binary(RESULT, RESULTS[:1])), len(json.dumps(RESULTS[0])) / 3)
+
+    def test_unencodable_items_fall_back_to_json(self):
+        custom = dict(RESULTS[0], status="rejected", reasons=["Blocked country"])
+        payload, binary = encode_message([custom], RESULT, binary=True)
+        self.assertFalse(binary)
+        self.assertEqual(json.loads(payload), custom)
+        with self.assertRaises(ValueError):
+            encode_card(dict(CARDS[0], msg_id="not-a-uuid"))
+        with self.assertRaises(ValueError):
+            encode_card(dict(CARDS[0], extra=1))
+
+    def test_verify_binary_message(self):
+        batch = verify_message(encode_binary(CARD, CARDS, "b3"))
+        self.assertEqual((batch.batch_id, batch.binary), ("b3", True))
+        self.assertEqual([r["status"] for r in batch.results], ["approved", "rejected"])
+        topic, payload = result_message(batch.results, batch.batch_id, binary=batch.binary)
+        self.assertEqual(topic, "kyc/result/bin")
+        self.assertEqual(decode_payload(payload)[1], batch.results)
+        single = verify_message(encode_binary(CARD, CARDS[:1]))
+        self.assertIsInstance(single, ResultBatch)
+        self.assertIsNone(single.batch_id)
+        self.assertEqual(result_message(single.results)[0], "kyc/result")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from src.verifier import bulk
+from src.verifier.result_writer import FIELDNAMES
+from src.verifier.verifier import verify_card
+
+CARDS = [
+    {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-01-01", "region": "US", "card_type": "Visa", "msg_id": "a"},
+    {"id": "123456-7890", "name": "Zoë  Ørsted", "expiry": "2999-1-5", "region": "EU", "card_type": "Amex", "msg_id": "b"},
+    {"id": "invalid_id", "name": "A", "expiry": "2020-01-01", "region": "Mars", "card_type": "Diners", "msg_id": "c"},
+    {"id": "1234-5678-9012\n", "name": " Bob Jones ", "expiry": "2999-12-31", "region": "", "card_type": "MasterCard", "msg_id": ""},
+    # The online verifier cannot parse this expiry and skips the card
+    {"id": "1234-5678-9012", "name": "Bob Jones", "expiry": "2999-02-30", "region": "US", "card_type": "Visa", "msg_id": "d"},
+]
+TIMESTAMP = "2025-04-01 12:00:00"
+
+def online(cards):
+    results = []
+    for card in cards:
+        try:
+            results.append(verify_card(card))
+        except Exception:
+            pass
+    return results
+
+class TestBulkVerification(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "cards.csv")
+        pd.DataFrame(CARDS).to_csv(self.source, index=False)
+        patcher = mock.patch("time.strftime", return_value=TIMESTAMP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ndjson_matches_online_verifier(self):
+        output = os.path.join(self.tmp.name, "out.ndjson")
+        summary = bulk.run(self.source, output, chunk_size=2, workers=1)
+        with open(output) as f:
+            lines = f.readlines()
+        self.assertEqual(lines, [json.dumps(result) + "\n" for result in online(CARDS)])
+        self.assertEqual((summary["verified"], summary["approved"], summary["malformed"]), (4, 2, 1))
+
+    def test_csv_matches_result_writer_layout(self):
+        output = os.path.join(self.tmp.name, "out.csv")
+        bulk.run(self.source, output, output_format="csv", workers=2, chunk_size=2)
+        expected = io.StringIO(newline="")
+        writer = csv.DictWriter(expected, fieldnames=FIELDNAMES, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(online(CARDS))
+        with open(output, newline="") as f:
+            self.assertEqual(f.read(), expected.getvalue())
+
+    def test_sqlite_nulls_are_missing_fields(self):
+        db = os.path.join(self.tmp.name, "cards.db")
+        with sqlite3.connect(db) as conn:
+            conn.execute("CREATE TABLE cards (id TEXT, name TEXT, expiry TEXT, region TEXT, card_type TEXT)")
+            conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?)",
+                             [("1234-5678-9012", "Alice Smith", "2999-01-01", None, "Visa"),
+                              (None, "Bob Jones", "2999-01-01", "US", "Visa")])
+        output = os.path.join(self.tmp.name, "out.ndjson")
+        summary = bulk.run(db, output, workers=1)
+        with open(output) as f:
+            results = [json.loads(line) for line in f]
+        card = {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": "2999-01-01", "card_type": "Visa"}
+        self.assertEqual(results, [verify_card(card)])
+        self.assertEqual(results[0]["region"], "Unknown")
+        self.assertEqual(summary["malformed"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+from helpers import make_result
+import frontend.app as dashboard
+from src.analyst.analyst import init_db
+from src.analyst.db_writer import DBWriter
+from src.analysis.charts import ChartService, load_data
+
+class TestChartService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmp.name, "kyc_results.db")
+        init_db(cls.db_path)
+        cls.store([make_result(i) for i in range(3)] + [make_result(9, "rejected")])
+        cls.service = ChartService(cls.db_path, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+        cls.tmp.cleanup()
+
+    @classmethod
+    def store(cls, results):
+        writer = DBWriter(cls.db_path)
+        writer.put_many(results)
+        writer.close()
+
+    def test_cached_until_data_changes(self):
+        first = self.service.get("status_pie")
+        self.assertTrue(first.body.startswith(b"\x89PNG"))
+        self.assertIs(self.service.get("status_pie").body, first.body)
+        self.store([make_result(20, "rejected")])
+        self.assertNotEqual(self.service.get("status_pie").etag, first.etag)
+
+    def test_reason_totals_match_the_aggregates(self):
+        with sqlite3.connect(self.db_path) as conn:
+            before = load_data(conn)
+            # Archiving deletes hot rows; like the other charts, the reasons keep counting them
+            conn.execute("DELETE FROM verdicts")
+            after = load_data(conn)
+            conn.rollback()
+        rejected = sum(n for _, status, _, _, n in before["agg"] if status == "rejected")
+        self.assertEqual(sum(count for _, count in before["reasons"]), rejected)
+        self.assertEqual(after, before)
+
+    def test_endpoint_answers_304(self):
+        client = dashboard.app.test_client()
+        with mock.patch.object(dashboard, "charts", self.service):
+            response = client.get("/charts/rejection_reasons.png")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.get("/charts/rejection_reasons.png", headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+            self.assertEqual(client.get("/charts/nope.png").status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+from helpers import make_result
+from src.analyst.analyst import init_db
+from src.analyst.db_writer import DBWriter
+from src.analyst.migrations import LATEST_VERSION, migrate, schema_version
+
+class TestDBWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "kyc_results.db")
+        init_db(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def count(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def test_close_drains_queue(self):
+        writer = DBWriter(self.db_path, batch_size=50, flush_ms=1000)
+        for i in range(120):
+            writer.put(make_result(i))
+        writer.close()
+        self.assertEqual(self.count(), 120)
+        stats = writer.stats()
+        self.assertEqual(stats["written"], 120)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreaterEqual(stats["commits"], 3)
+
+    def test_flush_commits_pending_rows(self):
+        writer = DBWriter(self.db_path, batch_size=1000, flush_ms=60000)
+        writer.put_many([make_result(i, "rejected") for i in range(10)])
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self.count(), 10)
+        writer.close()
+
+    def test_full_queue_sheds_after_put_timeout(self):
+        writer = DBWriter(self.db_path, flush_ms=0, max_queue=1, put_timeout=0.05)
+        gate = threading.Event()
+        with mock.patch.object(writer, "_commit", side_effect=lambda conn, rows: gate.wait()):
+            writer.put(make_result(0))
+            # The writer thread takes the first result and stalls in its commit, so one more fills the queue
+            while writer.queue_depth():
+                time.sleep(0.01)
+            self.assertTrue(writer.put(make_result(1)))
+            with self.assertLogs(level="WARNING"):
+                self.assertFalse(writer.put_many([make_result(2), make_result(3)]))
+            self.assertEqual(writer.stats()["shed"], 2)
+            gate.set()
+            writer.close()
+
+    def test_redelivered_results_are_ignored(self):
+        writer = DBWriter(self.db_path)
+        writer.put_many([make_result(i) for i in range(5)])
+        writer.put_many([make_result(i) for i in range(5)])
+        writer.close()
+        self.assertEqual(self.count(), 5)
+        self.assertEqual(writer.stats()["duplicates"], 5)
+
+    def test_new_verdict_for_same_message_replaces_old(self):
+        writer = DBWriter(self.db_path)
+        writer.put(dict(make_result(1), msg_id="m1"))
+        writer.flush()
+        writer.put(dict(make_result(1, "rejected"), msg_id="m1"))
+        writer.close()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT status, reasons FROM results").fetchall()
+            agg = conn.execute("SELECT status, SUM(n) FROM results_agg GROUP BY status").fetchall()
+        self.assertEqual(rows, [("rejected", '["Card expired"]')])
+        self.assertEqual(agg, [("rejected", 1)])
+
+    def test_new_names_get_codes(self):
+        result = dict(make_result(1, "rejected"), region="LATAM", reasons=["Card expired", "Blocked issuer"])
+        writer = DBWriter(self.db_path)
+        writer.put(result)
+        writer.close()
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT region, reasons FROM results").fetchone()
+        self.assertEqual(row[0], "LATAM")
+        self.assertEqual(json.loads(row[1]), ["Card expired", "Blocked issuer"])
+
+    def test_uses_wal(self):
+        writer = DBWriter(self.db_path)
+        mode = writer.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        writer.close()
+        self.assertEqual(mode, "wal")
+
+class TestAggregates(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "kyc_results.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backfill_and_incremental_update(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE results (id TEXT, status TEXT, timestamp TEXT, reasons TEXT, card_type TEXT, region TEXT)")
+            conn.execute("INSERT INTO results VALUES ('1', 'approved', '2025-04-15 01:40:05', '[]', 'Visa', 'US')")
+        init_db(self.db_path)
+        writer = DBWriter(self.db_path)
+        writer.put_many([make_result(i, "rejected") for i in range(3)] + [make_result(9)])
+        writer.close()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT bucket, status, card_type, region, n FROM results_agg ORDER BY status").fetchall()
+        self.assertEqual(rows, [("2025-04-15 01", "approved", "Visa", "US", 2), ("2025-04-15 01", "rejected", "Visa", "US", 3)])
+
+    def test_reason_counts_are_backfilled_and_follow_upserts(self):
+        with sqlite3.connect(self.db_path) as conn:
+            migrate(conn, 5)
+        writer = DBWriter(self.db_path)
+        writer.put_many([make_result(i, "rejected", msg_id=str(i)) for i in range(2)])
+        writer.close()
+        init_db(self.db_path)
+        # A re-verification of message 1 with another reason moves its count to the new mask
+        writer = DBWriter(self.db_path)
+        writer.put_many([dict(make_result(1, "rejected", msg_id="1"), reasons=["Invalid name"]), make_result(5)])
+        writer.close()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT s.name, a.reasons, a.n FROM verdicts_reasons_agg a "
+                                "JOIN statuses s ON s.id = a.status ORDER BY a.reasons").fetchall()
+        self.assertEqual(rows, [("approved", 0, 1), ("rejected", 1 << 1, 1), ("rejected", 1 << 2, 1)])
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "kyc_results.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_legacy_rows_are_migrated(self):
+        rows = [("1234-5678-9012", "rejected", "2025-04-15 01:40:05", '["Invalid ID format", "Card expired"]', "Visa", "US"),
+                ("1234-5678-9013", "approved", "2025-04-15 02:10:00", "[]", "Amex", "EU")]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE results (id TEXT, status TEXT, timestamp TEXT, reasons TEXT, card_type TEXT, region TEXT)")
+            # The second copy of the first row is a QoS 1 redelivery
+            conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", rows + rows[:1])
+        init_db(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(schema_version(conn), LATEST_VERSION)
+            migrated = conn.execute("SELECT * FROM results ORDER BY id").fetchall()
+            agg = conn.execute("SELECT bucket, status, n FROM results_agg ORDER BY bucket").fetchall()
+        self.assertEqual([row[:3] + row[4:] for row in migrated], [row[:3] + row[4:] for row in rows])
+        self.assertEqual(json.loads(migrated[0][3]), ["Invalid ID format", "Card expired"])
+        self.assertEqual(agg, [("2025-04-15 01", "rejected", 1), ("2025-04-15 02", "approved", 1)])
+
+    def test_migrate_is_idempotent(self):
+        init_db(self.db_path)
+        init_db(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(schema_version(conn), LATEST_VERSION)
+
+    def test_reference_schema_matches_the_migrations(self):
+        init_db(self.db_path)
+        path = os.path.join(os.path.dirname(__file__), "..", "data", "schema.sql")
+        with open(path) as f:
+            script = f.read()
+        reference = sqlite3.connect(":memory:")
+        reference.executescript(script)
+        objects = "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(reference.execute(objects).fetchall(), conn.execute(objects).fetchall())
+        reference.close()
+        self.assertIn(f"PRAGMA user_version = {LATEST_VERSION}", script.splitlines()[0])
+
+    def test_filters_use_indexes(self):
+        init_db(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            by_time = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM verdicts WHERE ts BETWEEN 0 AND 100").fetchall()
+            by_dims = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM verdicts WHERE status = 2 AND region = 1").fetchall()
+        self.assertIn("verdicts_ts", str(by_time))
+        self.assertIn("verdicts_filter", str(by_dims))
+
+if __name__ == '__main__':
+    unittest.main()
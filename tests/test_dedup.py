@@ -0,0 +1,44 @@
+import json
+import unittest
+from helpers import FakeClock
+from src.common.dedup import BloomFilter, DedupCache, payload_key
+
+class TestDedupCache(unittest.TestCase):
+    def test_redelivery_is_seen(self):
+        cache = DedupCache()
+        payload = json.dumps({"id": "1234-5678-9012", "msg_id": "a"}).encode()
+        self.assertFalse(cache.seen(payload_key(payload)))
+        self.assertTrue(cache.seen(payload_key(payload)))
+        self.assertFalse(cache.seen(payload_key(payload.replace(b'"a"', b'"b"'))))
+        self.assertEqual(cache.hits, 1)
+
+    def test_evicts_by_size_and_age(self):
+        clock = FakeClock()
+        cache = DedupCache(max_size=2, ttl=10, clock=clock)
+        for key in (b"a", b"b", b"c"):
+            cache.seen(key)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.seen(b"a"))
+        clock.now = 11
+        self.assertFalse(cache.seen(b"c"))
+        self.assertEqual(len(cache), 1)
+
+    def test_bloom_mode_remembers_one_generation_back(self):
+        clock = FakeClock()
+        cache = DedupCache(max_size=1000, ttl=10, bloom=True, clock=clock)
+        keys = [payload_key(str(i).encode()) for i in range(500)]
+        self.assertFalse(any(cache.seen(key) for key in keys))
+        clock.now = 10
+        self.assertTrue(all(cache.seen(key) for key in keys))
+        clock.now = 25
+        self.assertFalse(cache.seen(keys[0]))
+
+    def test_bloom_false_positive_rate(self):
+        bloom = BloomFilter(10000, error=0.01)
+        for i in range(10000):
+            bloom.add(payload_key(f"in-{i}".encode()))
+        false_positives = sum(payload_key(f"out-{i}".encode()) in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+import json
+from frontend.live import LiveStats
+
+def parse(event):
+    return json.loads(event.split("data: ", 1)[1])
+
+class TestLiveStats(unittest.TestCase):
+    def setUp(self):
+        self.live = LiveStats(lambda: {"approved": 3, "rejected": 1, "total": 4, "rejection_rate": 25.0})
+
+    def test_seeded_from_database(self):
+        self.assertEqual(self.live.snapshot(), {"approved": 3, "rejected": 1, "total": 4, "rejection_rate": 25.0})
+
+    def test_stream_pushes_totals_and_delta(self):
+        stream = self.live.stream(keepalive=0.1)
+        self.assertEqual(parse(next(stream))["total"], 4)
+        self.assertEqual(next(stream), ": keepalive\n\n")
+        self.live.add([{"status": "rejected"}, {"status": "rejected"}, {"status": "approved"}])
+        self.live.publish_event()
+        stats = parse(next(stream))
+        self.assertEqual(stats["total"], 7)
+        self.assertEqual(stats["delta"], {"approved": 1, "rejected": 2})
+
+    def test_resync_replaces_counts(self):
+        self.live.add([{"status": "approved"}])
+        self.live.resync()
+        self.assertEqual(self.live.snapshot()["approved"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from src.common.logs import JsonFormatter, LazyQueueHandler, SampleFilter, configure, shutdown
+from src.logger.logger import LogService
+
+def make_record(msg="Verified %s", args=("1234",), level=logging.INFO, **extra):
+    record = logging.LogRecord("kyc.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+class TestLogs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.log")
+
+    def tearDown(self):
+        shutdown("kyc.test")
+        self.tmp.cleanup()
+
+    def test_json_lines_carry_extra_fields(self):
+        line = JsonFormatter().format(make_record(result={"status": "approved"}, sample="approved"))
+        entry = json.loads(line)
+        self.assertEqual(entry["message"], "Verified 1234")
+        self.assertEqual(entry["result"], {"status": "approved"})
+        self.assertNotIn("sample", entry)
+
+    def test_sampling_keeps_every_rejection(self):
+        sampler = SampleFilter({"approved": 10, "rejected": 1})
+        approved = sum(sampler.filter(make_record(sample="approved")) for _ in range(100))
+        rejected = sum(sampler.filter(make_record(sample="rejected")) for _ in range(100))
+        self.assertEqual((approved, rejected), (10, 100))
+        self.assertTrue(sampler.filter(make_record()))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = LazyQueueHandler(queue.SimpleQueue(), max_size=1)
+        record = make_record()
+        handler.handle(record)
+        handler.handle(make_record())
+        self.assertIs(handler.queue.get_nowait(), record)
+        self.assertEqual(record.args, ("1234",))
+
+    def test_blocking_handler_waits_for_room(self):
+        handler = LazyQueueHandler(queue.Queue(maxsize=1), max_size=1, block=True)
+        handler.handle(make_record())
+        second = threading.Thread(target=handler.handle, args=(make_record(),))
+        second.start()
+        second.join(0.1)
+        self.assertTrue(second.is_alive())
+        handler.queue.get_nowait()
+        second.join(1)
+        self.assertFalse(second.is_alive())
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_configure_writes_through_listener(self):
+        logger = logging.getLogger("kyc.test")
+        logger.propagate = False
+        configure(self.path, logger=logger)
+        logger.info("Verified %s", "1234", extra={"result": {"id": "1234"}})
+        logger.error("Broken")
+        shutdown("kyc.test")
+        with open(self.path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["message"] for entry in entries], ["Verified 1234", "Broken"])
+        self.assertEqual(entries[0]["result"], {"id": "1234"})
+        self.assertFalse(any(isinstance(h, LazyQueueHandler) for h in logger.handlers))
+
+    def test_rotation_by_written_size(self):
+        logger = logging.getLogger("kyc.test")
+        logger.propagate = False
+        with unittest.mock.patch.dict(os.environ, {"LOG_MAX_BYTES": "1000", "LOG_BACKUPS": "2"}):
+            configure(self.path, logger=logger)
+        for i in range(100):
+            logger.info("Line %d", i)
+        shutdown("kyc.test")
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        self.assertLess(os.path.getsize(self.path), 1000)
+
+    def test_log_service_writes_items(self):
+        service = LogService(path=os.path.join(self.tmp.name, "logger.log"))
+        try:
+            service.log_items("kyc/result", None, [{"id": "1", "status": "approved"}, {"id": "2", "status": "rejected"}])
+        finally:
+            shutdown("kyc.audit")
+        with open(os.path.join(self.tmp.name, "logger.log")) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["item"]["id"] for entry in entries], ["1", "2"])
+        self.assertEqual(entries[0]["topic"], "kyc/result")
+
+    def test_audit_log_is_not_sampled_or_dropped(self):
+        env = {"LOG_SAMPLE_APPROVED": "10", "LOGGER_QUEUE_SIZE": "5"}
+        with unittest.mock.patch.dict(os.environ, env):
+            service = LogService(path=os.path.join(self.tmp.name, "logger.log"))
+        try:
+            service.log_items("kyc/result", None, [{"id": str(i), "status": "approved"} for i in range(200)])
+        finally:
+            shutdown("kyc.audit")
+        with open(os.path.join(self.tmp.name, "logger.log")) as f:
+            self.assertEqual(sum(1 for _ in f), 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import time
+import threading
+import unittest
+import urllib.request
+from types import SimpleNamespace
+from src.common.metrics import PublishTimer, Registry, SamplingProfiler, handle, serve
+from src.common.validation import Validator
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_render_counters_gauges_and_histograms(self):
+        counter = self.registry.counter("kyc_test_total", "Things", ("status",))
+        counter.labels("approved").inc(3)
+        counter.labels(status="rejected").inc()
+        self.registry.gauge("kyc_test_depth", "Depth").set_function(lambda: 7)
+        histogram = self.registry.histogram("kyc_test_seconds", "Time", buckets=(0.01, 0.1))
+        histogram.observe(0.005)
+        histogram.observe(0.05)
+        histogram.observe(3)
+        text = self.registry.render()
+        self.assertIn("# TYPE kyc_test_total counter", text)
+        self.assertIn('kyc_test_total{status="approved"} 3', text)
+        self.assertIn('kyc_test_total{status="rejected"} 1', text)
+        self.assertIn("kyc_test_depth 7", text)
+        self.assertIn('kyc_test_seconds_bucket{le="0.01"} 1', text)
+        self.assertIn('kyc_test_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('kyc_test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("kyc_test_seconds_count 3", text)
+
+    def test_reregistering_returns_same_metric(self):
+        first = self.registry.counter("kyc_test_total", "Things")
+        self.assertIs(self.registry.counter("kyc_test_total", "Things"), first)
+        with self.assertRaises(ValueError):
+            self.registry.gauge("kyc_test_total", "Things")
+
+    def test_publish_timer_handles_early_ack(self):
+        histogram = self.registry.histogram("kyc_test_publish_seconds", "Publish")
+        timer = PublishTimer(histogram)
+        timer.track(SimpleNamespace(mid=1))
+        timer.on_publish(None, None, 1)
+        timer.on_publish(None, None, 2)
+        timer.track(SimpleNamespace(mid=2))
+        self.assertEqual(sum(histogram.default.snapshot()[0]), 1)
+        self.assertEqual(timer.pending, {})
+
+    def test_scrape_endpoint(self):
+        self.registry.counter("kyc_test_total", "Things").inc()
+        status, _, body = handle("/metrics", registry=self.registry)
+        self.assertEqual(status, 200)
+        self.assertIn("kyc_test_total 1", body)
+        server = serve(0, host="127.0.0.1")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+                self.assertEqual(response.status, 200)
+                self.assertIn("text/plain", response.headers["Content-Type"])
+        finally:
+            server.shutdown()
+
+    def test_dashboard_metrics_route(self):
+        from frontend import app as dashboard
+        client = dashboard.app.test_client()
+        before = dashboard.REQUESTS.labels("chart", "404").get()
+        client.get("/charts/unknown.png")
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'kyc_dashboard_requests_total{{endpoint="chart",status="404"}} {before + 1:g}',
+                      response.get_data(as_text=True))
+
+class TestInstrumentation(unittest.TestCase):
+    def test_rule_timing_is_sampled(self):
+        registry = Registry()
+        histogram = registry.histogram("kyc_test_rule_seconds", "Rules", ("rule",))
+        validator = Validator()
+        validator.instrument(histogram, every=10)
+        card = {"id": "invalid_id", "name": "Alice Smith", "expiry": "2999-12-31", "region": "US", "card_type": "Visa"}
+        for _ in range(100):
+            self.assertEqual(validator.validate(card), ["Invalid ID format"])
+        self.assertEqual(sum(histogram.labels("id").snapshot()[0]), 10)
+        self.assertEqual(sorted(key[0] for key in histogram.children), ["card_type", "expiry", "id", "name", "region"])
+
+    def test_profiler_samples_other_threads(self):
+        profiler = SamplingProfiler(interval=0.001)
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_loop, name="BusyWorker")
+        worker.start()
+        profiler.start()
+        time.sleep(0.1)
+        profiler.stop()
+        stop.set()
+        worker.join()
+        self.assertGreater(profiler.samples, 0)
+        self.assertIn("BusyWorker;", profiler.collapsed())
+        self.assertIn("busy_loop", profiler.collapsed())
+
+    def test_profiler_control_is_post_only_and_opt_in(self):
+        profiler = SamplingProfiler()
+        status, _, _ = handle("/profile/start", method="POST", profiler=profiler, control=False)
+        self.assertEqual(status, 403)
+        status, _, _ = handle("/profile/start", method="GET", profiler=profiler, control=True)
+        self.assertEqual(status, 405)
+        self.assertFalse(profiler.running)
+
+    def test_profiler_parameters_are_checked(self):
+        profiler = SamplingProfiler()
+        for query in ("interval=fast", "interval=nan"):
+            status, _, _ = handle("/profile/start", query, method="POST", profiler=profiler, control=True)
+            self.assertEqual(status, 400)
+        self.assertEqual(handle("/profile", "top=all", profiler=profiler)[0], 400)
+        status, _, _ = handle("/profile/start", "interval=1e-9", method="POST", profiler=profiler, control=True)
+        try:
+            self.assertEqual(status, 200)
+            self.assertEqual(profiler.interval, 0.001)
+        finally:
+            handle("/profile/stop", method="POST", profiler=profiler, control=True)
+        self.assertFalse(profiler.running)
+
+if __name__ == '__main__':
+    unittest.main()
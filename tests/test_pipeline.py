@@ -0,0 +1,125 @@
+import unittest
+import json
+import threading
+import time
+from unittest import mock
+from src.common.validation import RULES, Rule
+from src.verifier import pipeline as pipeline_module
+from src.verifier.pipeline import VerificationPipeline
+from src.verifier.verifier import init_worker, verify_message, verify_payload
+
+def card_payload(i):
+    return json.dumps({"id": f"1234-5678-{i:04d}", "name": "Alice Smith", "expiry": "2999-01-01",
+                       "region": "US", "card_type": "Visa"}).encode()
+
+def slow_identity(payload):
+    # Later payloads finish first, so unordered output comes back reversed
+    time.sleep(0.05 - payload * 0.01)
+    return payload
+
+def not_alice(card):
+    # Module-level, so a rule table using it pickles into process workers
+    return card["name"] != "Alice Smith"
+
+class TestVerificationPipeline(unittest.TestCase):
+    def run_pipeline(self, payloads, **kwargs):
+        emitted = []
+        pipeline = VerificationPipeline(kwargs.pop("process", verify_message), emitted.append, **kwargs)
+        for payload in payloads:
+            pipeline.submit(payload)
+        pipeline.close()
+        return emitted, pipeline.stats()
+
+    def test_ordered_thread_pool(self):
+        emitted, stats = self.run_pipeline([card_payload(i) for i in range(200)], workers=4)
+        self.assertEqual([r["id"] for r in emitted], [f"1234-5678-{i:04d}" for i in range(200)])
+        self.assertEqual(stats["processed"], 200)
+
+    def test_process_pool(self):
+        payloads = [card_payload(i) for i in range(20)] + [b"not json"]
+        emitted, stats = self.run_pipeline(payloads, workers=2, mode="process")
+        self.assertEqual(len(emitted), 20)
+        self.assertTrue(all(r["status"] == "approved" for r in emitted))
+        self.assertEqual((stats["processed"], stats["errors"]), (20, 1))
+
+    def test_process_workers_use_the_given_rules(self):
+        rules = RULES + (Rule("not_alice", "Alice", not_alice),)
+        emitted, _ = self.run_pipeline([card_payload(i) for i in range(5)], process=verify_payload, workers=2,
+                                       mode="process", initializer=init_worker, initargs=(rules, 1))
+        self.assertEqual([r.result["reasons"] for r in emitted], [["Alice"]] * 5)
+        # Timings come back with each result instead of staying in the worker's registry
+        self.assertTrue(all(r.decode_seconds > 0 and r.verify_seconds > 0 for r in emitted))
+        self.assertEqual(sorted({rule for r in emitted for rule, _ in r.rule_seconds}),
+                         ["card_type", "expiry", "id", "name", "not_alice", "region"])
+
+    def test_queued_payloads_are_submitted_in_chunks(self):
+        gate = threading.Event()
+        sizes = []
+        def process_chunk(process, payloads):
+            sizes.append(len(payloads))
+            gate.wait()
+            return real_chunk(process, payloads)
+        real_chunk = pipeline_module.process_chunk
+        emitted = []
+        with mock.patch.object(pipeline_module, "process_chunk", process_chunk):
+            pipeline = VerificationPipeline(lambda p: p, emitted.append, workers=1, chunk_size=8)
+            for i in range(41):
+                pipeline.submit(i)
+            gate.set()
+            pipeline.close()
+        self.assertEqual(emitted, list(range(41)))
+        self.assertEqual(sum(sizes), 41)
+        self.assertLessEqual(max(sizes), 8)
+        # At most 5 chunks (4 in flight plus one held by the dispatcher) can be taken before the gate opens
+        self.assertLessEqual(len(sizes), 5 + 5)
+
+    def test_unordered_emits_as_completed(self):
+        emitted, _ = self.run_pipeline(list(range(5)), process=slow_identity, workers=5, ordered=False)
+        self.assertEqual(sorted(emitted), list(range(5)))
+        self.assertNotEqual(emitted, list(range(5)))
+
+    def test_drop_newest_when_full(self):
+        gate = threading.Event()
+        emitted = []
+        pipeline = VerificationPipeline(lambda p: gate.wait() and p, emitted.append, workers=1,
+                                        queue_size=1, backpressure="drop_newest")
+        accepted = sum(pipeline.submit(i) for i in range(20))
+        gate.set()
+        pipeline.close()
+        self.assertLess(accepted, 20)
+        self.assertEqual(pipeline.stats()["dropped"], 20 - accepted)
+        self.assertEqual(len(emitted), accepted)
+
+    def test_close_is_not_lost_to_drop_oldest_submits(self):
+        gate = threading.Event()
+        pipeline = VerificationPipeline(lambda p: gate.wait() and p, lambda p: None, workers=1,
+                                        queue_size=1, backpressure="drop_oldest")
+        def flood():
+            # Keeps the queue full, so every submit evicts whatever sits at its head
+            try:
+                while True:
+                    pipeline.submit(b"x")
+            except RuntimeError:
+                pass
+        flooders = [threading.Thread(target=flood, daemon=True) for _ in range(4)]
+        for thread in flooders:
+            thread.start()
+        time.sleep(0.05)
+        # close() queues its stop marker while the flooders are still evicting from the full queue
+        closer = threading.Thread(target=pipeline.close, daemon=True)
+        closer.start()
+        time.sleep(0.05)
+        gate.set()
+        closer.join(5)
+        self.assertFalse(closer.is_alive())
+        for thread in flooders:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_errors_are_counted(self):
+        emitted, stats = self.run_pipeline([b"not json", card_payload(1)], workers=2)
+        self.assertEqual(len(emitted), 1)
+        self.assertEqual(stats["errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from helpers import make_result
+import frontend.app as dashboard
+from src.analyst.analyst import init_db
+from src.analyst.db_writer import DBWriter
+from src.analysis.queries import ResultsService, parse_filters
+
+def at_minute(i, minute, status="approved", card_type="Visa", region="US"):
+    return make_result(i, status, f"2025-04-15 01:{minute:02d}:05", card_type, region, msg_id=f"m{i}")
+
+class TestResultsService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "kyc_results.db")
+        init_db(self.db_path)
+        self.store([at_minute(i, i) for i in range(5)] +
+                   [at_minute(10 + i, i, "rejected", "Amex", "MEA") for i in range(5)])
+        self.service = ResultsService(self.db_path, ttl=60)
+        self.addCleanup(self.service.close)
+
+    def store(self, results):
+        writer = DBWriter(self.db_path)
+        writer.put_many(results)
+        writer.close()
+
+    def page(self, cursor=None, limit=100, **args):
+        return self.service.page(parse_filters({name: [value] for name, value in args.items()}), cursor, limit)
+
+    def test_filters(self):
+        page = self.page(status="rejected", card_type="Amex", region="MEA", since="2025-04-15 01:02")
+        self.assertEqual([result["id"] for result in page["results"]], ["1234-5678-0014", "1234-5678-0013", "1234-5678-0012"])
+        self.assertEqual(page["results"][0]["reasons"], ["Card expired"])
+        self.assertEqual(self.page(reason="Card expired,Invalid ID format")["count"], 5)
+        self.assertEqual(self.page(region="US,MEA", until="2025-04-15 01:01")["count"], 2)
+        self.assertEqual(self.page(region="Mars")["results"], [])
+
+    def test_keyset_pages_cover_every_match_once(self):
+        ids, cursor = [], None
+        while True:
+            page = self.page(cursor, limit=3)
+            ids += [result["id"] for result in page["results"]]
+            cursor = page["next"]
+            if cursor is None:
+                break
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+
+    def test_cache_is_dropped_on_ingest(self):
+        first = self.page(status="approved")
+        self.assertIs(self.page(status="approved"), first)
+        self.store([at_minute(30, 59)])
+        self.assertEqual(self.page(status="approved")["results"][0]["id"], "1234-5678-0030")
+
+    def test_endpoints(self):
+        patcher = mock.patch.object(dashboard, "results", self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        client = dashboard.app.test_client()
+        response = client.get("/results?status=rejected&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["count"], 2)
+        self.assertEqual(client.get("/results?since=yesterday").status_code, 400)
+        self.assertEqual(client.get("/results?cursor=nope").status_code, 400)
+        for query in ("hours=inf", "hours=nan", "hours=1e300", "since=inf", "since=1e30", "until=-1e30",
+                      "cursor=99999999999999999999.1", "cursor=1.2.3"):
+            for path in ("/results", "/results.ndjson", "/results.csv"):
+                self.assertEqual(client.get(f"{path}?{query}").status_code, 400, f"{path}?{query}")
+        rows = list(csv.reader(io.StringIO(client.get("/results.csv?region=US").get_data(as_text=True))))
+        self.assertEqual(rows[0], ["id", "status", "timestamp", "reasons", "card_type", "region"])
+        self.assertEqual(len(rows), 6)
+        lines = client.get("/results.ndjson?status=rejected").get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)["status"] for line in lines], ["rejected"] * 5)
+
+if __name__ == '__main__':
+    unittest.main()
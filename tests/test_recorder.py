@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from helpers import FakeClock
+from src.recorder import recorder
+from src.recorder.recorder import Recorder, Recording, Replayer, TrafficWriter
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "traffic.kyc")
+
+    def record(self, messages):
+        writer = TrafficWriter(self.path, flush_interval=0)
+        for offset, topic, payload in messages:
+            writer.write(topic, payload, qos=1, now_ns=writer.started_ns + int(offset * 1e9))
+        writer.close()
+
+    def open(self):
+        recording = Recording(self.path)
+        self.addCleanup(recording.close)
+        return recording
+
+    def test_messages_are_recorded_untouched(self):
+        client = Recorder(self.path, results=True)
+        self.assertEqual(client.topics, ["kyc/card_data", "kyc/card_data/bin", "kyc/result", "kyc/result/bin"])
+        for topic, payload in (("kyc/card_data", b'{"id": "1"}'), ("kyc/card_data/bin", b"\xc1\x01\x01\x00\xff")):
+            client.on_message(None, None, mock.Mock(topic=topic, payload=payload, qos=1, retain=False))
+        client.writer.close()
+        recording = self.open()
+        self.assertEqual(len(recording), 2)
+        self.assertEqual(recording.record(0)[1:], (b"kyc/card_data", b'{"id": "1"}', 1, False))
+        self.assertEqual(recording.record(1)[2], b"\xc1\x01\x01\x00\xff")
+
+    def test_torn_tail_is_ignored_and_cut_on_reopen(self):
+        self.record([(0, "kyc/card_data", b"a"), (1, "kyc/card_data", b"b")])
+        with open(self.path, "ab") as f:
+            f.write(recorder.RECORD.pack(2_000_000_000, 100, 13, 1) + b"kyc/card_data" + b"partial")
+        self.assertEqual(len(self.open()), 2)
+        self.record([(3, "kyc/card_data", b"c")])
+        recording = self.open()
+        self.assertEqual([recording.record(i)[2] for i in range(len(recording))], [b"a", b"b", b"c"])
+
+    def test_replay_timing_seek_filter_and_loops(self):
+        self.record([(0, "kyc/card_data", b"a"), (1, "kyc/result", b"r"), (2, "kyc/card_data", b"b"),
+                     (4, "kyc/card_data", b"c")])
+        sent = []
+        clock = FakeClock()
+        replayer = Replayer(self.open(), lambda *message: sent.append(message), speed=2, start=1.5, loops=2,
+                            topics=["kyc/card_data"], clock=clock, sleep=clock.sleep)
+        summary = replayer.run()
+        self.assertEqual([message[1] for message in sent], [b"b", b"c", b"b", b"c"])
+        self.assertEqual(sent[0], ("kyc/card_data", b"b", 1, False))
+        # Twice as fast: the 2 s gap between b and c takes 1 s
+        self.assertEqual(clock.sleeps, [1.0, 1.0])
+        self.assertEqual((summary["messages"], summary["loops"]), (4, 2))
+
+    def test_full_throttle_never_sleeps(self):
+        self.record([(0, "kyc/card_data", b"a"), (5, "kyc/card_data", b"b")])
+        sent = []
+        clock = FakeClock()
+        Replayer(self.open(), lambda *message: sent.append(message), speed=0, qos=0, clock=clock, sleep=clock.sleep).run()
+        self.assertEqual([message[2] for message in sent], [0, 0])
+        self.assertEqual(clock.sleeps, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import csv
+import os
+import tempfile
+from helpers import make_result
+from src.verifier.result_writer import ResultWriter, shard_path
+from src.verifier.shards import merge_shards, shard_files
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "verifier_results.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_rows(self, path):
+        with open(path, newline="") as f:
+            return list(csv.DictReader(f))
+
+    def test_buffers_until_flush_rows(self):
+        writer = ResultWriter(self.path, flush_rows=3, flush_ms=0, max_bytes=0)
+        writer.write(make_result(1))
+        writer.write(make_result(2))
+        self.assertEqual(self.read_rows(self.path), [])
+        writer.write(make_result(3))
+        self.assertEqual(len(self.read_rows(self.path)), 3)
+        writer.close()
+
+    def test_appends_across_instances(self):
+        for i in range(2):
+            writer = ResultWriter(self.path, flush_rows=10, flush_ms=0, max_bytes=0)
+            writer.write(make_result(i))
+            writer.close()
+        rows = self.read_rows(self.path)
+        self.assertEqual([row["id"] for row in rows], ["1234-5678-0000", "1234-5678-0001"])
+
+    def test_rotates_by_size(self):
+        writer = ResultWriter(self.path, flush_rows=1, flush_ms=0, max_bytes=200)
+        for i in range(10):
+            writer.write(make_result(i))
+        writer.close()
+        files = [os.path.join(self.tmp.name, name) for name in os.listdir(self.tmp.name)]
+        self.assertGreater(len(files), 1)
+        total = sum(len(self.read_rows(path)) for path in files)
+        self.assertEqual(total, 10)
+
+    def test_merge_shards_by_timestamp(self):
+        for instance, seconds in (("a", [1, 4, 5]), ("b", [2, 3, 6])):
+            writer = ResultWriter(shard_path(instance, self.path), flush_ms=0, max_bytes=0)
+            for s in seconds:
+                writer.write(make_result(s, timestamp=f"2025-04-15 01:40:0{s}"))
+            writer.close()
+        paths = shard_files(self.path)
+        self.assertEqual(len(paths), 2)
+        output = os.path.join(self.tmp.name, "merged.csv")
+        self.assertEqual(merge_shards(paths, output), 6)
+        self.assertEqual([row["id"][-1] for row in self.read_rows(output)], list("123456"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import json
+import random
+from helpers import make_result
+from src.analyst.streaming import ALL, EwmaDetector, RingWindow, StreamingAnalytics
+
+class TestRingWindow(unittest.TestCase):
+    def test_sliding_drops_old_slots(self):
+        window = RingWindow(60, 1)
+        window.add(1000, [ALL], False)
+        window.add(1030, [ALL], True)
+        self.assertEqual(window.sliding(1030)[ALL], [1, 1])
+        self.assertEqual(window.sliding(1075)[ALL], [0, 1])
+        self.assertEqual(window.sliding(1200), {})
+
+    def test_tumbling_survives_next_window(self):
+        window = RingWindow(60, 1)
+        for t in range(960, 1020):
+            window.add(t, [ALL], t % 2 == 0)
+        for t in range(1020, 1050):
+            window.add(t, [ALL], False)
+        self.assertEqual(window.tumbling(1020)[ALL], [30, 30])
+
+class TestStreamingAnalytics(unittest.TestCase):
+    def test_alerts_on_region_spike(self):
+        published = []
+        rng = random.Random(7)
+        analytics = StreamingAnalytics(lambda topic, payload, retain: published.append((topic, json.loads(payload))),
+                                       detector=EwmaDetector(min_count=20), clock=lambda: 0)
+        t = 0
+        # Ten minutes of ~10% rejections everywhere, then EU starts rejecting most cards
+        for second in range(900):
+            t = second
+            spike = second >= 600
+            for region in ("US", "EU", "ASIA"):
+                rate = 0.8 if spike and region == "EU" else 0.1
+                statuses = ["rejected" if rng.random() < rate else "approved" for _ in range(2)]
+                analytics.add([make_result(0, status, region=region) for status in statuses], now=t)
+            if second % 5 == 4:
+                analytics.tick(now=t + 1)
+        alerts = [payload for topic, payload in published if topic == "kyc/analytics/alert"]
+        first = alerts[0]
+        self.assertEqual((first["event"], first["segment"], first["value"]), ("alert", "region", "EU"))
+        self.assertLess(first["time"], 630)
+        self.assertFalse(any(alert["segment"] == "region" and alert["value"] != "EU" for alert in alerts))
+        windows = {topic for topic, _ in published if "/window/" in topic or "/tumbling/" in topic}
+        self.assertIn("kyc/analytics/window/1h", windows)
+        self.assertIn("kyc/analytics/tumbling/5m", windows)
+
+if __name__ == '__main__':
+    unittest.main()
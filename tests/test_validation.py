@@ -0,0 +1,51 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+from benchmarks.validation import legacy_validate
+from src.common.validation import (CARD_TYPES, REGIONS, Rule, TodayCache, Validator,
+                                   parse_expiry, validate_card)
+
+class TestValidation(unittest.TestCase):
+    def test_matches_legacy_checks(self):
+        rng = random.Random(7)
+        now = datetime.now()
+        for _ in range(2000):
+            card = {
+                "id": rng.choice(["1234-5678-9012", "123456-7890", "invalid_id", "1234-5678-901", "1234-5678-9012\n"]),
+                "name": rng.choice(["Alice Smith", "A", "Al", "A B", "Bob"]),
+                "expiry": (now + timedelta(days=rng.randint(-5, 5))).strftime("%Y-%m-%d"),
+                "region": rng.choice(REGIONS + ("LATAM",)),
+                "card_type": rng.choice(CARD_TYPES + ("JCB",))
+            }
+            if rng.random() < 0.1:
+                del card["region"]
+            self.assertEqual(validate_card(card), legacy_validate(card), card)
+
+    def test_expiry_today_is_expired(self):
+        card = {"id": "1234-5678-9012", "name": "Alice Smith", "expiry": datetime.now().strftime("%Y-%m-%d"),
+                "region": "US", "card_type": "Visa"}
+        self.assertEqual(validate_card(card), ["Card expired"])
+
+    def test_parse_expiry_rejects_bad_dates(self):
+        self.assertEqual(parse_expiry("2030-01-05"), datetime(2030, 1, 5).date())
+        self.assertEqual(parse_expiry("2030-1-5"), datetime(2030, 1, 5).date())
+        with self.assertRaises(ValueError):
+            parse_expiry("2030-02-30")
+        with self.assertRaises(ValueError):
+            parse_expiry("05/01/2030")
+
+    def test_today_cache_refreshes_after_midnight(self):
+        clock = [datetime(2030, 1, 5, 23, 59, 59).timestamp()]
+        cache = TodayCache(clock=lambda: clock[0])
+        self.assertEqual(cache.get(), datetime(2030, 1, 5).date())
+        clock[0] += 2
+        self.assertEqual(cache.get(), datetime(2030, 1, 6).date())
+
+    def test_custom_rule(self):
+        validator = Validator()
+        validator.add_rule(Rule("no_test_names", "Test name", lambda card: card["name"] != "Test User"))
+        card = {"id": "1234-5678-9012", "name": "Test User", "expiry": "2999-01-01", "region": "US", "card_type": "Visa"}
+        self.assertEqual(validator.validate(card), ["Test name"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,44 @@
+import os
+import tempfile
+import time
 import unittest
 import json
+from unittest import mock
 from unittest.mock import Mock
-from src.verifier.verifier import Verifier  # Correct import path
+from benchmarks.broker import Broker
+from src.common.batch import decode_message
+from src.common.binary import CARD, encode_binary
+from src.common.dedup import payload_key
+from src.common.validation import RULES, Rule
+from src.verifier.shards import aggregate_stats
+from src.verifier.verifier import DECODE_SECONDS, RULE_SECONDS, VERIFY_SECONDS, Verifier  # Correct import path
 from datetime import datetime, timedelta
 
+def not_alice(card):
+    # Module-level, so the rule table pickles into process workers
+    return card["name"] != "Alice Smith"
+
 class TestVerifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # An embedded broker, so the Verifier connects for real without a Mosquitto install
+        cls.broker = Broker()
+        cls.port = cls.broker.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.broker.stop()
+
     def setUp(self):
-        # Instantiate Verifier and mock MQTT client
-        self.verifier = Verifier()
-        self.verifier.client = Mock()  # Mock client to avoid MQTT connect
-        self.verifier.setup_logging = Mock()  # Skip logging setup
+        self.tmp = tempfile.TemporaryDirectory()
+        env = {"MQTT_BROKER": "127.0.0.1", "MQTT_PORT": str(self.port), "VERIFIER_STATS_INTERVAL": "0",
+               "VERIFIER_RESULTS_PATH": os.path.join(self.tmp.name, "results.csv")}
+        with mock.patch.dict(os.environ, env), mock.patch.object(Verifier, "setup_logging"):  # Skip logging setup
+            self.verifier = Verifier()
+
+    def tearDown(self):
+        self.verifier.close()
+        self.tmp.cleanup()
 
     def test_valid_card(self):
         card = {
@@ -50,5 +79,140 @@ class TestVerifier(unittest.TestCase):
         self.assertEqual(result['status'], 'rejected')
         self.assertIn('Card expired', result['reasons'])
 
+    def test_redelivered_card_is_skipped(self):
+        card = {
+            'id': '1234-5678-9012',
+            'name': 'Alice Smith',
+            'expiry': (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d'),
+            'region': 'US',
+            'card_type': 'Visa',
+            'msg_id': 'abc'
+        }
+        message = Mock(payload=json.dumps(card).encode())
+        self.verifier.on_message(self.verifier.client, None, message)
+        self.verifier.on_message(self.verifier.client, None, message)  # QoS 1 redelivery
+        self.assertEqual(self.verifier.validations['total'], 1)
+        self.assertEqual(len(self.verifier.results), 1)
+        self.assertEqual(self.verifier.results[-1]['msg_id'], 'abc')
+
+    def test_binary_card_is_answered_in_binary(self):
+        card = {
+            'id': '1234-5678-9012',
+            'name': 'Alice Smith',
+            'expiry': (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d'),
+            'region': 'US',
+            'card_type': 'Visa'
+        }
+        with mock.patch.object(self.verifier.client, 'publish', wraps=self.verifier.client.publish) as publish:
+            self.verifier.on_message(self.verifier.client, None, Mock(payload=encode_binary(CARD, [card])))
+        topic, payload = publish.call_args[0]
+        self.assertEqual(topic, 'kyc/result/bin')
+        batch_id, results, _, binary = decode_message(payload)
+        self.assertTrue(binary)
+        self.assertIsNone(batch_id)
+        self.assertEqual(results, [self.verifier.results[-1]])
+        self.assertEqual(results[0]['status'], 'approved')
+
+    def process_verifier(self, rules):
+        env = {"MQTT_BROKER": "127.0.0.1", "MQTT_PORT": str(self.port), "VERIFIER_STATS_INTERVAL": "0",
+               "VERIFIER_RESULTS_PATH": os.path.join(self.tmp.name, "process.csv"), "VERIFIER_INSTANCE_ID": "process",
+               "VERIFIER_WORKERS": "1", "VERIFIER_POOL": "process", "VERIFIER_RULE_SAMPLE": "1"}
+        with mock.patch.dict(os.environ, env), mock.patch.object(Verifier, "setup_logging"):
+            return Verifier(rules)
+
+    def test_process_workers_apply_custom_rules(self):
+        verifier = self.process_verifier(RULES + (Rule("not_alice", "Alice", not_alice),))
+        card = {'id': '1234-5678-9012', 'name': 'Alice Smith', 'expiry': '2999-01-01', 'region': 'US', 'card_type': 'Visa'}
+        verifier.on_message(verifier.client, None, Mock(payload=json.dumps(card).encode()))
+        # Adding a rule later cannot reach the running workers, so messages fail loudly instead
+        verifier.validator.add_rule(Rule("never", "Never", not_alice))
+        with self.assertLogs(level='ERROR') as logs:
+            verifier.on_message(verifier.client, None, Mock(payload=json.dumps(dict(card, msg_id='2')).encode()))
+        verifier.close()
+        self.assertEqual([r['reasons'] for r in verifier.results], [['Alice']])
+        self.assertIn('Rules changed', logs.output[0])
+
+    def test_process_worker_timings_reach_the_registry(self):
+        def count(histogram):
+            return sum(histogram.snapshot()[0])
+        histograms = (DECODE_SECONDS.labels(), VERIFY_SECONDS.labels(), RULE_SECONDS.labels("name"))
+        before = [count(histogram) for histogram in histograms]
+        verifier = self.process_verifier(RULES)
+        card = {'id': '1234-5678-9012', 'name': 'Alice Smith', 'expiry': '2999-01-01', 'region': 'US', 'card_type': 'Visa'}
+        for i in range(3):
+            verifier.on_message(verifier.client, None, Mock(payload=json.dumps(dict(card, msg_id=str(i))).encode()))
+        verifier.close()
+        self.assertEqual([count(histogram) - n for histogram, n in zip(histograms, before)], [3, 3, 3])
+
+    def test_process_mode_refuses_rules_that_do_not_pickle(self):
+        with self.assertRaises(ValueError):
+            self.process_verifier(RULES + (Rule("lambda", "Lambda", lambda card: True),))
+
+    def thread_verifier(self):
+        env = {"MQTT_BROKER": "127.0.0.1", "MQTT_PORT": str(self.port), "VERIFIER_STATS_INTERVAL": "0",
+               "VERIFIER_RESULTS_PATH": os.path.join(self.tmp.name, "thread.csv"), "VERIFIER_INSTANCE_ID": "thread",
+               "VERIFIER_WORKERS": "1"}
+        with mock.patch.dict(os.environ, env), mock.patch.object(Verifier, "setup_logging"):
+            verifier = Verifier()
+        for _ in range(100):
+            if verifier.client.is_connected():
+                break
+            time.sleep(0.02)
+        return verifier
+
+    def test_close_unsubscribes_before_draining_the_pipeline(self):
+        verifier = self.thread_verifier()
+        calls = []
+        unsubscribe = verifier.client.unsubscribe
+        def record_unsubscribe(topics):
+            calls.append(("unsubscribe", verifier.pipeline.closed))
+            return unsubscribe(topics)
+        with mock.patch.object(verifier.client, 'unsubscribe', side_effect=record_unsubscribe), \
+                mock.patch.object(verifier.pipeline, 'close', wraps=verifier.pipeline.close) as close:
+            close.side_effect = lambda *args: calls.append(("close", verifier._unsubscribed.is_set()))
+            verifier.close()
+        # Unsubscribed while the pipeline was open, and closed it only once the UNSUBACK came back
+        self.assertEqual(calls, [("unsubscribe", False), ("close", True)])
+
+    def test_card_after_the_pipeline_closed_is_not_marked_seen(self):
+        verifier = self.thread_verifier()
+        verifier.close()
+        card = {'id': '1234-5678-9012', 'name': 'Alice Smith', 'expiry': '2999-01-01', 'region': 'US', 'card_type': 'Visa'}
+        payload = json.dumps(card).encode()
+        with self.assertLogs(level='WARNING'):
+            verifier.on_message(verifier.client, None, Mock(payload=payload))
+        # The redelivery must still count as new, not as a duplicate of a card that was never verified
+        self.assertFalse(verifier.dedup.seen(payload_key(payload)))
+
+    def test_close_after_losing_the_broker_still_flushes_results(self):
+        self.verifier.stats_interval = 5
+        self.verifier.client.disconnect()
+        card = {'id': '1234-5678-9012', 'name': 'Alice Smith', 'expiry': '2999-01-01', 'region': 'US', 'card_type': 'Visa'}
+        self.verifier.on_message(self.verifier.client, None, Mock(payload=json.dumps(card).encode()))
+        with mock.patch.object(self.verifier, 'clear_stats', side_effect=RuntimeError("not connected")):
+            self.verifier.close()
+        with open(os.path.join(self.tmp.name, 'results.csv')) as f:
+            self.assertIn('1234-5678-9012', f.read())
+
+    def test_close_clears_the_retained_stats_snapshot(self):
+        self.verifier.stats_interval = 5
+        for _ in range(100):
+            if self.verifier.client.is_connected():
+                break
+            time.sleep(0.02)
+        with mock.patch.object(self.verifier.client, 'publish', wraps=self.verifier.client.publish) as publish:
+            self.verifier.close()
+        publish.assert_called_once_with(self.verifier.stats_topic, b"", qos=self.verifier.qos, retain=True)
+
+    def test_stale_snapshots_are_not_counted(self):
+        snapshots = {
+            "live": {"validations": {"total": 3, "approved": 2, "rejected": 1}, "timestamp": 100.0, "interval": 5},
+            "dead": {"validations": {"total": 7, "approved": 7, "rejected": 0}, "timestamp": 60.0, "interval": 5},
+        }
+        stats = aggregate_stats(snapshots, now=110.0)
+        self.assertEqual(stats["instances"], 1)
+        self.assertEqual(stats["validations"], {"total": 3, "approved": 2, "rejected": 1})
+        self.assertEqual(stats["stale"], ["dead"])
+
 if __name__ == '__main__':
     unittest.main()